@@ -7,6 +7,9 @@ from typing import List, Optional, Dict, Any, Tuple
 
 from config import get_settings
 from ai_personas import get_persona_prompt
+import metrics
+
+logger = logging.getLogger("ai_manager")
 
 # --- Data Models ---
 
@@ -149,9 +152,10 @@ class AIManager:
         
         try:
             full_prompt = f"Проанализируй это сообщение: '{text}'"
-            response = await self.client.generate_content_async(
-                contents=history + [{'role': 'user', 'parts': [full_prompt]}],
-            )
+            with metrics.observe_llm("gemma"):
+                response = await self.client.generate_content_async(
+                    contents=history + [{'role': 'user', 'parts': [full_prompt]}],
+                )
             
             if not response.parts:
                 raise ValueError("AI response has no parts.")
@@ -163,6 +167,53 @@ class AIManager:
             logger.error(f"Error during AI message analysis: {e}")
             return await self._regex_fallback(text)
 
+    def _get_batch_prompt(self, texts: List[str]) -> str:
+        """Builds a single multi-item prompt for a batch of messages."""
+        items = "\n".join(
+            json.dumps({"id": i, "text": t}, ensure_ascii=False) for i, t in enumerate(texts)
+        )
+        return f"""Проанализируй КАЖДОЕ сообщение из списка ниже отдельно и независимо.
+Сообщения (по одному JSON на строку):
+{items}
+
+Ответь ТОЛЬКО одним JSON следующего вида, по одному элементу на каждое сообщение:
+{{"results": [{{"id": 0, "action": {{"intent": "...", "query": "...", "comment": "..."}}}}]}}"""
+
+    async def analyze_batch(self, texts: List[str], mode: str = "default") -> List[Dict[str, Any]]:
+        """
+        Analyzes several messages with one AI request.
+        Returns one 'action' dictionary per input text, in the same order.
+        Items the model did not answer fall back to the regex analyzer.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+        if self.client:
+            history = [
+                {'role': 'user', 'parts': ["Кто ты?"]},
+                {'role': 'model', 'parts': [self._get_system_prompt(mode)]},
+            ]
+            try:
+                with metrics.observe_llm("gemma"):
+                    response = await self.client.generate_content_async(
+                        contents=history + [{'role': 'user', 'parts': [self._get_batch_prompt(texts)]}],
+                    )
+                if not response.parts:
+                    raise ValueError("AI response has no parts.")
+
+                for item in self._parse_json(response.text).get('results', []):
+                    idx = item.get('id') if isinstance(item, dict) else None
+                    if isinstance(idx, int) and 0 <= idx < len(texts) and item.get('action'):
+                        results[idx] = item['action']
+            except Exception as e:
+                logger.error(f"Error during batched AI analysis ({len(texts)} items): {e}")
+        else:
+            logger.warning("AI client not available. Using regex fallback.")
+
+        for i, text in enumerate(texts):
+            if results[i] is None:
+                results[i] = (await self._regex_fallback(text))["action"]
+        return results
+
     async def get_chat_response(self, text: str, user_name: str, mode: str = "default") -> str:
         """Gets a simple chat response from the AI."""
         # This part might need a different prompt or model later
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from cache_service import CacheService
+import metrics
+
+logger = logging.getLogger("audio_processing")
+
+LOUDNORM_CACHE_TTL = 180 * 24 * 3600  # Замер зависит только от исходника — храним долго
+
+def transcode_opus(source: Path, target: Path, bitrate: str = "48k", timeout: float = 300.0) -> bool:
+    """Облегченная копия для мобильных (Opus в Ogg); пишется во временный файл и подменяется атомарно."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg: return False
+    tmp = target.with_name(target.name + ".part")
+    try:
+        proc = subprocess.run([ffmpeg, "-hide_banner", "-nostdin", "-y", "-i", str(source), "-vn",
+                               "-c:a", "libopus", "-b:a", bitrate, "-f", "ogg", str(tmp)],
+                              capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc = None
+    if proc is None or proc.returncode != 0 or not tmp.exists():
+        logger.warning(f"Opus transcode failed for {source.name}")
+        tmp.unlink(missing_ok=True)
+        return False
+    os.replace(tmp, target)
+    return True
+
+class LoudnessNormalizer:
+    """
+    Выравнивание громкости после загрузки (EBU R128, ffmpeg loudnorm в два прохода):
+    1. анализ исходника — один раз на файл, результат в кэше loudnorm:{id}:{хэш исходника};
+    2. перекодирование в mp3 с линейным усилением по замеру.
+    Трек, скачанный повторно после вытеснения с диска, сразу идет на второй проход — если
+    это тот же файл: поиск SoundCloud мог вернуть другую загрузку, и ее чужой замер испортил бы громкость.
+    Оба прохода — в собственном пуле транскодирования, не в общем executor.
+    """
+
+    def __init__(self, cache_service: Optional[CacheService], target_i: float = -14.0,
+                 target_tp: float = -1.5, target_lra: float = 11.0, workers: int = 2, timeout: float = 300.0):
+        self._cache = cache_service
+        self._target = f"I={target_i}:TP={target_tp}:LRA={target_lra}"
+        self._timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+        self._ffmpeg = shutil.which("ffmpeg")
+        if not self._ffmpeg:
+            logger.warning("ffmpeg not found: loudness normalization disabled")
+
+    @property
+    def available(self) -> bool:
+        return self._ffmpeg is not None
+
+    def _run(self, args) -> subprocess.CompletedProcess:
+        return subprocess.run([self._ffmpeg, "-hide_banner", "-nostdin", *args],
+                              capture_output=True, text=True, timeout=self._timeout)
+
+    @staticmethod
+    def _fingerprint(source: Path) -> str:
+        with open(source, "rb") as f:
+            return hashlib.file_digest(f, "md5").hexdigest()[:16]
+
+    def _analyze(self, source: Path) -> Optional[dict]:
+        """Первый проход: loudnorm печатает замер JSON-блоком в конце stderr."""
+        proc = self._run(["-i", str(source), "-af", f"loudnorm={self._target}:print_format=json", "-f", "null", "-"])
+        if proc.returncode != 0:
+            logger.warning(f"Loudnorm analysis failed for {source.name}: {proc.stderr[-300:]}")
+            return None
+        try:
+            stats = json.loads(proc.stderr[proc.stderr.rindex("{"):proc.stderr.rindex("}") + 1])
+            return {key: float(stats[key]) for key in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Loudnorm output not parsed for {source.name}: {e}")
+            return None
+
+    def _transcode(self, source: Path, target: Path, measured: Optional[dict]) -> bool:
+        """Второй проход: mp3 с усилением по замеру (без замера — просто перекодирование)."""
+        tmp = target.with_name(target.stem + "_norm.mp3")
+        audio_filter = []
+        if measured:
+            audio_filter = ["-af", (
+                f"loudnorm={self._target}:measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+                f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+                f":offset={measured['target_offset']}:linear=true"
+            ), "-ar", "44100"]
+        # -q:a 5 — то же качество, что у FFmpegExtractAudio из yt-dlp
+        proc = self._run(["-y", "-i", str(source), "-vn", *audio_filter, "-codec:a", "libmp3lame", "-q:a", "5", str(tmp)])
+        if proc.returncode != 0 or not tmp.exists():
+            logger.warning(f"Transcode failed for {source.name}: {proc.stderr[-300:]}")
+            tmp.unlink(missing_ok=True)
+            return False
+        os.replace(tmp, target)
+        return True
+
+    async def process(self, track_id: str, source: Path, target: Path) -> bool:
+        """Исходник yt-dlp -> нормализованный mp3 в target; исходник удаляется."""
+        loop = asyncio.get_running_loop()
+        try:
+            cache_key = f"loudnorm:{track_id}:{await loop.run_in_executor(self._pool, self._fingerprint, source)}"
+            measured = await self._cache.get(cache_key) if self._cache else None
+            if measured is None:
+                with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="download", stage="loudnorm_analyze"):
+                    measured = await loop.run_in_executor(self._pool, self._analyze, source)
+                if measured and self._cache:
+                    await self._cache.set(cache_key, measured, ttl=LOUDNORM_CACHE_TTL)
+            with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="download", stage="loudnorm_apply"):
+                return await loop.run_in_executor(self._pool, self._transcode, source, target, measured)
+        except Exception as e:
+            logger.error(f"Loudness normalization failed for {track_id}: {e}")
+            return False
+        finally:
+            source.unlink(missing_ok=True)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,40 @@
+"""
+Точка отсчета для бенчмарков: разбор выдачи и TrackInfo в том виде, как они были
+до оптимизаций. Общая для bench_memory и bench_micro, чтобы бенчмарки не импортировали друг друга.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+@dataclass
+class LegacyTrackInfo:
+    """TrackInfo до перехода на slots — точка отсчета."""
+    identifier: str
+    title: str
+    duration: int
+    uploader: str = "Unknown Artist"
+    thumbnail_url: Optional[str] = None
+    source: str = "youtube"
+    album: Optional[str] = None
+    url: Optional[str] = None
+
+def legacy_parse_page(search_results) -> List[LegacyTrackInfo]:
+    """Цикл из YouTubeDownloader.search до пакетной нормализации (с тогдашним TrackInfo) — точка отсчета."""
+    results = []
+    for item in search_results:
+        video_id = item.get('videoId')
+        if not video_id: continue
+        artists = ", ".join([a['name'] for a in item.get('artists', [])])
+        duration = 0
+        try:
+            d_str = item.get('duration', '0:00')
+            parts = d_str.split(':')
+            if len(parts) == 3: duration = int(parts[0])*3600 + int(parts[1])*60 + int(parts[2])
+            elif len(parts) == 2: duration = int(parts[0])*60 + int(parts[1])
+            else: duration = int(parts[0])
+        except: pass
+        if duration > 900 or duration < 40: continue
+        results.append(LegacyTrackInfo(
+            identifier=video_id, title=item.get('title'), uploader=artists, duration=duration,
+            thumbnail_url=item.get('thumbnails', [{}])[-1].get('url'), source="ytmusic"
+        ))
+    return results
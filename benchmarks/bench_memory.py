@@ -0,0 +1,92 @@
+"""
+Память на сессию радио: плейлист (List[TrackInfo]) и played_ids (Set[str]),
+как их держит RadioSession, при 1k и 10k одновременных сессий.
+
+legacy  — обычный dataclass с __dict__, у каждой сессии свои копии треков и строк;
+compact — slots TrackInfo + track_registry + интернированные id (search_normalize).
+
+Рядом с памятью — время сборки тех же сессий без tracemalloc: выигрыш по памяти
+не должен покупаться CPU на каждой странице выдачи.
+
+    python -m benchmarks.bench_memory --sessions 1000 10000
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+from search_normalize import normalize_page
+from benchmarks._baseline import legacy_parse_page
+
+def _page(genre: int, start: int, size: int) -> List[dict]:
+    """Страница выдачи как после json.loads: новые объекты строк на каждый ответ."""
+    return [
+        {
+            "videoId": f"g{genre:02d}trk{i:06d}",
+            "title": f"Track {i} of genre {genre}",
+            "artists": [{"name": f"Artist {i % 50}"}],
+            "duration": f"{2 + i % 4}:{(i * 7) % 60:02d}",
+            "thumbnails": [{"url": f"https://lh3.googleusercontent.com/g{genre}/{i}=w120-h120"}],
+        }
+        for i in range(start, start + size)
+    ]
+
+def _legacy_session(genre: int, rng: random.Random, playlist: int, played: int):
+    tracks = legacy_parse_page(_page(genre, rng.randrange(0, 2000), playlist))
+    played_ids = {t.identifier for t in legacy_parse_page(_page(genre, rng.randrange(0, 2000), played))}
+    return tracks, played_ids
+
+def _compact_session(genre: int, rng: random.Random, playlist: int, played: int):
+    tracks = normalize_page(_page(genre, rng.randrange(0, 2000), playlist))
+    played_ids = {t.identifier for t in normalize_page(_page(genre, rng.randrange(0, 2000), played))}
+    return tracks, played_ids
+
+def _build(builder, sessions: int, genres: int, playlist: int, played: int) -> list:
+    rng = random.Random(42)
+    # Жанры распределены неравномерно: популярные станции слушают чаще
+    return [builder(min(int(rng.expovariate(0.3)), genres - 1), rng, playlist, played) for _ in range(sessions)]
+
+def measure(builder, sessions: int, genres: int, playlist: int, played: int) -> Dict[str, float]:
+    gc.collect()
+    started = time.perf_counter()
+    held = _build(builder, sessions, genres, playlist, played)
+    elapsed = time.perf_counter() - started
+    del held
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    held = _build(builder, sessions, genres, playlist, played)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total = after - before
+    del held
+    return {"sessions": sessions, "total_mb": round(total / 2**20, 1), "bytes_per_session": round(total / sessions),
+            "build_us_per_session": round(elapsed * 1e6 / sessions, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session memory footprint of radio playlists")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--genres", type=int, default=20)
+    parser.add_argument("--playlist", type=int, default=50, help="Queued tracks per session")
+    parser.add_argument("--played", type=int, default=100, help="played_ids per session")
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for sessions in args.sessions:
+        for name, builder in (("legacy", _legacy_session), ("compact", _compact_session)):
+            result = {"variant": name, **measure(builder, sessions, args.genres, args.playlist, args.played)}
+            results.append(result)
+            print(f"{name:<8} {sessions:>6} sessions  {result['total_mb']:>8} MB  {result['bytes_per_session']:>8} B/session"
+                  f"  {result['build_us_per_session']:>8} us/session build")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Микро-бенчмарки горячих мест: CacheService get/set, рендер клавиатур, разбор TrackInfo,
+пакетная нормализация страниц выдачи против старого построчного цикла.
+
+    python -m benchmarks.bench_micro
+"""
+import os
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import search_normalize
+import youtube
+from cache_service import CacheService
+from config import Settings
+from keyboards import get_main_menu_keyboard, get_subcategory_keyboard
+from models import TrackInfo
+from benchmarks._baseline import legacy_parse_page
+from benchmarks.fakes import FakeYTMusic
+
+Result = Dict[str, float]
+
+def bench(name: str, fn: Callable[[], object], number: int, repeat: int = 5) -> Result:
+    fn()  # прогрев
+    # Лучший из repeat прогонов, как timeit: фоновые шумы машины только добавляют время
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return {"name": name, "ops": number, "us_per_op": round(best * 1e6 / number, 2)}
+
+async def abench(name: str, fn: Callable[[], object], number: int) -> Result:
+    await fn()
+    started = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    elapsed = time.perf_counter() - started
+    return {"name": name, "ops": number, "us_per_op": round(elapsed * 1e6 / number, 2)}
+
+async def run(args) -> List[Result]:
+    tmp = Path(tempfile.mkdtemp(prefix="aurora-micro-"))
+    results: List[Result] = []
+    n = args.number
+
+    # --- CacheService ---
+    cache = CacheService(tmp / "cache.db")
+    await cache.initialize()
+    track = TrackInfo(identifier="abc123", title="Title", duration=200, uploader="Artist")
+    counter = iter(range(10**9))
+    results.append(await abench("cache.set", lambda: cache.set(f"meta:{next(counter)}", track), n))
+    results.append(await abench("cache.get (hit)", lambda: cache.get("meta:1"), n))
+    results.append(await abench("cache.get (miss)", lambda: cache.get("meta:missing"), n))
+    await cache.close()
+
+    # --- keyboards ---
+    results.append(bench("keyboards.main_menu", get_main_menu_keyboard, n))
+    results.append(bench("keyboards.subcategory", lambda: get_subcategory_keyboard("rockmetal"), n))
+
+    # --- TrackInfo ---
+    yt_info = {"id": "abc123", "title": "Song", "uploader": "Artist", "duration": 215, "thumbnail": "http://x"}
+    results.append(bench("TrackInfo.from_yt_info", lambda: TrackInfo.from_yt_info(yt_info), n))
+
+    youtube.YTMusic = lambda *a, **kw: FakeYTMusic()
+    settings = Settings(BOT_TOKEN=os.environ["BOT_TOKEN"], DOWNLOADS_DIR=tmp / "downloads", CACHE_DB_PATH=tmp / "unused.db")
+    downloader = youtube.YouTubeDownloader(settings, None)
+    page = FakeYTMusic().search("bench", limit=args.page_size)
+    downloader._ytmusic_call = _returning(page)
+    results.append(await abench(f"search page parse ({args.page_size} items)", lambda: downloader.search("bench", limit=args.page_size), max(n // 10, 1)))
+
+
+    # --- нормализация: страница поиска и большая пачка (прогрев, массовая загрузка каталога) ---
+    # Результат каждого вызова выбрасывается, так что TrackInfo собираются заново, а не берутся из track_registry
+    for size, number in ((args.page_size, n), (args.bulk_size, max(n // 20, 1))):
+        page = FakeYTMusic().search("bulk", limit=size)
+        label = f"({size} items)"
+        results.append(bench(f"page parse: legacy loop {label}", lambda: legacy_parse_page(page), number))
+        results.append(bench(f"page parse: normalize_page {label}", lambda: search_normalize.normalize_page(page), number))
+
+    return results
+
+def _returning(value):
+    async def _call(*args, **kwargs):
+        return value
+    return _call
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot paths")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--bulk-size", type=int, default=5000, help="Page size for the normalization comparison")
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for r in results:
+        print(f"{r['name']:<44} {r['us_per_op']:>10} us/op  ({r['ops']} ops)")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Нагрузочный прогон радио: N параллельных RadioSession через RadioManager
+на локальных заглушках YTMusic, yt-dlp и Bot API (см. benchmarks/fakes.py).
+
+    python -m benchmarks.bench_radio --sessions 50 --duration 30
+"""
+import os
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+from telegram import Bot
+
+import youtube
+from cache_service import CacheService
+from config import Settings
+from radio import RadioManager, RadioSession, MUSIC_CATALOG
+from benchmarks.fakes import BotAPIServer, FakeYTMusic, fake_run_yt_dlp, fake_sc_candidates, make_audio_fixture
+
+def _catalog_queries():
+    queries = []
+    for node in MUSIC_CATALOG.values():
+        for child in node.get("children", {}).values():
+            if "query" in child: queries.append(child["query"])
+    return queries or ["bench"]
+
+def _percentile(values, pct):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def run(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="aurora-bench-"))
+    fixture = make_audio_fixture(tmp / "fixtures")
+    settings = Settings(BOT_TOKEN=os.environ["BOT_TOKEN"], DOWNLOADS_DIR=tmp / "downloads", CACHE_DB_PATH=tmp / "cache.db")
+
+    youtube.YTMusic = lambda *a, **kw: FakeYTMusic(args.search_latency)
+    youtube.YouTubeDownloader._run_yt_dlp = fake_run_yt_dlp(fixture, args.download_latency)
+    youtube.YouTubeDownloader._sc_candidates = fake_sc_candidates
+    RadioSession._track_wait_seconds = lambda self, track: args.track_seconds
+
+    tracks, gaps = 0, []
+    play_track = RadioSession._play_track
+
+    async def measured_play_track(self, track):
+        nonlocal tracks
+        ended = self.last_track_ended_at
+        ok = await play_track(self, track)
+        if ok:
+            tracks += 1
+            if ended is not None: gaps.append(time.monotonic() - ended)
+        return ok
+
+    RadioSession._play_track = measured_play_track
+
+    cache = CacheService(settings.CACHE_DB_PATH)
+    await cache.initialize()
+    downloader = youtube.YouTubeDownloader(settings, cache)
+    process = psutil.Process()
+
+    with BotAPIServer(latency=args.bot_latency) as server:
+        bot = Bot(settings.BOT_TOKEN, base_url=server.base_url)
+        await bot.initialize()
+        manager = RadioManager(bot, settings, downloader)
+
+        queries = _catalog_queries()
+        rss_before = process.memory_info().rss
+        cpu_before, wall_before = time.process_time(), time.monotonic()
+
+        for chat_id in range(1, args.sessions + 1):
+            await manager.start(chat_id, queries[chat_id % len(queries)])
+        await asyncio.sleep(args.duration)
+
+        cpu = time.process_time() - cpu_before
+        wall = time.monotonic() - wall_before
+        rss_after = process.memory_info().rss
+
+        for chat_id in range(1, args.sessions + 1):
+            await manager.stop(chat_id)
+        await bot.shutdown()
+    await cache.close()
+
+    return {
+        "sessions": args.sessions,
+        "duration_s": round(wall, 2),
+        "tracks": tracks,
+        "tracks_per_s": round(tracks / wall, 2),
+        "gap_p50_s": round(_percentile(gaps, 50), 3),
+        "gap_p95_s": round(_percentile(gaps, 95), 3),
+        "gap_mean_s": round(statistics.fmean(gaps), 3) if gaps else 0.0,
+        "cpu_ms_per_track": round(cpu * 1000 / tracks, 2) if tracks else None,
+        "rss_mb": round(rss_after / 2**20, 1),
+        "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Radio throughput benchmark on local stand-ins")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--track-seconds", type=float, default=0.5, help="Simulated playback time per track")
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--bot-latency", type=float, default=0.02)
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key:>18}: {value}")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Локальные заглушки для бенчмарков: YTMusic, yt-dlp (копирует аудио-фикстуру) и Bot API.
+Ничего не ходит в сеть — результаты воспроизводимы офлайн.
+"""
+import hashlib
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from fastapi import FastAPI, Request
+
+def make_audio_fixture(directory: Path, seconds: int = 30) -> Path:
+    """Тестовый mp3: синус через ffmpeg, либо случайные байты того же размера."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"fixture_{seconds}s.mp3"
+    if path.exists():
+        return path
+    if shutil.which("ffmpeg"):
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             "-b:a", "128k", str(path)],
+            check=True,
+        )
+    else:
+        path.write_bytes(os.urandom(16_000 * seconds))
+    return path
+
+class FakeYTMusic:
+    """Подмена ytmusicapi.YTMusic: детерминированная выдача, новая страница на каждый вызов."""
+
+    def __init__(self, latency: float = 0.0):
+        self._latency = latency
+        self._calls = 0
+        self.calls = Counter()
+
+    def search(self, query: str, filter: Optional[str] = None, limit: int = 20):
+        self.calls["search"] += 1
+        self._calls += 1
+        time.sleep(self._latency)
+        seed = hashlib.md5(query.encode()).hexdigest()[:6]
+        return [
+            {
+                "videoId": f"{seed}{self._calls:05d}{i:02d}",
+                "title": f"Track {i} ({query})",
+                "artists": [{"name": f"Artist {i % 7}"}, {"name": "Guest"}],
+                "duration": f"{2 + i % 4}:{(i * 7) % 60:02d}",
+                "thumbnails": [{"url": "http://localhost/thumb.jpg"}],
+            }
+            for i in range(limit)
+        ]
+
+    def get_watch_playlist(self, videoId: str, limit: int = 25, radio: bool = False):
+        self.calls["get_watch_playlist"] += 1
+        time.sleep(self._latency)
+        return {"tracks": [
+            {
+                "videoId": f"{videoId[:8]}w{i:02d}",
+                "title": f"Related {i}",
+                "artists": [{"name": f"Artist {i % 5}"}],
+                "length": f"{3 + i % 3}:{(i * 11) % 60:02d}",
+                "thumbnail": [{"url": "http://localhost/thumb.jpg"}],
+            }
+            for i in range(limit)
+        ], "related": None}
+
+    def get_song(self, video_id: str):
+        self.calls["get_song"] += 1
+        time.sleep(self._latency)
+        return {"videoDetails": {
+            "videoId": video_id, "title": f"Song {video_id}", "author": "Artist",
+            "lengthSeconds": "200", "thumbnail": {"thumbnails": [{"url": "http://localhost/thumb.jpg"}]},
+        }}
+
+def fake_run_yt_dlp(fixture: Path, latency: float = 0.0):
+    """Замена YouTubeDownloader._run_yt_dlp: вызывает hooks и кладет фикстуру туда, куда ждет код."""
+
+    def _run(self, opts, url):
+        for hook in opts.get("progress_hooks", []):
+            hook({"status": "downloading"})
+        time.sleep(latency)
+        for hook in opts.get("progress_hooks", []):
+            hook({"status": "finished"})
+        for hook in opts.get("postprocessor_hooks", []):
+            hook({"status": "started"})
+        shutil.copyfile(fixture, opts["outtmpl"] + ".mp3")
+        for hook in opts.get("postprocessor_hooks", []):
+            hook({"status": "finished"})
+
+    return _run
+
+def fake_sc_candidates(self, opts, query: str):
+    """Замена YouTubeDownloader._sc_candidates: один результат поиска SoundCloud с теми же метаданными."""
+    uploader, _, title = query.partition(" - ")
+    return [{"url": f"fake://{query}", "title": title, "uploader": uploader, "duration": None}]
+
+def create_bot_api_app(latency: float = 0.0) -> FastAPI:
+    """Минимальный Bot API: отвечает на методы, которые использует бот, и считает вызовы."""
+    import asyncio
+
+    app = FastAPI()
+    state = {"message_id": 0, "calls": Counter()}
+
+    def _message() -> dict:
+        state["message_id"] += 1
+        return {"message_id": state["message_id"], "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+
+    @app.get("/stats")
+    async def stats():
+        return dict(state["calls"])
+
+    @app.post("/bot{token}/{method}")
+    async def bot_method(token: str, method: str, request: Request):
+        await request.body()
+        state["calls"][method] += 1
+        if latency: await asyncio.sleep(latency)
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method in ("deleteMessage", "sendChatAction", "setWebhook", "deleteWebhook"):
+            result = True
+        elif method == "sendAudio":
+            result = _message()
+            result["audio"] = {"file_id": f"audio{result['message_id']}", "file_unique_id": f"u{result['message_id']}", "duration": 1}
+        else:
+            result = _message()
+        return {"ok": True, "result": result}
+
+    return app
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _serve_bot_api(port: int, latency: float):
+    import uvicorn
+    uvicorn.run(create_bot_api_app(latency), host="127.0.0.1", port=port, log_level="warning")
+
+class BotAPIServer:
+    """Bot API в отдельном процессе, чтобы его CPU не попадал в замеры бота."""
+
+    def __init__(self, latency: float = 0.0):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/bot"
+        self._process = multiprocessing.Process(target=_serve_bot_api, args=(self.port, latency), daemon=True)
+
+    def __enter__(self) -> "BotAPIServer":
+        self._process.start()
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("Bot API stand-in did not start")
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join(timeout=5)
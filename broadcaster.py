@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+from typing import AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger("broadcaster")
+
+_CLOSED = object()
+
+class StationBroadcaster:
+    """
+    Раздача событий одной станции (волны чата) всем слушателям.
+    У каждого слушателя своя короткая очередь: медленный браузер теряет старые
+    события, а не тормозит радио. Новый слушатель сразу получает последнее событие.
+    """
+
+    def __init__(self, station: int, queue_size: int = 16):
+        self.station = station
+        self.last: Optional[dict] = None
+        self._queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def listeners(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event):
+        if event is not _CLOSED: self.last = event
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def subscribe(self, keepalive: float) -> AsyncIterator[Optional[dict]]:
+        """События станции; None — пора отправить keepalive."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        if self.last: queue.put_nowait(self.last)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is _CLOSED: return
+                yield event
+        finally:
+            self._subscribers.discard(queue)
+
+class BroadcastHub:
+    """
+    Станции по chat_id: радио публикует, веб-плеер слушает через SSE.
+    Слушать можно только с ключом станции из ссылки радио: chat_id личного чата —
+    это id пользователя, перебором их не должно быть видно, кто что слушает.
+    """
+
+    def __init__(self, secret: str, keepalive: float = 15.0):
+        self._secret = hashlib.sha256(f"station:{secret}".encode()).digest()
+        self._keepalive = keepalive
+        self._stations: Dict[int, StationBroadcaster] = {}
+
+    def key(self, chat_id: int) -> str:
+        return hmac.new(self._secret, str(chat_id).encode(), hashlib.sha256).hexdigest()[:24]
+
+    def verify(self, chat_id: int, key: str) -> bool:
+        return hmac.compare_digest(self.key(chat_id), key)
+
+    def station(self, chat_id: int) -> StationBroadcaster:
+        if chat_id not in self._stations:
+            self._stations[chat_id] = StationBroadcaster(chat_id)
+        return self._stations[chat_id]
+
+    def publish(self, chat_id: int, event: dict):
+        station = self.station(chat_id)
+        station.publish(event)
+        if event.get("type") == "stopped" and not station.listeners:
+            # Эфир окончен и слушать некому — станция больше не нужна
+            self._stations.pop(chat_id, None)
+
+    def listeners(self, chat_id: int) -> int:
+        station = self._stations.get(chat_id)
+        return station.listeners if station else 0
+
+    async def sse(self, chat_id: int) -> AsyncIterator[str]:
+        """Поток text/event-stream для одного слушателя."""
+        station = self.station(chat_id)
+        logger.debug(f"Listener joined station {chat_id} ({station.listeners + 1})")
+        # Без событий станция может молчать минутами — комментарий держит соединение живым
+        try:
+            # aclosing: слушатель снимается с очереди до проверки ниже, а не когда-нибудь в GC
+            async with contextlib.aclosing(station.subscribe(self._keepalive)) as events:
+                async for event in events:
+                    if event is None:
+                        yield ": keepalive\n\n"
+                    else:
+                        yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            # Пустая станция без эфира (не начатого или оконченного) не должна оставаться в словаре
+            ended = station.last is None or station.last.get("type") == "stopped"
+            if not station.listeners and ended and self._stations.get(chat_id) is station:
+                self._stations.pop(chat_id, None)
+
+    def close(self):
+        for station in self._stations.values():
+            station.publish(_CLOSED)
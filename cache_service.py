@@ -2,10 +2,13 @@ import asyncio
 import logging
 import pickle
 from pathlib import Path
-from typing import Optional, Any, Union
+from typing import Any, Iterable, Optional, Tuple, Union
 import aiosqlite
 from datetime import datetime, timedelta
 
+import metrics
+import tracing
+
 logger = logging.getLogger(__name__)
 
 class CacheService:
@@ -16,7 +19,9 @@ class CacheService:
 
     async def initialize(self):
         """Инициализация базы данных и удаление просроченных записей."""
-        self._db = await aiosqlite.connect(self._db_path)
+        self._db = await aiosqlite.connect(self._db_path, timeout=10)
+        # WAL: файл кэша может быть общим для нескольких воркеров
+        await self._db.execute("PRAGMA journal_mode=WAL")
         await self._db.execute("""
             CREATE TABLE IF NOT EXISTS cache (
                 key TEXT PRIMARY KEY,
@@ -34,6 +39,7 @@ class CacheService:
             await self._db.close()
             self._db = None
 
+    @tracing.traced("cache.get")
     async def get(self, key: str) -> Optional[Any]:
         """Получение значения из кэша с проверкой срока годности."""
         if not self._db:
@@ -48,16 +54,19 @@ class CacheService:
                 if row:
                     value, expires_at = row
                     if expires_at is None or datetime.fromisoformat(expires_at) > datetime.now():
+                        metrics.CACHE_REQUESTS_TOTAL.labels(prefix=metrics.cache_prefix(key), result="hit").inc()
                         return pickle.loads(value)
                     else:
                         # Запись просрочена, удаляем ее
                         await self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
                         await self._db.commit()
+                metrics.CACHE_REQUESTS_TOTAL.labels(prefix=metrics.cache_prefix(key), result="miss").inc()
                 return None
         except Exception as e:
             logger.error(f"Cache get error for {key}: {e}")
             return None
 
+    @tracing.traced("cache.set")
     async def set(self, key: str, value: Any, ttl: Optional[int] = 3600) -> bool:
         """
         Сохранение значения в кэш с указанием времени жизни.
@@ -87,6 +96,30 @@ class CacheService:
             logger.error(f"Cache set error for {key}: {e}")
             return False
 
+    @tracing.traced("cache.set_many")
+    async def set_many(self, items: Iterable[Tuple[str, Any, Optional[int]]]) -> bool:
+        """Пачка (key, value, ttl) одним executemany и одним коммитом — вместо коммита на каждую запись."""
+        if not self._db:
+            return False
+
+        try:
+            now = datetime.now()
+            rows = [
+                (key, pickle.dumps(value), (now + timedelta(seconds=ttl)).isoformat() if ttl and ttl > 0 else None)
+                for key, value, ttl in items
+            ]
+            if not rows:
+                return True
+            async with self._lock:
+                await self._db.executemany(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", rows
+                )
+                await self._db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Cache set_many error: {e}")
+            return False
+
     async def delete(self, key: str) -> bool:
         """Удаление значения из кэша."""
         if not self._db:
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Deque, Dict, Hashable, Optional
+
+import metrics
+
+logger = logging.getLogger("concurrency")
+
+class Priority(IntEnum):
+    """Классы работ, меньше — важнее: интерактивное обгоняет радио, радио «сейчас» — подкачку."""
+    WEB_STREAM = 0
+    TG_SEARCH = 1
+    RADIO_NOW = 2
+    RADIO_PREFETCH = 3
+
+class FairQueue:
+    """
+    Очередь ожидающих: сначала по приоритету, внутри приоритета — round-robin
+    по чатам (FIFO внутри чата). Чат с сотней треков в очереди получает
+    слот не чаще, чем чат с одним.
+    """
+
+    def __init__(self):
+        self._lanes: Dict[int, "OrderedDict[Hashable, Deque[asyncio.Future]]"] = {p: OrderedDict() for p in sorted(Priority)}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, priority: int, owner: Hashable, future: asyncio.Future):
+        lane = self._lanes[int(priority)]
+        lane.setdefault(owner, deque()).append(future)
+        self._size += 1
+
+    def pop(self, skip_owner=lambda owner: False) -> Optional[asyncio.Future]:
+        """Следующий ожидающий; владельцы, для которых skip_owner() истинно, пропускаются."""
+        for lane in self._lanes.values():
+            for owner in list(lane):
+                if skip_owner(owner): continue
+                futures = lane[owner]
+                future = futures.popleft()
+                self._size -= 1
+                if futures:
+                    lane.move_to_end(owner)
+                else:
+                    del lane[owner]
+                return future
+        return None
+
+    def remove(self, future: asyncio.Future) -> Optional[Hashable]:
+        """Убирает ожидающего; возвращает его владельца (None — не найден)."""
+        for lane in self._lanes.values():
+            for owner, futures in list(lane.items()):
+                if future in futures:
+                    futures.remove(future)
+                    self._size -= 1
+                    if not futures: del lane[owner]
+                    return owner
+        return None
+
+class Limiter:
+    """
+    Лимит параллельных задач с приоритетами и честной долей на чат:
+    один чат держит не больше per_owner слотов, пока другие ждут.
+    """
+
+    def __init__(self, limit: int, per_owner: Optional[int] = None):
+        self._limit = float(limit)
+        self._per_owner = per_owner
+        self._active = 0
+        self._active_by_owner: Dict[Hashable, int] = defaultdict(int)
+        self._waiters = FairQueue()
+        self._owners: Dict[asyncio.Future, Hashable] = {}
+        self._priorities: Dict[asyncio.Future, int] = {}
+        # key -> ожидающий: общую работу (одна загрузка на трек) можно поднять в приоритете
+        self._keys: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _over_share(self, owner: Hashable) -> bool:
+        return owner is not None and self._per_owner is not None and self._active_by_owner[owner] >= self._per_owner
+
+    def _grant(self, owner: Hashable):
+        self._active += 1
+        self._active_by_owner[owner] += 1
+
+    async def acquire(self, priority: int = Priority.WEB_STREAM, owner: Hashable = None, key: Hashable = None):
+        if self._active < self.limit and not self._waiters and not self._over_share(owner):
+            self._grant(owner)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._owners[future] = owner
+        self._priorities[future] = int(priority)
+        if key is not None: self._keys[key] = future
+        self._waiters.push(priority, owner, future)
+        # Слот может быть свободен, а нас поставили в очередь из-за доли чата — _wake решит
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот выдан одновременно с отменой — вернем его
+                self.release(owner)
+            else:
+                self._waiters.remove(future)
+            raise
+        finally:
+            self._owners.pop(future, None)
+            self._priorities.pop(future, None)
+            if key is not None and self._keys.get(key) is future:
+                del self._keys[key]
+
+    def escalate(self, key: Hashable, priority: int) -> bool:
+        """
+        К работе, ожидающей слот под key, присоединился более важный клиент:
+        ожидающий переезжает в его класс приоритета (доля чата — по-прежнему первого).
+        """
+        future = self._keys.get(key)
+        if future is None or future.done() or self._priorities[future] <= priority:
+            return False
+        owner = self._waiters.remove(future)
+        self._waiters.push(priority, owner, future)
+        self._priorities[future] = int(priority)
+        return True
+
+    def release(self, owner: Hashable = None):
+        self._active -= 1
+        self._active_by_owner[owner] -= 1
+        if self._active_by_owner[owner] <= 0:
+            del self._active_by_owner[owner]
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._active < self.limit:
+            future = self._waiters.pop(skip_owner=self._over_share)
+            if future is None:
+                # Все ожидающие — чаты, выбравшие свою долю; если больше некому, даем им
+                future = self._waiters.pop()
+            if future.done(): continue
+            self._grant(self._owners.get(future))
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = Priority.WEB_STREAM, owner: Hashable = None):
+        await self.acquire(priority, owner)
+        try:
+            yield
+        finally:
+            self.release(owner)
+
+class AdaptiveLimiter(Limiter):
+    """
+    Limiter, у которого лимит подстраивается по AIMD:
+    - +1 после `limit` успешных загрузок подряд, если латентность не выше
+      latency_tolerance * базовой (EWMA лучших результатов);
+    - ×backoff при 429/таймауте, не чаще раза в cooldown секунд
+      (пачка ошибок от одной перегрузки — одно снижение).
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 16, per_owner: Optional[int] = None,
+                 latency_tolerance: float = 2.0, backoff: float = 0.5, cooldown: float = 5.0):
+        super().__init__(max(initial, min_limit), per_owner=per_owner)
+        self._min = min_limit
+        self._max = max(max_limit, initial)
+        self._tolerance = latency_tolerance
+        self._backoff = backoff
+        self._cooldown = cooldown
+        self._baseline: Optional[float] = None
+        self._successes = 0
+        self._last_decrease = 0.0
+        metrics.DOWNLOAD_CONCURRENCY_LIMIT.set(self.limit)
+
+    def record(self, latency: float, ok: bool, overloaded: bool = False):
+        """Результат загрузки: подстройка лимита."""
+        if overloaded:
+            now = time.monotonic()
+            if now - self._last_decrease >= self._cooldown:
+                self._last_decrease = now
+                self._set_limit(max(self._min, self._limit * self._backoff))
+                logger.warning(f"Download overload, limit -> {self.limit}")
+            self._successes = 0
+            return
+        if not ok:
+            return
+
+        # База — медленно ползущий минимум: быстрые загрузки тянут ее вниз сразу, медленные — по чуть-чуть
+        self._baseline = latency if self._baseline is None else min(latency, self._baseline * 0.95 + latency * 0.05)
+        if latency > self._baseline * self._tolerance:
+            self._successes = 0
+            return
+        self._successes += 1
+        if self._successes >= self.limit and self._limit < self._max:
+            self._successes = 0
+            self._set_limit(self._limit + 1)
+            logger.info(f"Download throughput healthy, limit -> {self.limit}")
+
+    def _set_limit(self, value: float):
+        self._limit = value
+        metrics.DOWNLOAD_CONCURRENCY_LIMIT.set(self.limit)
+        self._wake()
+
+class WorkScheduler:
+    """
+    Единая точка входа для тяжелых работ: поиск метаданных и загрузки аудио
+    проходят через свои лимиты с общими классами приоритета и долей на чат.
+    """
+
+    def __init__(self, search_limit: int, download_initial: int, download_max: int, per_chat: int = 2):
+        self.search = Limiter(search_limit, per_owner=per_chat)
+        self.downloads = AdaptiveLimiter(download_initial, max_limit=download_max, per_owner=per_chat)
+
+    @asynccontextmanager
+    async def search_slot(self, priority: int, chat_id: Optional[int] = None):
+        with metrics.timed(metrics.SCHEDULER_WAIT_SECONDS, kind="search", priority=Priority(priority).name.lower()):
+            await self.search.acquire(priority, chat_id)
+        try:
+            yield
+        finally:
+            self.search.release(chat_id)
+
+    @asynccontextmanager
+    async def download_slot(self, priority: int, chat_id: Optional[int] = None, key: Hashable = None):
+        """key — id общей загрузки: escalate_download поднимет ее, пока она ждет слот."""
+        with metrics.timed(metrics.SCHEDULER_WAIT_SECONDS, kind="download", priority=Priority(priority).name.lower()):
+            await self.downloads.acquire(priority, chat_id, key)
+        try:
+            yield
+        finally:
+            self.downloads.release(chat_id)
+
+    def escalate_download(self, key: Hashable, priority: int) -> bool:
+        return self.downloads.escalate(key, priority)
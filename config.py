@@ -16,12 +16,24 @@ class Settings(BaseSettings):
     )
     
     BOT_TOKEN: str 
-    WEBHOOK_URL: str = ""
+    WEBHOOK_URL: str = ""  # Если задан — режим вебхука вместо polling
+    WEBHOOK_SECRET: str = ""  # secret_token для заголовка X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 2000
+
+    # Несколько воркеров/реплик: чаты делятся между ними через общий SQLite (нужен режим вебхука)
+    SHARDING_ENABLED: bool = False
+    SHARDING_DB_PATH: Path = Path(__file__).resolve().parent / "cluster.db"
+    WORKER_ID: str = ""  # Пусто = hostname:pid
+    SHARD_LEASE_TTL: float = 20.0
     BASE_URL: str = ""
+    STATION_KEY_SECRET: str = ""  # Ключ ссылок на станции веб-плеера (пусто = выводится из BOT_TOKEN)
     
     # Ключи
     GOOGLE_API_KEY: str = Field(default="", validation_alias="GEMINI_API_KEY") # Алиас для Gemini
     OPENROUTER_API_KEY: str = ""
+    SPOTIFY_CLIENT_ID: str = ""
+    SPOTIFY_CLIENT_SECRET: str = ""
     TELEGRAM_API_BASE: str = ""
 
     # ВАЖНО: Алиас для ADMIN_IDS
@@ -33,7 +45,68 @@ class Settings(BaseSettings):
     CACHE_DB_PATH: Path = BASE_DIR / "cache.db"
     
     LOG_LEVEL: str = "INFO"
-    MAX_CONCURRENT_DOWNLOADS: int = 3
+    TRACE_FILE: str = ""  # Например traces.jsonl; пусто = не писать трейсы в файл
+    TRACE_FILE_MAX_MB: int = 50  # Ротация файла трейсов (хранится один предыдущий файл)
+    MAX_CONCURRENT_DOWNLOADS: int = 3  # Стартовый лимит, дальше подстраивается (AIMD)
+    MAX_CONCURRENT_DOWNLOADS_CEILING: int = 12
+    MAX_CONCURRENT_SEARCHES: int = 8
+    SCHEDULER_PER_CHAT: int = 2  # Слотов на один чат, пока другие ждут
+
+    # Прогрев популярных волн в простое
+    PREWARM_ENABLED: bool = False  # Фоновые загрузки каждые PREWARM_INTERVAL сек
+    PREWARM_GENRES: int = 5
+    PREWARM_POOL_SIZE: int = 2
+    PREWARM_INTERVAL: int = 30
+
+    # Выравнивание громкости после загрузки (ffmpeg loudnorm, замер кэшируется на трек)
+    LOUDNORM_ENABLED: bool = False
+    LOUDNORM_TARGET_I: float = -14.0  # LUFS
+    LOUDNORM_WORKERS: int = 2  # Потоков пула транскодирования
+
+    # Веб-плеер: прогрев начала плейлиста и облегченный поток для мобильных
+    PLAYER_PREFETCH_TRACKS: int = 3
+    PLAYER_PREFETCH_CONCURRENCY: int = 1  # Одновременных прогревов плеера (не больше слотов загрузки)
+    STREAM_LOW_BITRATE: str = "48k"  # Opus для /stream?quality=low
+    PLAYER_SEARCH_FETCH: int = 60  # Треков за один живой поиск (запас на несколько страниц)
+    PLAYER_SEARCH_CACHE_TTL: int = 600
+    PLAYER_PAGE_MAX: int = 50
+    HLS_ENABLED: bool = False  # /hls/{id}/index.m3u8: fMP4/AAC сегменты, нарезка один раз на трек (нужен ffmpeg)
+    HLS_SEGMENT_SECONDS: int = 6
+    HLS_BITRATE: str = "128k"
+
+    # Статистика прослушиваний и решения о кэшировании по популярности
+    STATS_ENABLED: bool = False  # Таблицы статистики в базе кэша
+    STATS_ADMIT_SCORE: float = 1.5  # ~2 недавних прослушивания: такой трек держим на диске
+
+    # Вытеснение аудио из DOWNLOADS_DIR (работает и без статистики)
+    DISK_EVICT_INTERVAL: int = 600
+    DISK_EVICT_MIN_AGE: int = 6 * 3600  # Файлы моложе не трогаем: могут быть в работе или в прогреве
+
+    # Диагностика: /profile и /debug/profile, монитор задержки event loop
+    ADMIN_API_TOKEN: str = ""  # Токен для HTTP-эндпоинтов администратора (пусто = выключены)
+    PROFILE_MAX_SECONDS: int = 60
+    LOOP_LAG_THRESHOLD_MS: int = 100  # 0 = монитор выключен
+    LOOP_BLOCK_DEBUG_MS: int = 0  # >0: debug-режим, лог стека любого шага корутины дольше порога
+
+    # Микро-батчинг анализа сообщений (один запрос к LLM на пачку сообщений)
+    AI_BATCH_ENABLED: bool = False
+    AI_BATCH_WINDOW_MS: int = 25   # Максимальная добавочная задержка
+    AI_BATCH_MAX_SIZE: int = 8
+
+    # Пул прокси (working_proxies.txt) для yt-dlp и YTMusic
+    PROXY_ENABLED: bool = False
+    PROXY_HEALTH_URL: str = "https://www.gstatic.com/generate_204"
+    PROXY_HEALTH_INTERVAL: int = 300
+    PROXY_COOLDOWN: int = 120
+    PROXY_MAX_ATTEMPTS: int = 2  # Попыток через прокси, затем напрямую
+    PROXY_CHECK_INTERVAL: int = 0  # Перепроверка списков (сек), 0 = выключено
+    PROXY_CHECK_CONCURRENCY: int = 300
+    PROXY_CHECK_TIMEOUT: float = 5.0
+    PROXY_CHECK_MAX_FAILURES: int = 3  # Проверок подряд без ответа, после которых прокси удаляется из списка
+
+    # Загрузка плейлистов и альбомов Spotify
+    SPOTIFY_MATCH_CONCURRENCY: int = 4
+    SPOTIFY_MAX_TRACKS: int = 100
 
     @field_validator("GOOGLE_API_KEY", mode="before")
     @classmethod
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger("disk_janitor")
+
+def evict_files(directory: Path, keep: Callable[[str], bool] = lambda track_id: False,
+                min_age: float = 6 * 3600) -> int:
+    """Удаляет аудио треков старше min_age, кроме keep(id) (свежие могут быть в работе или в прогреве)."""
+    removed, now = 0, time.time()
+    for entry in os.scandir(directory):
+        # {id}.mp3 и облегченная копия для веб-плеера {id}.low.ogg
+        track_id, _, ext = entry.name.partition(".")
+        if ext not in ("mp3", "low.ogg") or track_id.endswith("_temp"): continue
+        try:
+            if now - entry.stat().st_mtime > min_age and not keep(track_id):
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    # HLS-нарезки: папка на трек (служебные .{id}-* — идущие сборки, их не трогаем)
+    hls_root = directory / "hls"
+    if hls_root.is_dir():
+        for entry in os.scandir(hls_root):
+            if not entry.is_dir() or entry.name.startswith("."): continue
+            try:
+                if now - entry.stat().st_mtime > min_age and not keep(entry.name):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+class DiskJanitor:
+    """
+    Периодическое вытеснение аудио из DOWNLOADS_DIR. Работает и без статистики:
+    файлы, оставленные для слушателей веб-плеера, иначе копились бы бесконечно.
+    keep — какие треки держать дольше (горячие по StatsStore).
+    """
+
+    def __init__(self, directory: Path, keep: Optional[Callable[[str], bool]] = None,
+                 interval: float = 600.0, min_age: float = 6 * 3600):
+        self._directory = directory
+        self._keep = keep or (lambda track_id: False)
+        self._interval = interval
+        self._min_age = min_age
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                removed = await asyncio.to_thread(evict_files, self._directory, self._keep, self._min_age)
+                if removed: logger.info(f"Evicted {removed} audio files")
+            except Exception as e:
+                logger.error(f"Disk eviction failed: {e}")
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -6,6 +6,8 @@ from typing import Optional
 from google import genai
 from google.genai import errors
 
+import metrics
+
 logger = logging.getLogger("gemini")
 
 # === ЗАГРУЗКА КЛЮЧЕЙ ===
@@ -67,10 +69,11 @@ def generate_smart(prompt: str) -> Optional[str]:
             try:
                 # logger.debug(f"[Gemini] Requesting {model_name} via {key_id}")
                 
-                response = client.models.generate_content(
-                    model=model_name, 
-                    contents=prompt
-                )
+                with metrics.observe_llm(f"gemini:{model_name}"):
+                    response = client.models.generate_content(
+                        model=model_name, 
+                        contents=prompt
+                    )
                 
                 result = None
                 if hasattr(response, 'text') and response.text:
@@ -1,7 +1,9 @@
 from __future__ import annotations
 import logging
 import asyncio
+import io
 import os
+import time
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.constants import ParseMode
 from telegram.ext import (
@@ -15,6 +17,9 @@ from chat_service import ChatManager
 from nlp import analyze_message
 from keyboards import get_main_menu_keyboard, get_subcategory_keyboard
 from ai_personas import PERSONAS # Import personas to build the admin menu
+import tracing
+from concurrency import Priority
+from profiler import profiler
 
 logger = logging.getLogger("handlers")
 
@@ -80,6 +85,58 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_admin_keyboard()
     )
 
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles /profile <seconds>: samples the event loop and executor threads, replies with collapsed stacks."""
+    user_id = update.effective_user.id
+    if user_id not in context.application.settings.ADMIN_ID_LIST:
+        await update.message.reply_text("⛔️ Доступ запрещен.")
+        return
+
+    if profiler.busy:
+        await update.message.reply_text("⏳ Профилирование уже идет.")
+        return
+
+    max_seconds = context.application.settings.PROFILE_MAX_SECONDS
+    try:
+        seconds = min(max(int(context.args[0]), 1), max_seconds) if context.args else 10
+    except ValueError:
+        await update.message.reply_text(f"Использование: /profile <секунды, 1-{max_seconds}>")
+        return
+
+    await update.message.reply_text(f"🔬 Профилирую {seconds} сек...")
+    collapsed = await profiler.profile(seconds)
+    await update.message.reply_document(
+        document=io.BytesIO(collapsed.encode("utf-8")),
+        filename=f"profile_{seconds}s.folded",
+        caption="🔥 Collapsed stacks (flamegraph.pl / speedscope)"
+    )
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles /stats: play statistics for admins."""
+    user_id = update.effective_user.id
+    if user_id not in context.application.settings.ADMIN_ID_LIST:
+        await update.message.reply_text("⛔️ Доступ запрещен.")
+        return
+
+    stats = context.application.stats
+    if not stats:
+        await update.message.reply_text("📊 Статистика выключена (STATS_ENABLED=false).")
+        return
+
+    summary = await stats.summary()
+    lines = [
+        "📊 *Статистика за 24 часа*",
+        f"Прослушиваний: {summary['events_24h']} (успешно {summary['ok_24h']})",
+        f"Среднее время старта: {summary['avg_latency_ms'] / 1000:.1f} с",
+        f"Горячих треков в кэше: {summary['hot_tracks']}",
+        "",
+        "🔥 *Топ треков*",
+    ]
+    lines += [f"{i}. {(title or track_id).replace('*', '')} — {plays}" for i, (track_id, title, plays, _) in enumerate(summary["top_tracks"], 1)]
+    lines += ["", "📻 *Топ волн*"]
+    lines += [f"{i}. {genre} — {plays}" for i, (genre, plays, _) in enumerate(summary["top_genres"], 1)]
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /status command."""
     # A simple status for now, can be expanded later
@@ -104,7 +161,12 @@ async def _do_ai_chat_background(chat_id: int, text: str, user_name: str, contex
 
 async def _do_search_background(chat_id: int, query: str, context: ContextTypes.DEFAULT_TYPE):
     """Handles music search and download in the background."""
-    tracks = await context.application.downloader.search(query, limit=1)
+    with tracing.start_trace("telegram.search", chat_id=chat_id, query=query):
+        await _search_and_send(chat_id, query, context)
+
+async def _search_and_send(chat_id: int, query: str, context: ContextTypes.DEFAULT_TYPE):
+    downloader = context.application.downloader
+    tracks = await downloader.search(query, limit=1, priority=Priority.TG_SEARCH, chat_id=chat_id)
     if not tracks:
         await context.bot.send_message(chat_id, f"❌ По запросу '{query}' ничего не найдено.", reply_markup=get_persistent_menu())
         return
@@ -112,28 +174,65 @@ async def _do_search_background(chat_id: int, query: str, context: ContextTypes.
     track = tracks[0]
     await context.bot.send_message(chat_id, f"⬇️ Загружаю: *{track.title}*...", parse_mode=ParseMode.MARKDOWN, reply_markup=get_persistent_menu())
 
-    dl_result = await context.application.downloader.download(track.identifier, track)
+    started = time.monotonic()
+    dl_result = await downloader.download(track.identifier, track, priority=Priority.TG_SEARCH, chat_id=chat_id)
+    if context.application.stats:
+        context.application.stats.record(
+            track.identifier, "ok" if dl_result and dl_result.success else "failed", time.monotonic() - started,
+            chat_id=chat_id, title=track.title
+        )
     if dl_result and dl_result.success:
-        try:
-            with open(dl_result.file_path, 'rb') as f:
-                keyboard = None
-                if context.application.settings.BASE_URL:
-                    keyboard = InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🎧 Веб-плеер", url=context.application.settings.BASE_URL)
-                    ]])
+        await _send_downloaded_audio(chat_id, dl_result, context)
+    else:
+        await context.bot.send_message(chat_id, "❌ Не удалось скачать аудио для этого трека.", reply_markup=get_persistent_menu())
 
+async def _send_downloaded_audio(chat_id: int, dl_result, context: ContextTypes.DEFAULT_TYPE):
+    """Sends a downloaded track to the chat and removes the local file."""
+    try:
+        with open(dl_result.file_path, 'rb') as f:
+            keyboard = None
+            if context.application.settings.BASE_URL:
+                keyboard = InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🎧 Веб-плеер", url=context.application.settings.BASE_URL)
+                ]])
+
+            with tracing.span("telegram.send_audio"):
                 await context.bot.send_audio(
                     chat_id, audio=f,
                     caption=f"▶️ *{dl_result.track_info.title}*\n👤 {dl_result.track_info.uploader}",
                     parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard
                 )
-        finally:
+    finally:
+        # Популярные треки остаются на диске для повторов, остальные удаляем
+        stats = context.application.stats
+        if not (stats and stats.should_admit(dl_result.track_info.identifier)):
             try:
                 os.unlink(dl_result.file_path)
             except Exception as e:
                 logger.warning(f"Failed to delete downloaded file: {e}")
-    else:
-        await context.bot.send_message(chat_id, "❌ Не удалось скачать аудио для этого трека.", reply_markup=get_persistent_menu())
+
+async def _do_spotify_background(chat_id: int, url: str, context: ContextTypes.DEFAULT_TYPE):
+    """Handles Spotify track, album and playlist links; tracks are sent as soon as each is ready."""
+    spotify = context.application.spotify
+    if spotify.is_collection_url(url):
+        await context.bot.send_message(chat_id, "📥 Загружаю подборку из Spotify, треки будут приходить по мере готовности...", reply_markup=get_persistent_menu())
+
+    sent, failed = 0, 0
+    async for dl_result in spotify.stream_from_url(url):
+        if dl_result.success and dl_result.file_path:
+            try:
+                await _send_downloaded_audio(chat_id, dl_result, context)
+                sent += 1
+            except Exception as e:
+                logger.error(f"Failed to send Spotify track: {e}")
+                failed += 1
+        else:
+            failed += 1
+
+    if not sent:
+        await context.bot.send_message(chat_id, "❌ Не удалось загрузить треки по этой ссылке Spotify.", reply_markup=get_persistent_menu())
+    elif failed:
+        await context.bot.send_message(chat_id, f"✅ Готово: {sent}, не найдено: {failed}.", reply_markup=get_persistent_menu())
 
 # --- MAIN HANDLERS ---
 
@@ -212,6 +311,11 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await _do_radio(chat_id, "random", context, name="🎲 Случайная волна")
         return
 
+    spotify = getattr(context.application, "spotify", None)
+    if spotify and spotify.is_spotify_url(text):
+        asyncio.create_task(_do_spotify_background(chat_id, text.strip(), context))
+        return
+
     mode = context.chat_data.get("mode", "default")
     analysis = await analyze_message(text, mode=mode)
     
@@ -240,12 +344,14 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error("Exception while handling an update:", exc_info=context.error)
 
 
-def setup_handlers(app, radio, settings, downloader):
+def setup_handlers(app, radio, settings, downloader, spotify=None, stats=None):
     """Registers all handlers with the application."""
     # Register an error handler first
     app.add_error_handler(error_handler)
     
     app.downloader = downloader
+    app.spotify = spotify
+    app.stats = stats
     app.radio_manager = radio
     app.settings = settings
     
@@ -255,7 +361,12 @@ def setup_handlers(app, radio, settings, downloader):
     app.add_handler(CommandHandler("radio", radio_command))
     app.add_handler(CommandHandler("status", status_command))
     app.add_handler(CommandHandler("admin", admin_command))
+    # Профиль снимается до PROFILE_MAX_SECONDS — не держим ради него очередь апдейтов всех чатов
+    app.add_handler(CommandHandler("profile", profile_command, block=False))
+    app.add_handler(CommandHandler("stats", stats_command))
 
     # Other Handlers
     app.add_handler(CallbackQueryHandler(button_callback))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
\ No newline at end of file
+    # С AI_BATCH_ENABLED хендлер не блокирует очередь: иначе PTB ждет ответа LLM на каждое
+    # сообщение по одному и батчеру нечего собирать в пачку (каждое платит окно и идет в LLM одно)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler, block=not settings.AI_BATCH_ENABLED))
\ No newline at end of file
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger("hls")
+
+PLAYLIST = "index.m3u8"
+# Имена, которые вообще может запросить плеер: все остальное — 404 без обращения к диску
+_TRACK_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_MEDIA_NAME = re.compile(r"^(init\.mp4|seg_\d{5}\.m4s)$")
+_VERSION = re.compile(r"^[0-9a-f]{12}$")
+
+MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".mp4": "audio/mp4", ".m4s": "video/iso.segment"}
+
+class HlsPackager:
+    """
+    HLS (fMP4/AAC) из готового mp3: плейлист и сегменты нарезаются один раз на трек
+    и дальше отдаются как статика:
+    - downloads/hls/{id}/index.m3u8 — плейлист, ссылается на {version}/...;
+    - downloads/hls/{id}/{version}/init.mp4, seg_*.m4s — version = хэш содержимого,
+      поэтому сегменты можно кэшировать навсегда: перенарезка (после вытеснения,
+      с другим битрейтом или ffmpeg) дает новые URL, а не подменяет старые.
+    Сборка идет во временной папке и публикуется переименованием — плеер никогда
+    не видит недописанный плейлист.
+    """
+
+    def __init__(self, root: Path, segment_seconds: int = 6, bitrate: str = "128k", timeout: float = 300.0):
+        self._root = root
+        self._segment_seconds = segment_seconds
+        self._bitrate = bitrate
+        self._timeout = timeout
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._drop_unversioned()
+
+    def _drop_unversioned(self):
+        """Нарезки старого формата (сегменты рядом с плейлистом) пересоберутся при следующем запросе."""
+        for entry in os.scandir(self._root):
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "init.mp4")):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @staticmethod
+    def valid_id(video_id: str) -> bool:
+        return bool(_TRACK_ID.match(video_id))
+
+    def file(self, video_id: str, name: str, version: Optional[str] = None) -> Optional[Path]:
+        """Без version — только плейлист; init и сегменты — только внутри своей версии."""
+        if not self.valid_id(video_id): return None
+        if version is None:
+            return self._root / video_id / PLAYLIST if name == PLAYLIST else None
+        if not _VERSION.match(version) or not _MEDIA_NAME.match(name): return None
+        return self._root / video_id / version / name
+
+    @staticmethod
+    def _version(work: Path) -> str:
+        digest = hashlib.md5()
+        for path in sorted(p for p in work.iterdir() if _MEDIA_NAME.match(p.name)):
+            digest.update(path.name.encode())
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def _versioned(playlist: str, version: str) -> str:
+        """URI сегментов и init.mp4 в плейлисте ffmpeg -> {version}/имя."""
+        playlist = re.sub(r'URI="(init\.mp4)"', rf'URI="{version}/\1"', playlist)
+        return re.sub(r"^(seg_\d{5}\.m4s)$", rf"{version}/\1", playlist, flags=re.MULTILINE)
+
+    def _package(self, source: Path, video_id: str) -> bool:
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            logger.warning("ffmpeg not found: HLS disabled")
+            return False
+        work = Path(tempfile.mkdtemp(prefix=f".{video_id}-", dir=self._root))
+        try:
+            proc = subprocess.run([
+                ffmpeg, "-hide_banner", "-nostdin", "-y", "-i", str(source), "-vn",
+                "-c:a", "aac", "-b:a", self._bitrate,
+                "-f", "hls", "-hls_time", str(self._segment_seconds), "-hls_playlist_type", "vod",
+                "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+                "-hls_segment_filename", str(work / "seg_%05d.m4s"), str(work / PLAYLIST),
+            ], capture_output=True, text=True, timeout=self._timeout)
+            if proc.returncode != 0 or not (work / PLAYLIST).exists():
+                logger.warning(f"HLS packaging failed for {video_id}: {proc.stderr[-300:]}")
+                return False
+            version = self._version(work)
+            (work / version).mkdir()
+            for path in list(work.iterdir()):
+                if _MEDIA_NAME.match(path.name):
+                    os.replace(path, work / version / path.name)
+            playlist = work / PLAYLIST
+            playlist.write_text(self._versioned(playlist.read_text(), version))
+            target = self._root / video_id
+            if target.exists(): shutil.rmtree(target, ignore_errors=True)
+            os.replace(work, target)
+            return True
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"HLS packaging failed for {video_id}: {e}")
+            return False
+        finally:
+            if work.exists(): shutil.rmtree(work, ignore_errors=True)
+
+    async def ensure(self, video_id: str, source: Path) -> Optional[Path]:
+        """Путь к плейлисту трека; нарезка — только при первом запросе, параллельные ждут ее же."""
+        playlist = self._root / video_id / PLAYLIST
+        if await asyncio.to_thread(playlist.exists):
+            return playlist
+        task = self._tasks.get(video_id)
+        if task is None:
+            task = asyncio.create_task(asyncio.to_thread(self._package, source, video_id))
+            self._tasks[video_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(video_id, None))
+        return playlist if await asyncio.shield(task) else None
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("intent_batcher")
+
+class IntentBatcher:
+    """
+    Собирает сообщения за короткое окно и отправляет их в LLM одним запросом.
+    Сообщения группируются по режиму (персоне), т.к. у каждого режима свой системный промпт.
+    """
+
+    def __init__(self, manager, window_ms: int = 25, max_size: int = 8):
+        self._manager = manager
+        self._window = max(window_ms, 0) / 1000
+        self._max_size = max(max_size, 1)
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # Ссылки на идущие запросы пачек, чтобы задачи не собрал GC
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def analyze(self, text: str, mode: str = "default") -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        bucket = self._pending.setdefault(mode, [])
+        bucket.append((text, future))
+
+        if len(bucket) >= self._max_size:
+            self._flush(mode)
+        elif len(bucket) == 1:
+            # Первое сообщение в пачке запускает таймер — дольше окна никто не ждет
+            self._timers[mode] = loop.call_later(self._window, self._flush, mode)
+
+        return await future
+
+    def _flush(self, mode: str):
+        timer: Optional[asyncio.TimerHandle] = self._timers.pop(mode, None)
+        if timer: timer.cancel()
+
+        bucket = self._pending.pop(mode, [])
+        if bucket:
+            task = asyncio.create_task(self._run(mode, bucket))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, mode: str, bucket: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in bucket]
+        try:
+            if len(texts) == 1:
+                results = [await self._manager.analyze_message(texts[0], mode)]
+            else:
+                logger.debug(f"Batched intent request: {len(texts)} messages (mode={mode})")
+                results = await self._manager.analyze_batch(texts, mode)
+                if len(results) != len(texts):
+                    # Иначе zip оставит хвост пачки ждать вечно
+                    raise ValueError(f"batch returned {len(results)} results for {len(texts)} messages")
+
+            for (_, future), result in zip(bucket, results):
+                if not future.done(): future.set_result(result)
+        except Exception as e:
+            logger.error(f"Intent batch failed: {e}")
+            for _, future in bucket:
+                if not future.done(): future.set_exception(e)
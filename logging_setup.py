@@ -1,8 +1,11 @@
 import logging
+import logging.handlers
 import sys
+from pathlib import Path
+from typing import Optional
 
-def setup_logging():
-    """Настройка логирования для приложения"""
+def setup_logging(trace_file: Optional[Path] = None, trace_max_mb: int = 50):
+    """Настройка логирования для приложения (и экспорта трейсов в JSON lines)"""
     
     # Формат логов
     log_format = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
@@ -27,5 +30,16 @@ def setup_logging():
     # Наши логгеры
     logging.getLogger("radio").setLevel(logging.DEBUG)
     logging.getLogger("handlers").setLevel(logging.DEBUG)
+
+    # Трейсы: одна span на строку, отдельно от обычных логов; размер файла ограничен ротацией
+    if trace_file:
+        trace_handler = logging.handlers.RotatingFileHandler(
+            trace_file, maxBytes=trace_max_mb * 2**20, backupCount=1, encoding="utf-8"
+        )
+        trace_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger = logging.getLogger("trace")
+        trace_logger.addHandler(trace_handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
     
     logging.info("Logging configured successfully")
\ No newline at end of file
@@ -1,23 +1,46 @@
 import logging
 import asyncio
+import hashlib
+import hmac
+import time
 from pathlib import Path
+from typing import Dict, List, Optional, Set
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from config import get_settings
 from youtube import YouTubeDownloader
+from concurrency import Priority
+from audio_processing import LoudnessNormalizer, transcode_opus
 from cache_service import CacheService
 from ai_manager import ai_instance as ai_manager
-from radio import RadioManager
+from radio import RadioManager, catalog_queries
+from prewarm import Prewarmer
+from stats_store import StatsStore
+from disk_janitor import DiskJanitor
+from related_graph import RelatedGraph
+from broadcaster import BroadcastHub
+from hls import HlsPackager, MEDIA_TYPES as HLS_MEDIA_TYPES, PLAYLIST as HLS_PLAYLIST
+from proxy_manager import ProxyManager
+from proxy_checker import ProxyChecker
+from spotify import SpotifyService
+import metrics
+import tracing
+import playlist_page
+from logging_setup import setup_logging
+from profiler import profiler, LoopLagMonitor, BlockingWatchdog
+from update_queue import UpdateQueue
+from sharding import ShardCoordinator, default_worker_id
+from persistence import CachePersistence
 
 
-logging.basicConfig(level=logging.INFO)
+settings = get_settings()
+setup_logging(settings.BASE_DIR / settings.TRACE_FILE if settings.TRACE_FILE else None, settings.TRACE_FILE_MAX_MB)
 logger = logging.getLogger("main")
 
-settings = get_settings()
 app = FastAPI()
 
 app.add_middleware(
@@ -29,7 +52,46 @@ app.add_middleware(
 )
 
 cache_service = CacheService(settings.CACHE_DB_PATH)
-downloader = YouTubeDownloader(settings, cache_service)
+proxy_manager = ProxyManager(
+    settings.BASE_DIR,
+    health_url=settings.PROXY_HEALTH_URL,
+    health_interval=settings.PROXY_HEALTH_INTERVAL,
+    cooldown=settings.PROXY_COOLDOWN,
+    checker=ProxyChecker(
+        test_url=settings.PROXY_HEALTH_URL,
+        concurrency=settings.PROXY_CHECK_CONCURRENCY,
+        timeout=settings.PROXY_CHECK_TIMEOUT,
+        max_failures=settings.PROXY_CHECK_MAX_FAILURES,
+    ),
+    check_interval=settings.PROXY_CHECK_INTERVAL,
+) if settings.PROXY_ENABLED else None
+normalizer = LoudnessNormalizer(
+    cache_service, target_i=settings.LOUDNORM_TARGET_I, workers=settings.LOUDNORM_WORKERS,
+) if settings.LOUDNORM_ENABLED else None
+downloader = YouTubeDownloader(settings, cache_service, proxy_manager, normalizer)
+spotify_service = SpotifyService(settings, downloader, cache_service)
+related_graph = RelatedGraph(downloader, cache_service)
+broadcast_hub = BroadcastHub(settings.STATION_KEY_SECRET or settings.BOT_TOKEN)
+hls_packager = HlsPackager(
+    settings.DOWNLOADS_DIR / "hls", segment_seconds=settings.HLS_SEGMENT_SECONDS, bitrate=settings.HLS_BITRATE,
+) if settings.HLS_ENABLED else None
+stats = StatsStore(settings.CACHE_DB_PATH, admit_score=settings.STATS_ADMIT_SCORE) if settings.STATS_ENABLED else None
+janitor = DiskJanitor(
+    settings.DOWNLOADS_DIR, keep=stats.should_admit if stats else None,
+    interval=settings.DISK_EVICT_INTERVAL, min_age=settings.DISK_EVICT_MIN_AGE,
+)
+prewarmer = Prewarmer(
+    downloader, catalog_queries(),
+    genres=settings.PREWARM_GENRES, pool_size=settings.PREWARM_POOL_SIZE, interval=settings.PREWARM_INTERVAL,
+    stats=stats,
+) if settings.PREWARM_ENABLED else None
+loop_monitor = LoopLagMonitor(settings.LOOP_LAG_THRESHOLD_MS)
+watchdog = BlockingWatchdog(settings.LOOP_BLOCK_DEBUG_MS)
+coordinator = ShardCoordinator(
+    settings.SHARDING_DB_PATH,
+    worker_id=settings.WORKER_ID or default_worker_id(),
+    lease_ttl=settings.SHARD_LEASE_TTL,
+) if settings.SHARDING_ENABLED else None
 
 
 Path("static").mkdir(exist_ok=True)
@@ -39,42 +101,130 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def startup_event():
     """Starts the bot in polling mode for GitHub Actions deployment."""
     await cache_service.initialize()
+    if stats:
+        await stats.initialize()
+        stats.start()
+    janitor.start()
+    loop_monitor.start()
+    watchdog.start()
+    if proxy_manager:
+        proxy_manager.start()
     from telegram.ext import Application
     from handlers import setup_handlers
 
-    logger.info("Starting bot in polling mode...")
+    webhook_mode = bool(settings.WEBHOOK_URL)
+    logger.info(f"Starting bot in {'webhook' if webhook_mode else 'polling'} mode...")
+    if coordinator and not webhook_mode:
+        logger.warning("SHARDING_ENABLED without WEBHOOK_URL: only one worker can poll Telegram")
 
     # Build application
-    application = Application.builder().token(settings.BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(settings.BOT_TOKEN)
+        .request(metrics.InstrumentedRequest(connection_pool_size=256))
+        .persistence(CachePersistence(settings.CACHE_DB_PATH))
+        .build()
+    )
 
     # Setup components
-    radio_manager = RadioManager(application.bot, settings, downloader)
-    setup_handlers(application, radio_manager, settings, downloader)
+    radio_manager = RadioManager(application.bot, settings, downloader, prewarmer, stats, related_graph, broadcast_hub)
+    setup_handlers(application, radio_manager, settings, downloader, spotify_service, stats)
     
     # Initialize
     await application.initialize()
     await application.start()
     
-    # ✅ FIX: Explicitly start polling (non-blocking method)
-    if application.updater:
-        await application.updater.start_polling()
-    
-    logger.info("✅ Bot has been initialized and polling is ACTUALLY running.")
-
     app.state.application = application
     app.state.radio_manager = radio_manager
+    if prewarmer:
+        prewarmer.start()
+
+    update_queue = None
+    if webhook_mode:
+        update_queue = UpdateQueue(application, workers=settings.WEBHOOK_WORKERS, maxsize=settings.WEBHOOK_QUEUE_SIZE)
+        update_queue.start()
+        app.state.update_queue = update_queue
+    if coordinator:
+        await coordinator.initialize()
+        # Пересланные апдейты уже прошли дедупликацию на принявшем воркере
+        coordinator.install(
+            application, (lambda u: update_queue.submit(u, dedup=False)) if update_queue else None,
+            # Играющее радио живет в этом процессе — такой чат не переезжает на новый воркер
+            pinned=radio_manager.is_active,
+            on_acquire=application.persistence.invalidate,
+        )
+        coordinator.start()
+
+    if webhook_mode:
+        await application.bot.set_webhook(
+            url=f"{settings.WEBHOOK_URL.rstrip('/')}/telegram",
+            secret_token=settings.WEBHOOK_SECRET or None,
+            max_connections=100,
+        )
+        logger.info("✅ Bot has been initialized, webhook is set.")
+    # ✅ FIX: Explicitly start polling (non-blocking method)
+    elif application.updater:
+        await application.updater.start_polling()
+        logger.info("✅ Bot has been initialized and polling is ACTUALLY running.")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    loop_monitor.stop()
+    watchdog.stop()
+    broadcast_hub.close()
+    if prewarmer:
+        prewarmer.stop()
+    janitor.stop()
+    if stats:
+        await stats.stop()
+    if normalizer:
+        normalizer.close()
+    if proxy_manager:
+        await proxy_manager.stop()
+    if coordinator:
+        await coordinator.stop()
     if 'application' in app.state:
         application = app.state.application
-        # Stop polling and app
-        if application.updater:
+        # Stop polling/webhook queue and app
+        update_queue = getattr(app.state, 'update_queue', None)
+        if update_queue:
+            await update_queue.stop()
+        elif application.updater:
             await application.updater.stop()
         await application.stop()
         await application.shutdown()
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _is_admin(token: str) -> bool:
+    # Пустой ADMIN_API_TOKEN выключает админские эндпоинты целиком
+    return bool(settings.ADMIN_API_TOKEN) and hmac.compare_digest(token, settings.ADMIN_API_TOKEN)
+
+@app.get("/debug/traces")
+async def debug_traces(token: str = "", limit: int = 20, name: Optional[str] = None):
+    """Admin-only: slowest recent traces (radio.track, telegram.search, web.stream) with their spans."""
+    if not _is_admin(token):
+        return JSONResponse(status_code=403, content={"error": "Forbidden"})
+    return {"traces": [t.to_dict() for t in tracing.store.slowest(limit, name)]}
+
+@app.get("/debug/profile")
+async def debug_profile(token: str = "", seconds: int = 10):
+    """Admin-only sampling profile; returns collapsed stacks for flamegraph tools."""
+    if not _is_admin(token):
+        return JSONResponse(status_code=403, content={"error": "Forbidden"})
+    if profiler.busy:
+        return JSONResponse(status_code=409, content={"error": "Profiling already in progress"})
+
+    seconds = min(max(seconds, 1), settings.PROFILE_MAX_SECONDS)
+    collapsed = await profiler.profile(seconds)
+    return PlainTextResponse(
+        collapsed, headers={"Content-Disposition": f'attachment; filename="profile_{seconds}s.folded"'}
+    )
+
 class AIRequest(BaseModel):
     prompt: str
 
@@ -83,56 +233,250 @@ async def api_ai_chat(request: AIRequest):
     resp = await ai_manager.get_chat_response(request.prompt)
     return {"response": resp}
 
+class PrefetchRequest(BaseModel):
+    ids: List[str]
+
+class PlayedRequest(BaseModel):
+    id: str
+    latency: float = 0.0  # От ▶ до начала звука, сек (замер плеера)
+
+# Фоновые прогревы: ссылки держим, чтобы задачи не собрал GC
+_prefetch_tasks: Set[asyncio.Task] = set()
+# Прогрев плеера занимает не больше стольких слотов загрузки: остальные свободны для /stream.
+# Трек, до которого очередь прогрева не дошла, /stream качает сам с приоритетом WEB_STREAM.
+_prefetch_slots = asyncio.Semaphore(settings.PLAYER_PREFETCH_CONCURRENCY)
+
+async def _warm_track(video_id: str):
+    try:
+        async with _prefetch_slots:
+            track_info = await cache_service.get(f"meta:{video_id}")
+            # Ниже приоритетом, чем /stream; если /stream присоединится к этой загрузке,
+            # планировщик поднимет ее до WEB_STREAM (YouTubeDownloader.download)
+            result = await downloader.download(video_id, track_info=track_info, priority=Priority.RADIO_PREFETCH)
+            if hls_packager and result.success and result.file_path:
+                await hls_packager.ensure(video_id, result.file_path)
+    except Exception as e:
+        logger.warning(f"Player prefetch failed for {video_id}: {e}")
+
+def _schedule_prefetch(video_ids: List[str]) -> int:
+    for video_id in video_ids:
+        task = asyncio.create_task(_warm_track(video_id))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+    return len(video_ids)
+
+# Одинаковые запросы в полете (быстрый набор в поиске) ждут один поиск
+_search_tasks: Dict[str, asyncio.Task] = {}
+
+async def _search_snapshot(normalized: str) -> dict:
+    """Выдача по запросу целиком: из кэша search:{query} или один живой поиск с запасом на несколько страниц."""
+    cache_key = f"search:{normalized}"
+    snapshot = await cache_service.get(cache_key)
+    if snapshot is not None:
+        return snapshot
+    task = _search_tasks.get(normalized)
+    if task is None:
+        task = asyncio.create_task(_fetch_snapshot(normalized, cache_key))
+        _search_tasks[normalized] = task
+        task.add_done_callback(lambda _: _search_tasks.pop(normalized, None))
+    return await asyncio.shield(task)
+
+async def _fetch_snapshot(normalized: str, cache_key: str) -> dict:
+    tracks = await downloader.search(normalized, limit=settings.PLAYER_SEARCH_FETCH)
+    snapshot = {"etag": playlist_page.snapshot_etag(tracks), "tracks": tracks}
+    # Метаданные для /stream и снимок выдачи — одной транзакцией; популярные треки живут дольше
+    entries = [(f"meta:{t.identifier}", t, stats.meta_ttl(t.identifier) if stats else 3600) for t in tracks]
+    if tracks:
+        entries.append((cache_key, snapshot, settings.PLAYER_SEARCH_CACHE_TTL))
+    await cache_service.set_many(entries)
+    return snapshot
+
 @app.get("/api/player/playlist")
-async def api_playlist(query: str):
-    if not query: return {"playlist": []}
-    tracks = await downloader.search(query, limit=20)
-    for t in tracks:
-        await cache_service.set(f"meta:{t.identifier}", t, ttl=3600)
-    return {
-        "playlist": [
-            {
-                "identifier": t.identifier,
-                "title": t.title,
-                "artist": getattr(t, 'uploader', 'Unknown'),
-                "duration": t.duration,
-                "cover": t.thumbnail_url
-            }
-            for t in tracks
-        ]
-    }
+async def api_playlist(request: Request, query: str, cursor: Optional[str] = None, limit: int = 20,
+                       fields: Optional[str] = None):
+    """
+    Страница выдачи: cursor — из next_cursor предыдущего ответа, fields — список полей через запятую.
+    Повторы и следующие страницы отдаются из снимка в кэше, без обращения к YTMusic.
+    Если снимок сменился (истек и найден заново), курсор от старого получает 410: листать с начала.
+    """
+    normalized = playlist_page.normalize_query(query)
+    if not normalized: return {"playlist": [], "next_cursor": None}
+    try:
+        cursor_snapshot, offset = playlist_page.parse_cursor(cursor)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Invalid cursor"})
+    limit = min(max(limit, 1), settings.PLAYER_PAGE_MAX)
+    selected = playlist_page.select_fields(fields)
+
+    snapshot = await _search_snapshot(normalized)
+    tracks = snapshot["tracks"]
+    if cursor_snapshot is not None and cursor_snapshot != snapshot["etag"]:
+        return JSONResponse(status_code=410, content={"error": "restart"})
+    etag = playlist_page.page_etag(snapshot["etag"], offset, limit, selected)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if playlist_page.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if offset == 0:
+        # Начало плейлиста качается заранее: первый ▶ не ждет SoundCloud
+        _schedule_prefetch([t.identifier for t in tracks[:min(limit, settings.PLAYER_PREFETCH_TRACKS)]])
+    return JSONResponse(headers=headers, content=playlist_page.render_page(tracks, snapshot["etag"], offset, limit, selected))
+
+@app.post("/api/player/prefetch")
+async def api_prefetch(request: PrefetchRequest):
+    """Плеер сообщает, что будет играть дальше; сервер докачивает это в фоне."""
+    ids = list(dict.fromkeys(request.ids))[:settings.PLAYER_PREFETCH_TRACKS]
+    return {"scheduled": _schedule_prefetch(ids)}
+
+@app.post("/api/player/played")
+async def api_played(request: PlayedRequest):
+    """
+    Плеер сообщает, что трек реально зазвучал. Запросы /stream для статистики не годятся:
+    запасной <audio> грузит следующий трек заранее, и каждая подгрузка выглядела бы прослушиванием.
+    """
+    # Считаем только треки, которые сервер сам выдавал в плейлист
+    if stats and await cache_service.get(f"meta:{request.id}") is not None:
+        stats.record(request.id, "ok", min(max(request.latency, 0.0), 60.0))
+    return {"status": "ok"}
+
+@app.get("/api/radio/{chat_id}/events")
+async def api_radio_events(chat_id: int, key: str = ""):
+    """SSE: что сейчас играет на волне чата. Один broadcaster на станцию, слушателей сколько угодно."""
+    # key — из ссылки «Веб-плеер» под треком радио
+    if not broadcast_hub.verify(chat_id, key):
+        return JSONResponse(status_code=403, content={"error": "Forbidden"})
+    return StreamingResponse(
+        broadcast_hub.sse(chat_id), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/stream/{video_id}")
-async def stream_track(video_id: str):
-    final_path = settings.DOWNLOADS_DIR / f"{video_id}.mp3"
-    
-    if final_path.exists() and final_path.stat().st_size > 10000:
-        return FileResponse(final_path, media_type="audio/mpeg")
+async def stream_track(video_id: str, request: Request, quality: str = "high"):
+    started = time.monotonic()
+    with tracing.start_trace("web.stream", track_id=video_id):
+        response = await _stream_track(video_id, quality)
+    # Прослушивания приходят от плеера (/api/player/played); отсюда — только сбои отдачи.
+    # Плеер докачивает файл Range-запросами — сбой считаем один раз, на начале файла
+    if stats and response.status_code != 200 and request.headers.get("range", "bytes=0-").startswith("bytes=0-"):
+        stats.record(video_id, "failed", time.monotonic() - started)
+    return response
 
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+# Файл трека по id не меняется — браузер может держать его у себя
+STREAM_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+_low_quality_tasks: Dict[str, asyncio.Task] = {}
+
+async def _low_quality(video_id: str, source: Path) -> Optional[Path]:
+    """{id}.low.ogg рядом с mp3; одновременные запросы ждут одно перекодирование."""
+    target = settings.DOWNLOADS_DIR / f"{video_id}.low.ogg"
+    if await asyncio.to_thread(_file_size, target) > 1000:
+        return target
+    task = _low_quality_tasks.get(video_id)
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(transcode_opus, source, target, settings.STREAM_LOW_BITRATE))
+        _low_quality_tasks[video_id] = task
+        task.add_done_callback(lambda _: _low_quality_tasks.pop(video_id, None))
+    return target if await asyncio.shield(task) else None
+
+async def _local_mp3(video_id: str) -> Optional[Path]:
+    """mp3 трека из общего хранилища; нет на диске — качаем (параллельные запросы ждут одну загрузку)."""
+    final_path = settings.DOWNLOADS_DIR / f"{video_id}.mp3"
+    if await asyncio.to_thread(_file_size, final_path) > 10000:
+        return final_path
     track_info = await cache_service.get(f"meta:{video_id}")
     result = await downloader.download(video_id, track_info=track_info)
-    
-    if result.success and result.file_path:
-        return FileResponse(result.file_path, media_type="audio/mpeg")
-    
-    return JSONResponse(status_code=404, content={"error": "Download failed"})
+    return result.file_path if result.success and result.file_path else None
+
+async def _stream_track(video_id: str, quality: str = "high"):
+    final_path = await _local_mp3(video_id)
+    if not final_path:
+        return JSONResponse(status_code=404, content={"error": "Download failed"})
+
+    if quality == "low":
+        # Без ffmpeg или при сбое перекодирования — обычный mp3
+        low_path = await _low_quality(video_id, final_path)
+        if low_path:
+            return FileResponse(low_path, media_type="audio/ogg", headers=STREAM_CACHE_HEADERS)
+    return FileResponse(final_path, media_type="audio/mpeg", headers=STREAM_CACHE_HEADERS)
+
+# Сегменты лежат под хэшем содержимого: по такому URL байты никогда не меняются.
+# Плейлист по постоянному URL после перенарезки указывает на новую версию (старой на диске уже нет),
+# поэтому он всегда перепроверяется: no-cache + ETag, в ответ обычно 304
+HLS_SEGMENT_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+@app.get(f"/hls/{{video_id}}/{HLS_PLAYLIST}")
+async def hls_playlist(request: Request, video_id: str):
+    """HLS трека: плейлист нарезается при первом запросе."""
+    path = hls_packager.file(video_id, HLS_PLAYLIST) if hls_packager else None
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    if not await asyncio.to_thread(path.exists):
+        source = await _local_mp3(video_id)
+        if not source or not await hls_packager.ensure(video_id, source):
+            return JSONResponse(status_code=404, content={"error": "Download failed"})
+    try:
+        content = await asyncio.to_thread(path.read_bytes)
+    except FileNotFoundError:
+        # Вытеснен между проверкой и чтением — плеер перезапросит
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    headers = {"ETag": f'"{hashlib.md5(content).hexdigest()[:16]}"', "Cache-Control": "no-cache"}
+    if playlist_page.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=HLS_MEDIA_TYPES[path.suffix], headers=headers)
+
+@app.get("/hls/{video_id}/{version}/{name}")
+async def hls_segment(video_id: str, version: str, name: str):
+    """init.mp4 и сегменты версии из плейлиста — статика из downloads/hls."""
+    path = hls_packager.file(video_id, name, version) if hls_packager else None
+    if path is None or not await asyncio.to_thread(path.exists):
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    return FileResponse(path, media_type=HLS_MEDIA_TYPES[path.suffix], headers=HLS_SEGMENT_HEADERS)
 
 @app.post("/telegram")
 async def telegram_webhook(request: Request):
+    # Отвечаем сразу: обработка идет в UpdateQueue, медленный хендлер не держит запрос Telegram
+    if settings.WEBHOOK_SECRET and request.headers.get("x-telegram-bot-api-secret-token") != settings.WEBHOOK_SECRET:
+        return JSONResponse(status_code=403, content={"error": "Forbidden"})
+    update_queue: Optional[UpdateQueue] = getattr(app.state, 'update_queue', None)
+    if update_queue is None:
+        return JSONResponse(status_code=503, content={"error": "Webhook mode is not enabled"})
     try:
         data = await request.json()
         from telegram import Update
-        application = app.state.application
-        update = Update.de_json(data, application.bot)
-        await application.process_update(update)
+        update = Update.de_json(data, app.state.application.bot)
     except Exception as e:
         logger.error(f"Webhook error: {e}")
+        return {"status": "ok"}
+    if not update_queue.submit(update):
+        return JSONResponse(status_code=503, content={"error": "Busy"})
     return {"status": "ok"}
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
+# index.html читается один раз (в потоке) и отдается из памяти с ETag
+_index_page: Optional[tuple] = None
+
+def _load_index_page() -> Optional[tuple]:
     try:
-        with open("static/index.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
+        content = Path("static/index.html").read_bytes()
     except FileNotFoundError:
-        return HTMLResponse(content="<h1>System Error</h1>", status_code=404)
\ No newline at end of file
+        return None
+    return content, f'"{hashlib.md5(content).hexdigest()}"'
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    global _index_page
+    if _index_page is None:
+        _index_page = await asyncio.to_thread(_load_index_page)
+    if _index_page is None:
+        return HTMLResponse(content="<h1>System Error</h1>", status_code=404)
+
+    content, etag = _index_page
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=content, headers=headers)
@@ -0,0 +1,115 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from telegram.request import HTTPXRequest
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+# --- Downloader ---
+DOWNLOADER_STAGE_SECONDS = Histogram(
+    "aurora_downloader_stage_seconds", "YouTubeDownloader latency by operation and stage",
+    ["operation", "stage"], buckets=LATENCY_BUCKETS,
+)
+DOWNLOADS_TOTAL = Counter("aurora_downloads_total", "Download results", ["result"])
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "aurora_scheduler_wait_seconds", "Time spent waiting for a search/download slot", ["kind", "priority"], buckets=LATENCY_BUCKETS,
+)
+DOWNLOAD_CONCURRENCY_LIMIT = Gauge("aurora_download_concurrency_limit", "Current adaptive download concurrency limit")
+
+# --- Cache ---
+CACHE_REQUESTS_TOTAL = Counter("aurora_cache_requests_total", "CacheService lookups by key prefix", ["prefix", "result"])
+
+# --- Radio ---
+RADIO_SESSIONS_ACTIVE = Gauge("aurora_radio_sessions_active", "Active RadioSession count")
+RADIO_INTER_TRACK_GAP_SECONDS = Histogram(
+    "aurora_radio_inter_track_gap_seconds", "Silence between the end of one radio track and the next upload",
+    buckets=LATENCY_BUCKETS,
+)
+
+# --- Telegram Bot API ---
+BOT_API_SECONDS = Histogram("aurora_bot_api_seconds", "Bot API call latency", ["method"], buckets=LATENCY_BUCKETS)
+BOT_API_RATE_LIMITED_TOTAL = Counter("aurora_bot_api_rate_limited_total", "Bot API 429 responses", ["method"])
+
+# --- Event loop ---
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "aurora_event_loop_lag_seconds", "Event loop scheduling lag",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+# --- LLM ---
+LLM_SECONDS = Histogram("aurora_llm_seconds", "LLM request latency", ["provider", "outcome"], buckets=LATENCY_BUCKETS)
+
+def render() -> bytes:
+    return generate_latest()
+
+def cache_prefix(key: str) -> str:
+    return key.split(":", 1)[0] if ":" in key else "other"
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+@contextmanager
+def observe_llm(provider: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LLM_SECONDS.labels(provider=provider, outcome=outcome).observe(time.perf_counter() - started)
+
+class YtDlpStageTimer:
+    """Разбивает один прогон yt-dlp на стадии через progress/postprocessor hooks."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def install(self, opts: dict) -> dict:
+        return {**opts, 'progress_hooks': [self._on_progress], 'postprocessor_hooks': [self._on_postprocess]}
+
+    def _on_progress(self, d: dict):
+        if d.get('status') == 'downloading':
+            self.marks.setdefault('download_started', time.perf_counter())
+        elif d.get('status') == 'finished':
+            self.marks.setdefault('download_started', time.perf_counter())
+            self.marks['download_finished'] = time.perf_counter()
+
+    def _on_postprocess(self, d: dict):
+        if d.get('status') == 'started':
+            self.marks.setdefault('ffmpeg_started', time.perf_counter())
+        elif d.get('status') == 'finished':
+            self.marks['ffmpeg_finished'] = time.perf_counter()
+
+    def observe(self, operation: str = "download"):
+        def _stage(name: str, start: Optional[float], end: Optional[float]):
+            if start is not None and end is not None:
+                DOWNLOADER_STAGE_SECONDS.labels(operation=operation, stage=name).observe(end - start)
+
+        m = self.marks
+        _stage("sc_search", self.started, m.get('download_started'))
+        _stage("sc_download", m.get('download_started'), m.get('download_finished'))
+        _stage("ffmpeg", m.get('ffmpeg_started'), m.get('ffmpeg_finished'))
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который пишет латентность Bot API и число ответов 429."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        finally:
+            BOT_API_SECONDS.labels(method=api_method).observe(time.perf_counter() - started)
+        if code == 429:
+            BOT_API_RATE_LIMITED_TOTAL.labels(method=api_method).inc()
+        return code, payload
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
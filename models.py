@@ -1,5 +1,7 @@
-from dataclasses import dataclass, field
-from typing import Optional, List
+import sys
+import weakref
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, Optional, List
 from pathlib import Path
 from enum import Enum
 
@@ -11,7 +13,10 @@ class Source(str, Enum):
     JAMENDO = "jamendo"
     YTMUSIC = "ytmusic"
 
-@dataclass
+# slots — без __dict__ на каждый трек. Не frozen: frozen-__init__ ставит поля через
+# object.__setattr__ и удваивает стоимость сборки страницы выдачи. Один объект делят
+# сессии и кэши (track_registry) — после создания трек не меняют.
+@dataclass(slots=True, weakref_slot=True)
 class TrackInfo:
     identifier: str
     title: str
@@ -25,6 +30,22 @@ class TrackInfo:
     album: Optional[str] = None
     url: Optional[str] = None
 
+    def __getstate__(self):
+        return tuple(getattr(self, f.name) for f in fields(self))
+
+    def __setstate__(self, state):
+        # dict — pickle из кэша, записанный до перехода на slots
+        if isinstance(state, dict):
+            state = tuple(state.get(f.name, f.default) for f in fields(self))
+        for f, value in zip(fields(self), state):
+            setattr(self, f.name, value)
+        # id и артисты повторяются в тысячах плейлистов и в played_ids — одна копия строки на процесс
+        # (страницы выдачи интернирует search_normalize при сборке)
+        for name in ('identifier', 'uploader'):
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+
     # Алиасы для совместимости (чтобы не падало)
     @property
     def artist(self) -> str:
@@ -47,6 +68,48 @@ class TrackInfo:
             thumbnail_url=info.get('thumbnail')
         )
 
+class TrackRegistry:
+    """
+    Канонический TrackInfo на каждый identifier: один и тот же трек из разных
+    страниц выдачи и сессий радио — один объект, плейлисты держат ссылки.
+    Слабые ссылки: трек живет, пока он хоть где-то в плейлисте или кэше.
+
+    Обычный dict со слабыми ссылками без callback, а не WeakValueDictionary:
+    тот на каждый трек выполняет Python-код при вставке и при смерти объекта.
+    Мертвые ссылки вычищаются пачкой, когда словарь вырастает вдвое.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, "weakref.ref[TrackInfo]"] = {}
+        self._sweep_at = 1024
+
+    def get(self, identifier: str) -> Optional[TrackInfo]:
+        ref = self._refs.get(identifier)
+        return ref() if ref is not None else None
+
+    def add(self, track: TrackInfo) -> TrackInfo:
+        """Регистрирует трек, которого заведомо нет (после get): без повторного поиска."""
+        self._refs[track.identifier] = weakref.ref(track)
+        if len(self._refs) >= self._sweep_at:
+            self._sweep()
+        return track
+
+    def intern(self, track: TrackInfo) -> TrackInfo:
+        known = self.get(track.identifier)
+        return known if known is not None else self.add(track)
+
+    def intern_all(self, tracks: Iterable[TrackInfo]) -> List[TrackInfo]:
+        return [self.intern(t) for t in tracks]
+
+    def _sweep(self):
+        self._refs = {k: ref for k, ref in self._refs.items() if ref() is not None}
+        self._sweep_at = max(1024, 2 * len(self._refs))
+
+    def __len__(self) -> int:
+        return sum(1 for ref in self._refs.values() if ref() is not None)
+
+track_registry = TrackRegistry()
+
 @dataclass
 class DownloadResult:
     success: bool
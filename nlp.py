@@ -1,11 +1,21 @@
 import logging
 from ai_manager import ai_instance as ai_manager
+from config import get_settings
+from intent_batcher import IntentBatcher
 
 logger = logging.getLogger("nlp")
+settings = get_settings()
+
+_batcher = IntentBatcher(
+    ai_manager, window_ms=settings.AI_BATCH_WINDOW_MS, max_size=settings.AI_BATCH_MAX_SIZE
+) if settings.AI_BATCH_ENABLED else None
 
 async def analyze_message(text: str, mode: str = "default"):
     """
     Analyzes the user's message to determine intent and query.
     This is now a wrapper around the AIManager's method.
+    With AI_BATCH_ENABLED, concurrent messages are micro-batched into one AI request.
     """
-    return await ai_manager.analyze_message(text, mode)
\ No newline at end of file
+    if _batcher:
+        return await _batcher.analyze(text, mode)
+    return await ai_manager.analyze_message(text, mode)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import pickle
+from pathlib import Path
+from typing import Dict, Optional, Set, Union
+
+import aiosqlite
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger("persistence")
+
+class CachePersistence(BasePersistence):
+    """
+    chat_data (режим AI-персоны и т.п.) в базе кэша, таблица chat_data.
+
+    - Ленивая загрузка: get_chat_data при старте отдает пустой словарь, данные
+      чата подтягиваются в refresh_chat_data перед первым хендлером этого чата.
+      При шардировании чат может уйти на другой воркер и вернуться: invalidate
+      (зовет ShardCoordinator при захвате аренды) заставляет перечитать строку.
+    - Dirty tracking: PTB отдает update_chat_data только по чатам с апдейтами,
+      а мы дополнительно сравниваем хэш pickle и пропускаем неизмененные.
+    - Write-behind: изменения копятся и пишутся одной транзакцией (executemany).
+    """
+
+    def __init__(self, db_path: Union[str, Path], update_interval: float = 5, write_delay: float = 0.5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._db_path = Path(db_path)
+        self._write_delay = write_delay
+        self._db: Optional[aiosqlite.Connection] = None
+        self._hydrated: Set[int] = set()
+        self._stale: Set[int] = set()  # загружались раньше, но чатом успел владеть другой воркер
+        self._written: Dict[int, bytes] = {}   # chat_id -> digest последней записанной версии
+        self._dirty: Dict[int, Optional[bytes]] = {}  # None = удалить
+        self._write_task: Optional[asyncio.Task] = None
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is None:
+            self._db = await aiosqlite.connect(self._db_path, timeout=10)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute("CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB)")
+            await self._db.commit()
+        return self._db
+
+    @staticmethod
+    def _digest(blob: bytes) -> bytes:
+        return hashlib.blake2b(blob, digest_size=16).digest()
+
+    # --- chat_data ---
+    async def get_chat_data(self) -> Dict[int, dict]:
+        await self._connection()
+        return {}
+
+    def invalidate(self, chat_id: int) -> None:
+        if chat_id in self._hydrated:
+            self._hydrated.discard(chat_id)
+            self._stale.add(chat_id)
+        self._written.pop(chat_id, None)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        if chat_id in self._hydrated:
+            return
+        self._hydrated.add(chat_id)
+        try:
+            db = await self._connection()
+            cursor = await db.execute("SELECT data FROM chat_data WHERE chat_id = ?", (chat_id,))
+            row = await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"chat_data load failed for {chat_id}: {e}")
+            return
+        if chat_id in self._stale:
+            # Источник истины — строка, записанная прошлым владельцем
+            self._stale.discard(chat_id)
+            chat_data.clear()
+        if row:
+            self._written[chat_id] = self._digest(row[0])
+            for key, value in pickle.loads(row[0]).items():
+                chat_data.setdefault(key, value)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        blob = pickle.dumps(dict(data))
+        if self._written.get(chat_id) == self._digest(blob):
+            return
+        self._dirty[chat_id] = blob
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._hydrated.discard(chat_id)
+        self._stale.discard(chat_id)
+        self._written.pop(chat_id, None)
+        self._dirty[chat_id] = None
+        self._schedule_write()
+
+    def _schedule_write(self):
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_behind())
+
+    async def _write_behind(self):
+        await asyncio.sleep(self._write_delay)
+        await self._write_dirty()
+
+    async def _write_dirty(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        upserts = [(chat_id, blob) for chat_id, blob in batch.items() if blob is not None]
+        deletes = [(chat_id,) for chat_id, blob in batch.items() if blob is None]
+        try:
+            db = await self._connection()
+            if upserts:
+                await db.executemany("INSERT OR REPLACE INTO chat_data (chat_id, data) VALUES (?, ?)", upserts)
+            if deletes:
+                await db.executemany("DELETE FROM chat_data WHERE chat_id = ?", deletes)
+            await db.commit()
+        except Exception as e:
+            # Вернем в очередь: следующая запись попробует еще раз (новые версии не перетираем)
+            logger.error(f"chat_data write failed ({len(batch)} chats): {e}")
+            for chat_id, blob in batch.items():
+                self._dirty.setdefault(chat_id, blob)
+            return
+        for chat_id, blob in upserts:
+            self._written[chat_id] = self._digest(blob)
+        logger.debug(f"chat_data flushed: {len(upserts)} updated, {len(deletes)} dropped")
+
+    async def flush(self) -> None:
+        if self._write_task and not self._write_task.done():
+            self._write_task.cancel()
+        await self._write_dirty()
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+    # --- Остальное не храним ---
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
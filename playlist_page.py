@@ -0,0 +1,54 @@
+import hashlib
+from typing import List, Optional, Sequence, Tuple
+
+from models import TrackInfo
+
+# Страница выдачи веб-плеера (/api/player/playlist): курсор, выбор полей, ETag.
+# Без FastAPI и кэша — только разбор запроса и сборка ответа из снимка выдачи.
+
+PLAYLIST_FIELDS = ("identifier", "title", "artist", "duration", "cover")
+
+def normalize_query(query: str) -> str:
+    """Регистр и лишние пробелы не различаем: одна запись кэша на запрос."""
+    return " ".join(query.casefold().split())
+
+def snapshot_etag(tracks: Sequence[TrackInfo]) -> str:
+    """Версия снимка выдачи: меняется, только если поменялся состав или порядок треков."""
+    return hashlib.md5("\n".join(t.identifier for t in tracks).encode()).hexdigest()[:16]
+
+def make_cursor(snapshot: str, offset: int) -> str:
+    """Курсор привязан к версии снимка: смещение в другом снимке указывало бы не туда."""
+    return f"{snapshot}.{offset}"
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[Optional[str], int]:
+    """(версия снимка, смещение) из next_cursor; без курсора — (None, 0). ValueError — курсор не наш."""
+    if not cursor: return None, 0
+    snapshot, sep, offset = cursor.partition(".")
+    if not sep or not snapshot: raise ValueError(f"bad cursor: {cursor!r}")
+    return snapshot, max(int(offset), 0)
+
+def select_fields(fields: Optional[str]) -> List[str]:
+    """Поля в каноническом порядке; identifier нужен плееру всегда."""
+    wanted = {f.strip() for f in fields.split(",")} if fields else set(PLAYLIST_FIELDS)
+    return [f for f in PLAYLIST_FIELDS if f == "identifier" or f in wanted]
+
+def page_etag(snapshot: str, offset: int, limit: int, selected: Sequence[str]) -> str:
+    return f'"{snapshot}-{offset}-{limit}-{",".join(selected)}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match: список через запятую, слабое сравнение (W/ не учитывается), * — любая версия."""
+    if not if_none_match: return False
+    if if_none_match.strip() == "*": return True
+    candidates = (c.strip() for c in if_none_match.split(","))
+    return etag.removeprefix("W/") in {c.removeprefix("W/") for c in candidates}
+
+def track_fields(t: TrackInfo) -> dict:
+    return {"identifier": t.identifier, "title": t.title, "artist": t.uploader, "duration": t.duration, "cover": t.thumbnail_url}
+
+def render_page(tracks: Sequence[TrackInfo], snapshot: str, offset: int, limit: int, selected: Sequence[str]) -> dict:
+    page = tracks[offset:offset + limit]
+    next_cursor = make_cursor(snapshot, offset + limit) if offset + limit < len(tracks) else None
+    return {
+        "playlist": [{f: v for f, v in track_fields(t).items() if f in selected} for t in page],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from concurrency import Priority
+from models import TrackInfo
+from stats_store import StatsStore
+from youtube import YouTubeDownloader
+
+logger = logging.getLogger("prewarm")
+
+MAX_BACKOFF_STEPS = 5  # Волна, которая не прогревается, пробуется не реже раза в 2**5 интервалов
+
+class Prewarmer:
+    """
+    Держит для самых популярных жанров каталога маленький пул готовых треков
+    (скачанных или с закэшированным file_id), чтобы волна из меню стартовала сразу.
+    Работает только когда планировщик загрузок простаивает и с приоритетом RADIO_PREFETCH.
+    """
+
+    def __init__(self, downloader: YouTubeDownloader, queries: List[str], genres: int = 5,
+                 pool_size: int = 2, interval: float = 30.0, decay: float = 0.9, stats: Optional[StatsStore] = None):
+        self._downloader = downloader
+        self._stats = stats
+        self._queries = queries
+        self._genres = genres
+        self._pool_size = pool_size
+        self._interval = interval
+        self._decay = decay
+        # Недавние запуски волн: затухают каждый цикл, поэтому отражают текущую популярность
+        self._plays: Counter = Counter()
+        self._pools: Dict[str, List[TrackInfo]] = {}
+        # Неудачные прогревы подряд и когда волну пробовать снова: пустой поиск или
+        # падающие загрузки не должны повторяться каждый цикл
+        self._failures: Counter = Counter()
+        self._retry_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record_play(self, query: str):
+        self._plays[query] += 1
+
+    def popular(self) -> List[str]:
+        # Сначала долгосрочная популярность из статистики, затем недавние запуски;
+        # при равенстве — порядок каталога (sorted стабилен)
+        catalog = set(self._queries)
+        ranked = [g for g in self._stats.top_genres(self._genres) if g in catalog] if self._stats else []
+        rest = sorted((q for q in self._queries if q not in ranked), key=lambda q: -self._plays[q])
+        return (ranked + rest)[:self._genres]
+
+    def take(self, query: str) -> List[TrackInfo]:
+        """Забирает готовые треки волны; пул пополнится в следующем цикле."""
+        return self._pools.pop(query, [])
+
+    def _idle(self) -> bool:
+        downloads = self._downloader.scheduler.downloads
+        return downloads.waiting == 0 and downloads.active < max(downloads.limit // 2, 1)
+
+    async def _warm(self, query: str) -> bool:
+        """False — пул не пополнился, хотя загрузки были свободны (поиск пуст или все загрузки упали)."""
+        pool = self._pools.setdefault(query, [])
+        if len(pool) >= self._pool_size: return True
+
+        tracks = await self._downloader.search(query, limit=20, priority=Priority.RADIO_PREFETCH)
+        random.shuffle(tracks)
+        pooled = {t.identifier for t in pool}
+        added = 0
+        for track in tracks:
+            if len(pool) >= self._pool_size: break
+            # Уступили живым загрузкам — это не неудача волны
+            if not self._idle(): return True
+            if track.identifier in pooled: continue
+            if not await self._downloader.get_file_id(track.identifier):
+                result = await self._downloader.download(track.identifier, track_info=track, priority=Priority.RADIO_PREFETCH)
+                if not result.success: continue
+            pool.append(track)
+            pooled.add(track.identifier)
+            added += 1
+        return added > 0
+
+    async def _tick(self):
+        for query in list(self._plays):
+            self._plays[query] *= self._decay
+        now = time.monotonic()
+        for query in self.popular():
+            if not self._idle(): break
+            if self._retry_at.get(query, 0.0) > now: continue
+            try:
+                warmed = await self._warm(query)
+            except Exception as e:
+                logger.warning(f"Prewarm failed for '{query}': {e}")
+                warmed = False
+            if warmed:
+                self._failures.pop(query, None)
+                self._retry_at.pop(query, None)
+            else:
+                self._failures[query] += 1
+                steps = min(self._failures[query], MAX_BACKOFF_STEPS)
+                self._retry_at[query] = time.monotonic() + self._interval * 2 ** steps
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            await self._tick()
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Prewarmer started: top {self._genres} genres x {self._pool_size} tracks")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger("profiler")
+
+def _thread_label(name: str) -> str:
+    # ThreadPoolExecutor-0_3 -> executor: воркеры пула сливаются в один стек-корень
+    return "executor" if name.startswith(("ThreadPoolExecutor", "asyncio_")) else name
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+class SamplingProfiler:
+    """
+    Семплирующий профилировщик: отдельный поток снимает стеки всех потоков
+    (event loop + executor) раз в interval секунд. Результат — collapsed stacks
+    ("a;b;c N"), которые понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def _sample(self, stop: threading.Event, samples: Counter):
+        own_id = threading.get_ident()
+        while not stop.is_set():
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id: continue
+                samples[f"{_thread_label(names.get(thread_id, str(thread_id)))};{_collapse(frame)}"] += 1
+            time.sleep(self._interval)
+
+    async def profile(self, seconds: float) -> str:
+        async with self._lock:
+            samples: Counter = Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(target=self._sample, args=(stop, samples), name="profiler", daemon=True)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+            logger.info(f"Profiled {seconds}s: {sum(samples.values())} samples, {len(samples)} unique stacks")
+            return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+class LoopLagMonitor:
+    """Следит за задержкой event loop: если корутина держит loop дольше порога — пишет в лог."""
+
+    def __init__(self, threshold_ms: int = 100, interval: float = 0.25):
+        self._threshold = threshold_ms / 1000
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._interval)
+            lag = loop.time() - started - self._interval
+            metrics.EVENT_LOOP_LAG_SECONDS.observe(max(lag, 0.0))
+            if lag > self._threshold:
+                logger.warning(f"⚠️ Event loop blocked for {lag * 1000:.0f} ms")
+
+    def start(self):
+        if self._threshold > 0 and not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+class BlockingWatchdog:
+    """
+    Debug-режим: loop раз в interval обновляет heartbeat, отдельный поток
+    проверяет его. Если loop не отвечает дольше порога — в лог уходит стек
+    потока event loop в момент блокировки (т.е. виновник, а не последствия).
+    Заодно включает asyncio debug с slow_callback_duration = порог.
+    """
+
+    def __init__(self, threshold_ms: int, interval: float = 0.05):
+        self._threshold = threshold_ms / 1000
+        self._interval = interval
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self._interval)
+
+    def _watch(self):
+        reported = False
+        while not self._stop.wait(self._interval):
+            blocked = time.monotonic() - self._heartbeat
+            if blocked < self._threshold:
+                reported = False
+                continue
+            if reported: continue
+            # Один стек на одну блокировку
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            logger.warning(f"🐢 Event loop blocked for {blocked * 1000:.0f}+ ms, loop thread stack:\n{stack}")
+
+    def start(self):
+        if self._threshold <= 0 or self._task: return
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self._threshold
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Blocking watchdog enabled ({self._threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+
+profiler = SamplingProfiler()
@@ -0,0 +1,236 @@
+import asyncio
+import base64
+import bisect
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger("proxy_checker")
+
+V2RAY_SCHEMES = ("vless", "vmess", "trojan", "ss")
+
+@dataclass
+class ProxyCheckResult:
+    url: str
+    ok: bool
+    latency: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class LatencyHistogram:
+    """Гистограмма задержек рабочих прокси (границы корзин в секундах)."""
+    bounds: Tuple[float, ...] = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+    counts: List[int] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def format(self) -> str:
+        labels = [f"<={b}s" for b in self.bounds] + [f">{self.bounds[-1]}s"]
+        return " | ".join(f"{label}: {count}" for label, count in zip(labels, self.counts))
+
+def parse_endpoint(url: str) -> Optional[Tuple[str, int]]:
+    """Достает host:port из ссылки vless/vmess/trojan/ss."""
+    try:
+        scheme, _, rest = url.partition("://")
+        if scheme == "vmess":
+            payload = rest.split("#", 1)[0]
+            data = json.loads(base64.b64decode(payload + "=" * (-len(payload) % 4)))
+            return str(data["add"]), int(data["port"])
+
+        parsed = urlparse(url)
+        if parsed.hostname and parsed.port:
+            return parsed.hostname, parsed.port
+
+        if scheme == "ss":
+            # Старый формат: ss://BASE64(method:password@host:port)#name
+            payload = rest.split("#", 1)[0]
+            decoded = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode()
+            host, _, port = decoded.rpartition("@")[2].rpartition(":")
+            return host.strip("[]"), int(port)
+    except Exception:
+        return None
+    return None
+
+def atomic_write_lines(path: Path, lines: List[str]):
+    """Пишет файл целиком через временный файл и os.replace — читатели не увидят половину списка."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        os.replace(tmp, path)
+    except Exception:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+def read_lines(path: Path) -> List[str]:
+    if not path.exists(): return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def _failures_path(target: Path) -> Path:
+    return target.with_name(f".{target.name}.failures.json")
+
+def load_failures(target: Path) -> Dict[str, int]:
+    """
+    Неудачные пробы подряд по каждому прокси из target (с прошлых проверок).
+    Счетчик >= max_failures — надгробие: прокси уже выброшен, и если источник вернет его снова,
+    счет продолжится с того же места, а не с единицы.
+    """
+    try:
+        return {str(u): int(n) for u, n in json.loads(_failures_path(target).read_text(encoding="utf-8")).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def save_failures(target: Path, failures: Dict[str, int]):
+    atomic_write_lines(_failures_path(target), [json.dumps(failures, sort_keys=True)])
+
+class ProxyChecker:
+    """
+    Асинхронная проверка прокси: сотни одновременных проб с таймаутом на каждую.
+    HTTP/SOCKS прокси проверяются реальным запросом к test_url, v2ray-ссылки —
+    TCP-подключением к серверу (полная проверка протокола требует xray).
+    """
+
+    def __init__(
+        self,
+        test_url: str = "https://www.gstatic.com/generate_204",
+        concurrency: int = 300,
+        timeout: float = 5.0,
+        flush_every: int = 20,
+        max_failures: int = 3,
+    ):
+        self._test_url = test_url
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._flush_every = flush_every
+        self._max_failures = max_failures
+        self.histogram = LatencyHistogram()
+
+    async def probe_http(self, url: str) -> ProxyCheckResult:
+        started = time.monotonic()
+        try:
+            async with httpx.AsyncClient(proxy=url, timeout=self._timeout) as client:
+                response = await client.get(self._test_url)
+            if response.status_code >= 400:
+                return ProxyCheckResult(url, False, error=f"HTTP {response.status_code}")
+        except Exception as e:
+            return ProxyCheckResult(url, False, error=type(e).__name__)
+        return ProxyCheckResult(url, True, time.monotonic() - started)
+
+    async def probe_tcp(self, url: str) -> ProxyCheckResult:
+        endpoint = parse_endpoint(url)
+        if not endpoint:
+            return ProxyCheckResult(url, False, error="unparsable")
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(*endpoint), timeout=self._timeout)
+            writer.close()
+        except Exception as e:
+            return ProxyCheckResult(url, False, error=type(e).__name__)
+        return ProxyCheckResult(url, True, time.monotonic() - started)
+
+    def probe_for(self, url: str) -> Callable[[str], Awaitable[ProxyCheckResult]]:
+        scheme = url.partition("://")[0].lower()
+        return self.probe_tcp if scheme in V2RAY_SCHEMES else self.probe_http
+
+    async def check(self, urls: List[str], target: Optional[Path] = None) -> List[ProxyCheckResult]:
+        """
+        Проверяет список; если задан target, переписывает его по мере поступления результатов:
+        подтвержденные (по задержке) + еще не проверенные из прежнего списка.
+        В target (его читает ProxyManager) попадают только рабочие: не прошедшие пробу
+        остаются в счетчиках неудач рядом с target и перепроверяются, пока не наберут
+        max_failures подряд (check_file при проверке на месте), — одна неудачная проба прокси не удаляет.
+        """
+        urls = list(dict.fromkeys(urls))
+        self.histogram = LatencyHistogram()
+        semaphore = asyncio.Semaphore(self._concurrency)
+        unchecked = set(read_lines(target)) if target else set()
+        # Прокси, которых больше нет ни в источнике, ни в target, счетчик не возвращает в список
+        known = unchecked | set(urls)
+        failures = {u: n for u, n in load_failures(target).items() if u in known} if target else {}
+        working: Dict[str, float] = {}
+        results: List[ProxyCheckResult] = []
+        started = time.monotonic()
+
+        async def _run(url: str) -> ProxyCheckResult:
+            async with semaphore:
+                return await self.probe_for(url)(url)
+
+        def _flush():
+            lines = sorted(working, key=working.get)
+            lines += [u for u in unchecked if u not in working and u not in failures]
+            atomic_write_lines(target, lines)
+
+        logger.info(f"Checking {len(urls)} proxies (concurrency={self._concurrency}, timeout={self._timeout}s)...")
+        for coro in asyncio.as_completed([_run(u) for u in urls]):
+            result = await coro
+            results.append(result)
+            unchecked.discard(result.url)
+            if result.ok:
+                working[result.url] = result.latency
+                failures.pop(result.url, None)
+                self.histogram.observe(result.latency)
+            else:
+                failures[result.url] = failures.get(result.url, 0) + 1
+            if target and len(results) % self._flush_every == 0:
+                _flush()
+
+        if target:
+            unchecked.clear()
+            _flush()
+            save_failures(target, failures)
+
+        logger.info(
+            f"Proxy check done in {time.monotonic() - started:.1f}s: {len(working)}/{len(urls)} working. "
+            f"Latency: {self.histogram.format()}"
+        )
+        return results
+
+    async def check_file(self, source: Path, target: Path) -> List[ProxyCheckResult]:
+        urls = read_lines(source)
+        if source == target:
+            # Проверка на месте: упавших в target нет, их перепроверяем по счетчикам до max_failures
+            urls += [u for u, n in load_failures(target).items() if n < self._max_failures]
+        return await self.check(urls, target)
+
+async def check_project_lists(project_root: Path, checker: Optional[ProxyChecker] = None) -> Dict[str, int]:
+    """
+    Перепроверяет стандартные списки проекта:
+    proxies.txt (или сам working_proxies.txt) -> working_proxies.txt,
+    working_v2ray_proxies.txt -> hiddify_compatible_v2ray_proxies.txt.
+    Без proxies.txt рабочий список перепроверяется на месте: не прошедший проверку прокси
+    уходит из рабочего списка сразу, но перепроверяется, пока не наберет max_failures
+    неудач подряд, так что пул не тает от сетевых сбоев.
+    """
+    checker = checker or ProxyChecker()
+    http_source = project_root / "proxies.txt"
+    if not http_source.exists():
+        http_source = project_root / "working_proxies.txt"
+
+    jobs = [
+        (http_source, project_root / "working_proxies.txt"),
+        (project_root / "working_v2ray_proxies.txt", project_root / "hiddify_compatible_v2ray_proxies.txt"),
+    ]
+    summary = {}
+    for source, target in jobs:
+        if not source.exists(): continue
+        results = await checker.check_file(source, target)
+        summary[target.name] = sum(1 for r in results if r.ok)
+    return summary
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    print(asyncio.run(check_project_lists(Path(__file__).resolve().parent)))
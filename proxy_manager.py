@@ -1,56 +1,193 @@
+import asyncio
 import logging
 import random
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Optional
+
+import httpx
+
+from proxy_checker import ProxyChecker, check_project_lists
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ProxyStats:
+    """Скользящая статистика одного прокси."""
+    url: str
+    success_rate: float = 1.0       # EWMA успешности (0..1)
+    latency: float = 1.0            # EWMA задержки, сек
+    failures_in_row: int = 0
+    quarantined_until: float = 0.0
+
+    @property
+    def score(self) -> float:
+        return self.success_rate / (1.0 + self.latency)
+
+    def is_available(self, now: float) -> bool:
+        return self.quarantined_until <= now
+
 class ProxyManager:
-    def __init__(self, project_root: Path):
+    """
+    Пул прокси с оценкой здоровья: взвешенный выбор по успешности и задержке,
+    карантин с нарастающим cooldown и фоновые health-пробы для повторного допуска.
+    """
+    EWMA_ALPHA = 0.3
+    MAX_COOLDOWN = 3600
+
+    def __init__(
+        self,
+        project_root: Path,
+        health_url: str = "https://www.gstatic.com/generate_204",
+        health_interval: int = 300,
+        cooldown: int = 120,
+        probe_timeout: float = 10.0,
+        checker: Optional[ProxyChecker] = None,
+        check_interval: int = 0,
+    ):
         self._project_root = project_root
         self._proxy_file = self._project_root / "working_proxies.txt"
-        self._proxies: List[str] = []
+        self._health_url = health_url
+        self._health_interval = health_interval
+        self._cooldown = cooldown
+        self._probe_timeout = probe_timeout
+        self._stats: Dict[str, ProxyStats] = {}
+        self._checker = checker
+        self._check_interval = check_interval
+        self._health_task: Optional[asyncio.Task] = None
+        self._check_task: Optional[asyncio.Task] = None
         self._load_proxies()
 
     def _load_proxies(self):
-        """Загружает рабочие прокси из working_proxies.txt."""
-        self._proxies = []
-        
+        """Загружает рабочие прокси из working_proxies.txt, сохраняя статистику уже известных."""
         if not self._proxy_file.exists():
             logger.error(f"'{self._proxy_file.name}' not found! No proxies to load.")
+            self._stats = {}
             return
 
         try:
             with open(self._proxy_file, "r") as f:
-                for line in f:
-                    proxy = line.strip()
-                    if proxy:
-                        self._proxies.append(proxy)
-            
-            if not self._proxies:
+                urls = [line.strip() for line in f if line.strip()]
+
+            self._stats = {url: self._stats.get(url) or ProxyStats(url) for url in urls}
+
+            if not self._stats:
                 logger.warning("working_proxies.txt is empty.")
                 return
-            
-            random.shuffle(self._proxies)
-            logger.info(f"Loaded and shuffled {len(self._proxies)} working proxies from {self._proxy_file.name}.")
+
+            logger.info(f"Loaded {len(self._stats)} working proxies from {self._proxy_file.name}.")
 
         except Exception as e:
             logger.error(f"Failed to load proxies from {self._proxy_file.name}: {e}")
 
+    @property
+    def available_count(self) -> int:
+        now = time.monotonic()
+        return sum(1 for s in self._stats.values() if s.is_available(now))
+
     def get_proxy(self) -> Optional[str]:
-        """Возвращает следующий прокси из списка, циклически."""
-        if not self._proxies:
+        """Возвращает прокси, выбранный случайно с весом по score (без прокси в карантине)."""
+        now = time.monotonic()
+        candidates = [s for s in self._stats.values() if s.is_available(now)]
+        if not candidates:
             return None
-        
-        # Берем прокси и перекладываем его в конец списка, чтобы обеспечить ротацию
-        proxy = self._proxies.pop(0)
-        self._proxies.append(proxy)
-        
-        return proxy
+        return random.choices(candidates, weights=[s.score for s in candidates], k=1)[0].url
+
+    def report_success(self, proxy: str, latency: float):
+        stats = self._stats.get(proxy)
+        if not stats: return
+        stats.success_rate += self.EWMA_ALPHA * (1.0 - stats.success_rate)
+        stats.latency += self.EWMA_ALPHA * (latency - stats.latency)
+        stats.failures_in_row = 0
+        stats.quarantined_until = 0.0
+
+    def report_failure(self, proxy: str):
+        """Снижает score и отправляет прокси в карантин; cooldown растет с каждой ошибкой подряд."""
+        stats = self._stats.get(proxy)
+        if not stats: return
+        stats.success_rate -= self.EWMA_ALPHA * stats.success_rate
+        stats.failures_in_row += 1
+        cooldown = min(self._cooldown * 2 ** (stats.failures_in_row - 1), self.MAX_COOLDOWN)
+        stats.quarantined_until = time.monotonic() + cooldown
+        logger.warning(
+            f"Proxy {proxy} failed ({stats.failures_in_row} in a row), quarantined for {cooldown}s. "
+            f"{self.available_count} available."
+        )
 
     def report_dead_proxy(self, proxy: str):
-        """Удаляет "мертвый" прокси из текущей сессии."""
-        if proxy in self._proxies:
-            self._proxies.remove(proxy)
-            logger.warning(f"Proxy {proxy} reported as dead and removed from the pool. {len(self._proxies)} remaining.")
-        
+        """Совместимость со старым API: "мертвый" прокси уходит в карантин, а не удаляется навсегда."""
+        self.report_failure(proxy)
+
+    @staticmethod
+    def as_requests_proxies(proxy: Optional[str]) -> Optional[Dict[str, str]]:
+        return {"http": proxy, "https": proxy} if proxy else None
+
+    # --- HEALTH PROBES ---
+
+    async def probe(self, proxy: str) -> bool:
+        """Одна проверка прокси запросом к health URL."""
+        started = time.monotonic()
+        try:
+            async with httpx.AsyncClient(proxy=proxy, timeout=self._probe_timeout) as client:
+                response = await client.get(self._health_url)
+            if response.status_code >= 400:
+                raise httpx.HTTPStatusError("bad status", request=response.request, response=response)
+        except Exception:
+            self.report_failure(proxy)
+            return False
+        self.report_success(proxy, time.monotonic() - started)
+        return True
+
+    async def probe_all(self, concurrency: int = 20) -> int:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _probe(proxy: str) -> bool:
+            async with semaphore:
+                return await self.probe(proxy)
+
+        results = await asyncio.gather(*[_probe(p) for p in list(self._stats)])
+        healthy = sum(results)
+        logger.info(f"Proxy health check: {healthy}/{len(results)} healthy.")
+        return healthy
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.probe_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Proxy health loop error: {e}")
+            await asyncio.sleep(self._health_interval)
+
+    # --- LIST REVALIDATION ---
+
+    async def refresh(self) -> int:
+        """Перепроверяет списки прокси асинхронным чекером и перечитывает working_proxies.txt."""
+        summary = await check_project_lists(self._project_root, self._checker)
+        self._load_proxies()
+        logger.info(f"Proxy lists revalidated: {summary}")
+        return len(self._stats)
+
+    async def _check_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Proxy check loop error: {e}")
+            await asyncio.sleep(self._check_interval)
+
+    def start(self):
+        if self._check_interval > 0 and not self._check_task:
+            self._check_task = asyncio.create_task(self._check_loop())
+        if self._stats and not self._health_task:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        for task in (self._health_task, self._check_task):
+            if task: task.cancel()
+        self._health_task = None
+        self._check_task = None
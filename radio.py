@@ -5,7 +5,8 @@ import os
 import time
 import json
 from pathlib import Path
-from typing import List, Optional, Dict, Set
+from collections import deque
+from typing import Deque, List, Optional, Dict, Set, TYPE_CHECKING
 from dataclasses import dataclass, field
 from telegram import Bot, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.constants import ParseMode
@@ -14,6 +15,15 @@ from telegram.error import BadRequest
 from config import Settings
 from models import TrackInfo, DownloadResult
 from youtube import YouTubeDownloader
+from concurrency import Priority
+import metrics
+import tracing
+
+if TYPE_CHECKING:
+    from prewarm import Prewarmer
+    from stats_store import StatsStore
+    from related_graph import RelatedGraph
+    from broadcaster import BroadcastHub
 
 # Загружаем каталог
 try:
@@ -44,8 +54,13 @@ class RadioSession:
     query: str
     display_name: str
     chat_type: Optional[str] = None
+    prewarmer: Optional["Prewarmer"] = None
+    stats: Optional["StatsStore"] = None
+    related: Optional["RelatedGraph"] = None
+    broadcaster: Optional["BroadcastHub"] = None
     
     is_running: bool = field(init=False, default=False)
+    # Ссылки на общие треки из track_registry и интернированные id, а не копии
     playlist: List[TrackInfo] = field(default_factory=list)
     played_ids: Set[str] = field(default_factory=set)
     current_task: Optional[asyncio.Task] = None
@@ -54,6 +69,10 @@ class RadioSession:
     _is_searching: bool = field(init=False, default=False)
     last_wave_change_time: float = field(init=False, default=0.0)
     consecutive_errors: int = field(init=False, default=0)
+    last_track_ended_at: Optional[float] = field(init=False, default=None)
+    # Последние сыгранные треки (свежие слева) — затравка для графа похожих
+    history: Deque[TrackInfo] = field(init=False, default_factory=lambda: deque(maxlen=5))
+    _prefetch_task: Optional[asyncio.Task] = field(init=False, default=None)
 
     async def start(self):
         if self.is_running: return
@@ -63,9 +82,13 @@ class RadioSession:
         self.current_task = asyncio.create_task(self._radio_loop())
         logger.info(f"[{self.chat_id}] 🚀 Эфир запущен: '{self.query}'")
 
-    async def stop(self):
+    async def stop(self, replaced: bool = False):
+        """replaced — на смену идет новая волна в том же чате: слушателям веб-плеера «эфир окончен» не шлем."""
         self.is_running = False
         if self.current_task: self.current_task.cancel()
+        if self._prefetch_task: self._prefetch_task.cancel()
+        if self.broadcaster and not replaced:
+            self.broadcaster.publish(self.chat_id, {"type": "stopped", "chat_id": self.chat_id})
         await self._delete_status()
 
     async def skip(self):
@@ -96,6 +119,7 @@ class RadioSession:
             # Сброс
             self.playlist.clear()
             self.played_ids.clear()
+            self.history.clear()
             self.consecutive_errors = 0
             self.last_wave_change_time = time.time()
             
@@ -110,11 +134,30 @@ class RadioSession:
         except Exception as e:
             logger.error(f"Change wave error: {e}")
 
+    @tracing.traced("radio.fill_playlist")
     async def _fill_playlist(self):
         if self._is_searching or not self.is_running: return
         self._is_searching = True
         
         try:
+            # Готовые треки от прогрева — в начало, чтобы волна зазвучала сразу
+            if self.prewarmer:
+                ready = [t for t in self.prewarmer.take(self.query) if t.identifier not in self.played_ids]
+                if ready:
+                    self.playlist[:0] = ready
+                    if len(self.playlist) >= 3: return
+
+            # Пустой плейлист — слушатель ждет прямо сейчас; иначе это фоновое пополнение
+            priority = Priority.RADIO_NOW if not self.playlist else Priority.RADIO_PREFETCH
+
+            # Сначала граф похожих от последних сыгранных треков — без текстового поиска
+            if self.related and self.history:
+                exclude = self.played_ids | {t.identifier for t in self.playlist}
+                fresh = await self.related.expand(list(self.history), exclude, priority=priority, chat_id=self.chat_id)
+                if fresh:
+                    self.playlist.extend(fresh)
+                    return
+
             # Пробуем разные вариации запроса, чтобы найти хоть что-то
             variations = [self.query, f"{self.query} best", f"{self.query} hits"]
             random.shuffle(variations)
@@ -123,7 +166,7 @@ class RadioSession:
             for q in variations:
                 if not self.is_running: break
                 try:
-                    tracks = await self.downloader.search(q, limit=20)
+                    tracks = await self.downloader.search(q, limit=20, priority=priority, chat_id=self.chat_id)
                     new_tracks = [t for t in tracks if t.identifier not in self.played_ids]
                     
                     if new_tracks:
@@ -150,32 +193,45 @@ class RadioSession:
                 if time.time() - self.last_wave_change_time > 3600:
                     await self.change_wave_random()
 
-                # 2. ПОПОЛНЕНИЕ
-                if len(self.playlist) < 3: 
-                    await self._fill_playlist()
+                with tracing.start_trace("radio.track", chat_id=self.chat_id, query=self.query) as trace:
+                    # 2. ПОПОЛНЕНИЕ
+                    if len(self.playlist) < 3: 
+                        await self._fill_playlist()
                 
-                # Если все равно пусто
-                if not self.playlist:
-                    await self._update_status("📡 Поиск сигнала...")
-                    await asyncio.sleep(5)
+                    # Если все равно пусто
                     if not self.playlist:
-                        await self.change_wave_random()
-                        continue
+                        await self._update_status("📡 Поиск сигнала...")
+                        await asyncio.sleep(5)
+                        if not self.playlist:
+                            await self.change_wave_random()
+                            continue
 
-                # 3. ТРЕК
-                track = self.playlist.pop(0)
-                self.played_ids.add(track.identifier)
-                if len(self.played_ids) > 200: self.played_ids = set(list(self.played_ids)[100:])
+                    # 3. ТРЕК
+                    track = self.playlist.pop(0)
+                    trace.attrs.update(track_id=track.identifier, title=track.title)
+                    self.played_ids.add(track.identifier)
+                    if len(self.played_ids) > 200: self.played_ids = set(list(self.played_ids)[100:])
+
+                    # 4. ВОСПРОИЗВЕДЕНИЕ
+                    started = time.monotonic()
+                    success = await self._play_track(track)
+                    trace.attrs["success"] = success
+                    if self.stats:
+                        self.stats.record(
+                            track.identifier, "ok" if success else "failed", time.monotonic() - started,
+                            chat_id=self.chat_id, genre=self.query, title=track.title
+                        )
 
-                # 4. ВОСПРОИЗВЕДЕНИЕ
-                success = await self._play_track(track)
-                
                 if success:
                     self.consecutive_errors = 0
+                    self.history.appendleft(track)
+                    self._publish_now_playing(track)
+                    self._prefetch_next()
                     # Ждем конца трека или пропуска
-                    wait = min(track.duration, 300) if track.duration > 0 else 180
+                    wait = self._track_wait_seconds(track)
                     try: await asyncio.wait_for(self.skip_event.wait(), timeout=wait)
                     except asyncio.TimeoutError: pass 
+                    self.last_track_ended_at = time.monotonic()
                 else:
                     self.consecutive_errors += 1
                     logger.warning(f"[{self.chat_id}] Ошибка воспроизведения ({self.consecutive_errors} подряд)")
@@ -196,44 +252,93 @@ class RadioSession:
         
         self.is_running = False
 
+    def _prefetch_next(self):
+        """Пока играет трек, фоном качаем следующий — с самым низким приоритетом."""
+        if not self.playlist or (self._prefetch_task and not self._prefetch_task.done()): return
+        track = self.playlist[0]
+        self._prefetch_task = asyncio.create_task(self.downloader.download(
+            track.identifier, track_info=track, priority=Priority.RADIO_PREFETCH, chat_id=self.chat_id
+        ))
+
+    def _publish_now_playing(self, track: TrackInfo):
+        """Слушатели веб-плеера идут за волной: аудио — общий /stream, без своих поисков и загрузок."""
+        if not self.broadcaster: return
+        self.broadcaster.publish(self.chat_id, {
+            "type": "now_playing",
+            "chat_id": self.chat_id,
+            "station": self.display_name,
+            "started_at": time.time(),
+            "track": {
+                "identifier": track.identifier,
+                "title": track.title,
+                "artist": track.uploader,
+                "duration": track.duration,
+                "cover": track.thumbnail_url,
+            },
+        })
+
+    def _track_wait_seconds(self, track: TrackInfo) -> float:
+        """Сколько ждать до следующего трека (не дольше 5 минут)."""
+        return min(track.duration, 300) if track.duration > 0 else 180
+
+    @tracing.traced("radio.play_track")
     async def _play_track(self, track: TrackInfo) -> bool:
         if not self.is_running: return False
         try:
-            await self._update_status(f"⬇️ Загрузка: *{track.title}*...")
-            
-            result = await self.downloader.download(track.identifier, track_info=track)
-            
-            if not result or not result.success: return False
-            
             caption = get_now_playing_message(track, self.display_name)
             
             # Создаем клавиатуру
             keyboard = None
             if self.settings.BASE_URL:
-                keyboard = InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🎧 Веб-плеер", url=self.settings.BASE_URL)
-                ]])
+                url = self.settings.BASE_URL
+                if self.broadcaster:
+                    url += f"?station={self.chat_id}&key={self.broadcaster.key(self.chat_id)}"
+                keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🎧 Веб-плеер", url=url)]])
 
-            if result.file_path:
-                try:
-                    with open(result.file_path, 'rb') as f:
-                        await self.bot.send_audio(
-                            self.chat_id, 
-                            audio=f, 
-                            caption=caption, 
-                            parse_mode=ParseMode.MARKDOWN,
-                            reply_markup=keyboard,
-                            read_timeout=60,
-                            write_timeout=60
-                        )
-                    await self._delete_status()
-                    try: os.unlink(result.file_path)
-                    except: pass
-                    return True
-                except Exception: return False
-            return False
+            # Трек уже отправлялся — шлем по file_id, без загрузки и аплоада
+            file_id = await self.downloader.get_file_id(track.identifier)
+            if file_id and await self._send_audio(file_id, caption, keyboard):
+                return True
+
+            await self._update_status(f"⬇️ Загрузка: *{track.title}*...")
+            
+            result = await self.downloader.download(
+                track.identifier, track_info=track, priority=Priority.RADIO_NOW, chat_id=self.chat_id
+            )
+            
+            if not result or not result.success or not result.file_path: return False
+
+            with open(result.file_path, 'rb') as f:
+                message = await self._send_audio(f, caption, keyboard)
+            # Популярный трек или трек, который слушают в веб-плеере, оставляем на диске — остальное сразу удаляем.
+            # Оставленные потом вытесняет DiskJanitor
+            listeners = self.broadcaster.listeners(self.chat_id) if self.broadcaster else 0
+            if not listeners and not (self.stats and self.stats.should_admit(track.identifier)):
+                try: os.unlink(result.file_path)
+                except: pass
+            if message and message.audio:
+                await self.downloader.remember_file_id(track.identifier, message.audio.file_id)
+            return message is not None
         except Exception: return False
 
+    async def _send_audio(self, audio, caption: str, keyboard) -> Optional[Message]:
+        try:
+            with tracing.span("telegram.send_audio"):
+                message = await self.bot.send_audio(
+                    self.chat_id, 
+                    audio=audio, 
+                    caption=caption, 
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=keyboard,
+                    read_timeout=60,
+                    write_timeout=60
+                )
+        except Exception: return None
+        if self.last_track_ended_at is not None:
+            metrics.RADIO_INTER_TRACK_GAP_SECONDS.observe(time.monotonic() - self.last_track_ended_at)
+        await self._delete_status()
+        return message
+
     async def _update_status(self, text: str):
         if not self.is_running: return
         try:
@@ -250,29 +355,53 @@ class RadioSession:
             except: pass
             self.status_message = None
 
+def catalog_queries() -> List[str]:
+    """Все query из листьев каталога, в порядке genres.json."""
+    queries: List[str] = []
+    def collect(node):
+        if isinstance(node, dict):
+            if "query" in node: queries.append(node["query"])
+            for child in node.get("children", {}).values(): collect(child)
+    for node in MUSIC_CATALOG.values(): collect(node)
+    return list(dict.fromkeys(queries))
+
 class RadioManager:
-    def __init__(self, bot: Bot, settings: Settings, downloader: YouTubeDownloader):
+    def __init__(self, bot: Bot, settings: Settings, downloader: YouTubeDownloader,
+                 prewarmer: Optional["Prewarmer"] = None, stats: Optional["StatsStore"] = None,
+                 related: Optional["RelatedGraph"] = None, broadcaster: Optional["BroadcastHub"] = None):
         self._bot = bot
         self._settings = settings
         self._downloader = downloader
+        self._prewarmer = prewarmer
+        self._stats = stats
+        self._related = related
+        self._broadcaster = broadcaster
         self._sessions: Dict[int, RadioSession] = {}
 
     async def start(self, chat_id: int, query: str, chat_type: Optional[str] = None, display_name: Optional[str] = None):
         if chat_id in self._sessions: 
-            await self._sessions[chat_id].stop()
+            await self._sessions[chat_id].stop(replaced=True)
         
         session = RadioSession(
             chat_id=chat_id, bot=self._bot, downloader=self._downloader, 
             settings=self._settings, query=query, display_name=(display_name or query), 
-            chat_type=chat_type
+            chat_type=chat_type, prewarmer=self._prewarmer, stats=self._stats,
+            related=self._related, broadcaster=self._broadcaster
         )
+        if self._prewarmer: self._prewarmer.record_play(query)
         self._sessions[chat_id] = session
+        metrics.RADIO_SESSIONS_ACTIVE.set(len(self._sessions))
         await session.start()
 
     async def stop(self, chat_id: int):
         if session := self._sessions.pop(chat_id, None): 
+            metrics.RADIO_SESSIONS_ACTIVE.set(len(self._sessions))
             await session.stop()
 
     async def skip(self, chat_id: int):
         if session := self._sessions.get(chat_id): 
             await session.skip()
+
+    def is_active(self, chat_id: int) -> bool:
+        session = self._sessions.get(chat_id)
+        return bool(session and session.is_running)
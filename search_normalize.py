@@ -0,0 +1,59 @@
+"""
+Нормализация страниц выдачи YTMusic: длительности всей страницы разбираются
+и фильтруются одним проходом, TrackInfo создаются только для прошедших фильтр.
+"""
+import sys
+from typing import List, Sequence
+
+from models import TrackInfo, track_registry
+
+MIN_DURATION = 40
+MAX_DURATION = 900
+
+_NO_THUMBNAILS = ({},)
+
+def parse_duration(d_str) -> int:
+    """Построчный разбор "H:MM:SS" / "M:SS" / "SS"; мусор -> 0."""
+    try:
+        parts = str(d_str).split(':')
+        if len(parts) == 3: return int(parts[0])*3600 + int(parts[1])*60 + int(parts[2])
+        if len(parts) == 2: return int(parts[0])*60 + int(parts[1])
+        return int(parts[0])
+    except ValueError:
+        return 0
+
+def normalize_page(items: Sequence[dict], duration_keys: Sequence[str] = ('duration',),
+                   min_duration: int = MIN_DURATION, max_duration: int = MAX_DURATION) -> List[TrackInfo]:
+    """
+    Страница выдачи -> TrackInfo только для треков с videoId и длительностью в [min, max].
+    Треки берутся из track_registry: уже известный трек не создается заново.
+    """
+    # Колонка длительностей: первый непустой из duration_keys
+    first, *fallbacks = duration_keys
+    column = [item.get(first) or '' for item in items]
+    for key in fallbacks:
+        column = [value or item.get(key) or '' for value, item in zip(column, items)]
+
+    durations = [parse_duration(v) for v in column]
+    survivors = [i for i, d in enumerate(durations) if min_duration <= d <= max_duration]
+
+    # Сборка выживших — основная стоимость страницы: позиционный конструктор, поиск
+    # и регистрация в track_registry без лишних проходов по словарю
+    results = []
+    append, known_track, register, intern = results.append, track_registry.get, track_registry.add, sys.intern
+    for i in survivors:
+        item = items[i]
+        video_id = item.get('videoId')
+        if not video_id: continue
+        known = known_track(video_id)
+        if known is not None:
+            append(known)
+            continue
+        thumbnails = item.get('thumbnails') or item.get('thumbnail') or _NO_THUMBNAILS
+        artists = item.get('artists')
+        uploader = ", ".join([a['name'] for a in artists]) if artists else ""
+        append(register(TrackInfo(
+            intern(video_id), item.get('title'), durations[i], intern(uploader),
+            thumbnails[-1].get('url'), "ytmusic",
+        )))
+    return results
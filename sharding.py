@@ -0,0 +1,239 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import aiosqlite
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop, ContextTypes, TypeHandler
+
+logger = logging.getLogger("sharding")
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+class HashRing:
+    """Консистентное хэширование: при уходе воркера переезжают только его чаты."""
+
+    def __init__(self, workers: List[str], vnodes: int = 64):
+        points = sorted((_hash(f"{w}#{i}"), w) for w in workers for i in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._workers = [p[1] for p in points]
+
+    def owner(self, chat_id: int) -> Optional[str]:
+        if not self._keys: return None
+        idx = bisect.bisect(self._keys, _hash(str(chat_id))) % len(self._keys)
+        return self._workers[idx]
+
+class ShardCoordinator:
+    """
+    Распределение чатов между воркерами через общий SQLite (WAL):
+    - workers: heartbeat живых воркеров, по ним строится HashRing;
+    - chat_leases: владелец чата с истекающей арендой. Владелец продлевает аренды
+      в heartbeat, после падения воркера они истекают и чат забирает следующий по кольцу.
+      Чаты, которые после смены кольца принадлежат другому воркеру, не продлеваются
+      (кроме pinned — например, с играющим радио) и переезжают к новому воркеру;
+    - update_inbox: апдейты, пересланные владельцу от воркера, который их принял.
+
+    Принимать апдейты может любой воркер (webhook за балансировщиком),
+    обрабатывает — только владелец чата, поэтому RadioSession и chat_data живут в одном процессе.
+    """
+
+    def __init__(self, db_path: Union[str, Path], worker_id: str, heartbeat_interval: float = 5.0,
+                 lease_ttl: float = 20.0, inbox_poll_interval: float = 0.2):
+        self._db_path = Path(db_path)
+        self.worker_id = worker_id
+        self._heartbeat_interval = heartbeat_interval
+        self._lease_ttl = lease_ttl
+        self._inbox_poll_interval = inbox_poll_interval
+        self._db: Optional[aiosqlite.Connection] = None
+        self._ring = HashRing([worker_id])
+        # chat_id -> (owner, expires): локальная копия аренды, чтобы не ходить в БД на каждый апдейт
+        self._leases: Dict[int, Tuple[str, float]] = {}
+        self._app: Optional[Application] = None
+        self._submit: Optional[Callable[[Update], object]] = None
+        self._pinned: Callable[[int], bool] = lambda chat_id: False
+        self._on_acquire: Callable[[int], object] = lambda chat_id: None
+        self._tasks: List[asyncio.Task] = []
+
+    async def initialize(self):
+        self._db = await aiosqlite.connect(self._db_path, timeout=10)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL);
+            CREATE TABLE IF NOT EXISTS chat_leases (chat_id INTEGER PRIMARY KEY, worker_id TEXT, expires REAL);
+            CREATE TABLE IF NOT EXISTS update_inbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, worker_id TEXT, payload TEXT, created REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_inbox_worker ON update_inbox (worker_id, id);
+        """)
+        await self._db.commit()
+        await self._heartbeat()
+        logger.info(f"Shard coordinator {self.worker_id} joined ({self._db_path})")
+
+    async def _heartbeat(self):
+        now = time.time()
+        await self._db.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)", (self.worker_id, now))
+        cursor = await self._db.execute("SELECT worker_id FROM workers WHERE heartbeat > ?", (now - self._lease_ttl,))
+        alive = sorted(row[0] for row in await cursor.fetchall())
+        self._ring = HashRing(alive)
+
+        # Продлеваем только свои по кольцу и занятые чаты: остальные истекут и уйдут новому владельцу
+        cursor = await self._db.execute("SELECT chat_id FROM chat_leases WHERE worker_id = ?", (self.worker_id,))
+        renewed = [chat_id for (chat_id,) in await cursor.fetchall()
+                   if self._ring.owner(chat_id) == self.worker_id or self._pinned(chat_id)]
+        await self._db.executemany(
+            "UPDATE chat_leases SET expires = ? WHERE chat_id = ? AND worker_id = ?",
+            [(now + self._lease_ttl, chat_id, self.worker_id) for chat_id in renewed]
+        )
+        await self._db.commit()
+        # Свои аренды продлены, чужие и отпущенные перечитаем при следующем апдейте
+        renewed = set(renewed)
+        self._leases = {c: (w, now + self._lease_ttl if c in renewed else expires)
+                        for c, (w, expires) in self._leases.items() if w == self.worker_id}
+
+    async def owner_of(self, chat_id: int) -> str:
+        now = time.time()
+        cached = self._leases.get(chat_id)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        candidate = self._ring.owner(chat_id) or self.worker_id
+        cursor = await self._db.execute("SELECT worker_id FROM chat_leases WHERE chat_id = ?", (chat_id,))
+        previous = await cursor.fetchone()
+        # Захват только просроченной аренды: живой владелец сохраняет чат даже при смене кольца
+        await self._db.execute("""
+            INSERT INTO chat_leases (chat_id, worker_id, expires) VALUES (?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET worker_id = excluded.worker_id, expires = excluded.expires
+            WHERE chat_leases.expires < ?
+        """, (chat_id, candidate, now + self._lease_ttl, now))
+        await self._db.commit()
+        cursor = await self._db.execute("SELECT worker_id, expires FROM chat_leases WHERE chat_id = ?", (chat_id,))
+        owner, expires = await cursor.fetchone()
+        self._leases[chat_id] = (owner, expires)
+        if owner == self.worker_id and (previous is None or previous[0] != self.worker_id):
+            # Чат пришел от другого воркера (или после его остановки): локальное состояние могло устареть
+            self._on_acquire(chat_id)
+        return owner
+
+    async def forward(self, owner: str, update: Update):
+        await self._db.execute(
+            "INSERT INTO update_inbox (worker_id, payload, created) VALUES (?, ?, ?)",
+            (owner, json.dumps(update.to_dict()), time.time())
+        )
+        await self._db.commit()
+
+    async def _route(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Pre-handler (group -100): чужие апдейты уходят владельцу, дальше не обрабатываются."""
+        chat = update.effective_chat
+        if chat is None: return
+        try:
+            owner = await self.owner_of(chat.id)
+        except Exception as e:
+            # Координатор недоступен — лучше обработать локально, чем потерять апдейт
+            logger.error(f"Ownership lookup failed for {chat.id}: {e}")
+            return
+        if owner != self.worker_id:
+            await self.forward(owner, update)
+            raise ApplicationHandlerStop
+        # PTB подтянул chat_data до этого хендлера; если аренду только что забрали (on_acquire),
+        # перечитываем уже свежую версию. Для загруженных чатов это no-op.
+        await context.refresh_data()
+
+    async def _consume_inbox(self):
+        while True:
+            await asyncio.sleep(self._inbox_poll_interval)
+            try:
+                cursor = await self._db.execute(
+                    "SELECT id, payload FROM update_inbox WHERE worker_id = ? ORDER BY id LIMIT 100", (self.worker_id,)
+                )
+                rows = await cursor.fetchall()
+                if not rows: continue
+                # Строка удаляется только после того, как апдейт принят в очередь:
+                # Telegram уже получил 200 и сам его не повторит
+                done = self._deliver(rows)
+                if not done: continue
+                await self._db.execute(
+                    f"DELETE FROM update_inbox WHERE id IN ({','.join('?' * len(done))})", done
+                )
+                await self._db.commit()
+            except Exception as e:
+                logger.error(f"Inbox read failed: {e}")
+
+    def _deliver(self, rows: List[Tuple[int, str]]) -> List[int]:
+        """id строк inbox, которые можно удалить; на первой отказавшей очереди останавливаемся, чтобы сохранить порядок."""
+        done = []
+        for row_id, payload in rows:
+            try:
+                update = Update.de_json(json.loads(payload), self._app.bot)
+            except Exception as e:
+                logger.error(f"Dropping malformed inbox update {row_id}: {e}")
+                done.append(row_id)
+                continue
+            try:
+                accepted = self._submit(update) is not False
+            except asyncio.QueueFull:
+                accepted = False
+            if not accepted:
+                logger.warning(f"Update queue full, {len(rows) - len(done)} inbox updates left for the next poll")
+                break
+            done.append(row_id)
+        return done
+
+    async def _requeue_orphans(self):
+        """Апдейты в ящиках мертвых воркеров переадресуются по текущему кольцу."""
+        now = time.time()
+        await self._db.execute(
+            "UPDATE update_inbox SET worker_id = ? WHERE worker_id NOT IN (SELECT worker_id FROM workers WHERE heartbeat > ?)",
+            (self.worker_id, now - self._lease_ttl)
+        )
+        await self._db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - self._lease_ttl * 10,))
+        await self._db.commit()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                await self._heartbeat()
+                await self._requeue_orphans()
+            except Exception as e:
+                logger.error(f"Heartbeat failed: {e}")
+
+    def install(self, app: Application, submit: Optional[Callable[[Update], object]] = None,
+                pinned: Optional[Callable[[int], bool]] = None, on_acquire: Optional[Callable[[int], object]] = None):
+        """
+        submit — куда отдавать апдейты из inbox (по умолчанию очередь PTB, как при polling);
+        False от submit значит «очередь полна», апдейт остается в inbox.
+        pinned — чаты, которые нельзя отдавать новому владельцу по кольцу (их состояние живет в процессе).
+        on_acquire — вызывается, когда этот воркер забирает чат у другого (сбросить закэшированное состояние чата).
+        """
+        self._app = app
+        self._submit = submit or app.update_queue.put_nowait
+        if pinned: self._pinned = pinned
+        if on_acquire: self._on_acquire = on_acquire
+        app.add_handler(TypeHandler(Update, self._route), group=-100)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._heartbeat_loop()), asyncio.create_task(self._consume_inbox())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._db:
+            # Отдаем чаты сразу, не дожидаясь истечения аренды
+            await self._db.execute("DELETE FROM chat_leases WHERE worker_id = ?", (self.worker_id,))
+            await self._db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            await self._db.commit()
+            await self._db.close()
+            self._db = None
@@ -1,8 +1,7 @@
 import asyncio
 import logging
 import re
-from typing import Optional
-from urllib.parse import urlparse
+from typing import AsyncIterator, Optional, Tuple
 
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
@@ -10,15 +9,22 @@ from spotipy.oauth2 import SpotifyClientCredentials
 from config import Settings
 from models import DownloadResult, TrackInfo, Source
 from youtube import YouTubeDownloader
+from cache_service import CacheService
+from concurrency import Priority
+from track_matcher import SpotifyTrackRef, best_match
 
 logger = logging.getLogger(__name__)
 
+SPOTIFY_URL_RE = re.compile(r"open\.spotify\.com/(?:intl-[a-z]+/)?(track|album|playlist)/([a-zA-Z0-9]+)")
+MATCH_CACHE_TTL = 30 * 24 * 3600
+
 class SpotifyService:
-    def __init__(self, settings: Settings, youtube_downloader: YouTubeDownloader):
+    def __init__(self, settings: Settings, youtube_downloader: YouTubeDownloader, cache_service: Optional[CacheService] = None):
         self._settings = settings
         self._yt_downloader = youtube_downloader
+        self._cache = cache_service
         self._sp_client: Optional[spotipy.Spotify] = None
-        
+
         self._initialize_spotify_client()
         logger.info("🟢 SpotifyService initialized.")
 
@@ -38,16 +44,85 @@ class SpotifyService:
             logger.error(f"❌ Failed to initialize Spotify API client: {e}")
             self._sp_client = None
 
+    def _extract_spotify_ref(self, url: str) -> Optional[Tuple[str, str]]:
+        """Возвращает (тип, id) для ссылок на трек, альбом или плейлист."""
+        match = SPOTIFY_URL_RE.search(url)
+        return (match.group(1), match.group(2)) if match else None
+
     def _extract_spotify_id(self, url: str) -> Optional[str]:
-        parsed_url = urlparse(url)
-        if "open.spotify.com" in parsed_url.netloc:
-            match = re.search(r"track/([a-zA-Z0-9]+)", parsed_url.path)
-            if match:
-                return match.group(1)
-        return None
-    
+        ref = self._extract_spotify_ref(url)
+        return ref[1] if ref and ref[0] == "track" else None
+
     def is_spotify_url(self, text: str) -> bool:
-        return "open.spotify.com/track" in text
+        return bool(SPOTIFY_URL_RE.search(text))
+
+    def is_collection_url(self, text: str) -> bool:
+        match = SPOTIFY_URL_RE.search(text)
+        return bool(match) and match.group(1) != "track"
+
+    # --- MATCHING ---
+
+    async def _match_video_id(self, spotify_track: dict) -> Optional[str]:
+        """
+        Spotify ID -> YouTube video ID по лучшему score; уверенное решение кэшируется.
+        Без уверенного совпадения — первый результат поиска, как раньше, но без кэша:
+        аудио все равно выбирается на SoundCloud по метаданным Spotify.
+        """
+        cache_key = f"spotify:{spotify_track.get('id')}"
+        if self._cache and spotify_track.get('id'):
+            cached = await self._cache.get(cache_key)
+            # Промахи, закэшированные прежними версиями ({'identifier': None}), ищутся заново
+            if isinstance(cached, dict):
+                if cached.get('identifier'): return cached['identifier']
+            elif cached: return cached
+
+        ref = SpotifyTrackRef.from_spotify(spotify_track)
+        query = f"{ref.artists[0] if ref.artists else 'Unknown Artist'} - {ref.title}"
+
+        logger.info(f"Searching YouTube for Spotify track: '{query}'")
+        # We search for more results to find a good match; ISRC search usually hits the exact recording
+        searches = [self._yt_downloader.search(query, limit=5, priority=Priority.TG_SEARCH)]
+        if ref.isrc:
+            searches.append(self._yt_downloader.search(ref.isrc, limit=3, priority=Priority.TG_SEARCH))
+        found = await asyncio.gather(*searches)
+
+        isrc_ids = {t.identifier for t in found[1]} if ref.isrc else set()
+        candidates = list({t.identifier: t for tracks in found for t in tracks}.values())
+        match = best_match(ref, candidates, isrc_ids)
+
+        if not match:
+            logger.warning(f"No confident YouTube match for '{query}' among {len(candidates)} candidates.")
+            return found[0][0].identifier if found[0] else None
+
+        decision = {'identifier': match[0].identifier, 'score': round(match[1], 3)}
+        logger.info(f"Matched '{query}' -> {match[0].uploader} - {match[0].title} (score {match[1]:.2f})")
+        if self._cache and spotify_track.get('id'):
+            await self._cache.set(cache_key, decision, ttl=MATCH_CACHE_TTL)
+        return decision['identifier']
+
+    def _build_track_info(self, spotify_track: dict, video_id: str, album: Optional[dict] = None) -> TrackInfo:
+        """Rich TrackInfo using metadata from both services."""
+        album = spotify_track.get('album') or album or {}
+        return TrackInfo(
+            identifier=video_id, # YouTube ID
+            title=spotify_track['name'], # Spotify Title
+            uploader=spotify_track['artists'][0]['name'] if spotify_track.get('artists') else "Unknown Artist",
+            duration=spotify_track.get('duration_ms', 0) // 1000, # Spotify Duration
+            source=Source.SPOTIFY, # Indicate origin
+            album=album.get('name'),
+            thumbnail_url=album['images'][0]['url'] if album.get('images') else None
+        )
+
+    async def _download_spotify_track(self, spotify_track: dict, album: Optional[dict] = None) -> DownloadResult:
+        video_id = await self._match_video_id(spotify_track)
+        if not video_id:
+            return DownloadResult(success=False, error_message=f"No YouTube results found for '{spotify_track.get('name')}'.")
+
+        track_info = self._build_track_info(spotify_track, video_id, album)
+        logger.info(f"Downloading '{track_info.title}' from YouTube (ID: {video_id}).")
+        return await self._yt_downloader.download(video_id, track_info=track_info, priority=Priority.TG_SEARCH)
+
+    # --- SINGLE TRACK ---
 
     async def download_from_url(self, spotify_url: str) -> DownloadResult:
         track_id = self._extract_spotify_id(spotify_url)
@@ -64,33 +139,105 @@ class SpotifyService:
             if not spotify_track:
                 return DownloadResult(success=False, error_message="Could not fetch track info from Spotify.")
 
-            artist_name = spotify_track['artists'][0]['name'] if spotify_track['artists'] else "Unknown Artist"
-            track_name = spotify_track['name']
-            query = f"{artist_name} - {track_name}"
-
-            logger.info(f"Searching YouTube for Spotify track: '{query}'")
-            # We search for more results to find a good match
-            yt_tracks = await self._yt_downloader.search(query, limit=5)
-
-            if not yt_tracks:
-                return DownloadResult(success=False, error_message=f"No YouTube results found for '{query}'.")
-
-            # Simple logic: pick the first result
-            best_yt_track = yt_tracks[0]
-            
-            # Create a rich TrackInfo object using metadata from both services
-            final_track_info = TrackInfo(
-                identifier=best_yt_track.identifier, # YouTube ID
-                title=track_name, # Spotify Title
-                artist=artist_name, # Spotify Artist
-                duration=spotify_track.get('duration_ms', 0) // 1000, # Spotify Duration
-                source=Source.SPOTIFY, # Indicate origin
-                thumbnail_url=spotify_track['album']['images'][0]['url'] if spotify_track.get('album', {}).get('images') else None
-            )
-
-            logger.info(f"Downloading '{final_track_info.title}' from YouTube (ID: {best_yt_track.identifier}).")
-            return await self._yt_downloader.download(best_yt_track.identifier, track_info=final_track_info)
+            return await self._download_spotify_track(spotify_track)
 
         except Exception as e:
             logger.error(f"Error downloading Spotify track '{spotify_url}': {e}", exc_info=True)
-            return DownloadResult(success=False, error_message="Internal error processing Spotify track.")
\ No newline at end of file
+            return DownloadResult(success=False, error_message="Internal error processing Spotify track.")
+
+    # --- PLAYLISTS & ALBUMS ---
+
+    async def _iter_collection(self, kind: str, collection_id: str) -> AsyncIterator[Tuple[dict, Optional[dict]]]:
+        """Постранично отдает (spotify_track, album) из плейлиста или альбома."""
+        loop = asyncio.get_running_loop()
+        album = None
+        if kind == "album":
+            album = await loop.run_in_executor(None, self._sp_client.album, collection_id)
+
+        offset, limit = 0, (100 if kind == "playlist" else 50)
+        while True:
+            if kind == "playlist":
+                page = await loop.run_in_executor(
+                    None, lambda: self._sp_client.playlist_items(collection_id, offset=offset, limit=limit, additional_types=("track",))
+                )
+                tracks = [item.get('track') for item in page.get('items', [])]
+            else:
+                page = await loop.run_in_executor(
+                    None, lambda: self._sp_client.album_tracks(collection_id, offset=offset, limit=limit)
+                )
+                tracks = page.get('items', [])
+
+            for track in tracks:
+                # Локальные файлы и удаленные треки приходят без id
+                if track and track.get('id') and track.get('name'):
+                    yield track, album
+
+            if not page.get('next'):
+                return
+            offset += limit
+
+    async def stream_from_url(self, spotify_url: str, max_tracks: Optional[int] = None) -> AsyncIterator[DownloadResult]:
+        """
+        Потоковая загрузка трека, альбома или плейлиста.
+        Страницы Spotify читаются по мере надобности, поиск и загрузка идут параллельно
+        (не более SPOTIFY_MATCH_CONCURRENCY), результаты отдаются по готовности.
+        """
+        ref = self._extract_spotify_ref(spotify_url)
+        if not ref:
+            yield DownloadResult(success=False, error_message="Invalid Spotify URL.")
+            return
+
+        kind, collection_id = ref
+        if kind == "track":
+            yield await self.download_from_url(spotify_url)
+            return
+
+        if not self._sp_client:
+            yield DownloadResult(success=False, error_message="Spotify API client not initialized. Check credentials.")
+            return
+
+        max_tracks = max_tracks or self._settings.SPOTIFY_MAX_TRACKS
+        concurrency = max(self._settings.SPOTIFY_MATCH_CONCURRENCY, 1)
+        slots = asyncio.Semaphore(concurrency)
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        tasks = set()
+
+        async def _process(spotify_track: dict, album: Optional[dict]):
+            # Слот держится до передачи результата: пока потребитель (отправка в чат) не разобрал
+            # готовые файлы, новые загрузки не начинаются и не копятся на диске
+            try:
+                try:
+                    result = await self._download_spotify_track(spotify_track, album)
+                except Exception as e:
+                    logger.error(f"Spotify track '{spotify_track.get('name')}' failed: {e}")
+                    result = DownloadResult(success=False, error_message=str(e))
+                await results.put(result)
+            finally:
+                slots.release()
+
+        async def _produce():
+            try:
+                count = 0
+                async for spotify_track, album in self._iter_collection(kind, collection_id):
+                    if count >= max_tracks: break
+                    await slots.acquire()
+                    task = asyncio.create_task(_process(spotify_track, album))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    count += 1
+            except Exception as e:
+                logger.error(f"Error reading Spotify {kind} '{collection_id}': {e}", exc_info=True)
+                await results.put(DownloadResult(success=False, error_message=f"Could not read Spotify {kind}."))
+            # Уже начатые треки отдаются и при сбое чтения плейлиста.
+            # Не в finally: после отмены (потребитель ушел) ждать места в очереди некому
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await results.put(None)
+
+        producer = asyncio.create_task(_produce())
+        try:
+            while (result := await results.get()) is not None:
+                yield result
+        finally:
+            producer.cancel()
+            for task in list(tasks): task.cancel()
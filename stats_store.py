@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import aiosqlite
+
+logger = logging.getLogger("stats")
+
+HALF_LIFE = 7 * 24 * 3600          # Популярность наполовину затухает за неделю
+EVENT_RETENTION = 14 * 24 * 3600   # Сырые события храним две недели
+
+class StatsStore:
+    """
+    Статистика прослушиваний в базе кэша:
+    - play_events — журнал (только INSERT, пачками через executemany);
+    - track_popularity / genre_popularity — периодические свертки журнала
+      с экспоненциальным затуханием score (half-life неделя).
+
+    Горячие треки (score >= admit_score) — те, что вероятно сыграют снова:
+    их аудио DiskJanitor оставляет на диске и метаданные держим дольше.
+    """
+
+    def __init__(self, db_path: Union[str, Path], admit_score: float = 1.5,
+                 flush_interval: float = 5.0, rollup_interval: float = 60.0):
+        self._db_path = Path(db_path)
+        self._admit_score = admit_score
+        self._flush_interval = flush_interval
+        self._rollup_interval = rollup_interval
+        self._db: Optional[aiosqlite.Connection] = None
+        self._buffer: List[Tuple] = []
+        self._hot: Dict[str, float] = {}
+        self._genres: Dict[str, float] = {}
+        self._last_rollup = time.time()
+        self._tasks: List[asyncio.Task] = []
+        # Запись пачки и свертка на одном соединении: commit пачки посреди свертки
+        # зафиксировал бы ее наполовину
+        self._lock = asyncio.Lock()
+
+    async def initialize(self):
+        self._db = await aiosqlite.connect(self._db_path, timeout=10)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS play_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL, chat_id INTEGER, track_id TEXT,
+                title TEXT, genre TEXT, outcome TEXT, latency_ms REAL
+            );
+            CREATE TABLE IF NOT EXISTS track_popularity (
+                track_id TEXT PRIMARY KEY, title TEXT, plays INTEGER, failures INTEGER, last_played REAL, score REAL
+            );
+            CREATE TABLE IF NOT EXISTS genre_popularity (
+                genre TEXT PRIMARY KEY, plays INTEGER, last_played REAL, score REAL
+            );
+            CREATE TABLE IF NOT EXISTS stats_meta (key TEXT PRIMARY KEY, value REAL);
+        """)
+        await self._db.commit()
+        cursor = await self._db.execute("SELECT value FROM stats_meta WHERE key = 'last_rollup_ts'")
+        row = await cursor.fetchone()
+        if row: self._last_rollup = row[0]
+        await self._load_hot()
+
+    # --- Запись ---
+    def record(self, track_id: str, outcome: str, latency: float = 0.0, chat_id: Optional[int] = None,
+               genre: Optional[str] = None, title: Optional[str] = None):
+        """Без await: событие ложится в буфер, на диск — пачкой."""
+        self._buffer.append((time.time(), chat_id, track_id, title, genre, outcome, round(latency * 1000, 1)))
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buffer or not self._db: return
+        batch, self._buffer = self._buffer, []
+        try:
+            await self._db.executemany(
+                "INSERT INTO play_events (ts, chat_id, track_id, title, genre, outcome, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            await self._db.commit()
+        except Exception as e:
+            logger.error(f"Play events write failed ({len(batch)}): {e}")
+            self._buffer[:0] = batch
+
+    # --- Свертки ---
+    async def rollup(self):
+        async with self._lock:
+            await self._flush()
+            try:
+                await self._rollup()
+            except Exception:
+                # Иначе недоделанную свертку зафиксирует commit следующей пачки
+                await self._db.rollback()
+                raise
+        await self._load_hot()
+
+    async def _rollup(self):
+        now = time.time()
+        decay = 0.5 ** ((now - self._last_rollup) / HALF_LIFE)
+        cursor = await self._db.execute("SELECT value FROM stats_meta WHERE key = 'last_event_id'")
+        row = await cursor.fetchone()
+        last_id = int(row[0]) if row else 0
+        # Граница свертки берется до выборок: обе видят один и тот же диапазон событий
+        cursor = await self._db.execute("SELECT MAX(id) FROM play_events")
+        max_id = max((await cursor.fetchone())[0] or 0, last_id)
+
+        cursor = await self._db.execute("""
+            SELECT track_id, MAX(title), SUM(outcome = 'ok'), SUM(outcome != 'ok'), MAX(ts)
+            FROM play_events WHERE id > ? AND id <= ? GROUP BY track_id
+        """, (last_id, max_id))
+        tracks = await cursor.fetchall()
+        cursor = await self._db.execute("""
+            SELECT genre, SUM(outcome = 'ok'), MAX(ts) FROM play_events
+            WHERE id > ? AND id <= ? AND genre IS NOT NULL GROUP BY genre
+        """, (last_id, max_id))
+        genres = await cursor.fetchall()
+
+        await self._db.execute("UPDATE track_popularity SET score = score * ?", (decay,))
+        await self._db.execute("UPDATE genre_popularity SET score = score * ?", (decay,))
+        await self._db.executemany("""
+            INSERT INTO track_popularity (track_id, title, plays, failures, last_played, score) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(track_id) DO UPDATE SET
+                title = COALESCE(excluded.title, title), plays = plays + excluded.plays,
+                failures = failures + excluded.failures, last_played = excluded.last_played, score = score + excluded.score
+        """, [(t, title, ok, failed, ts, float(ok)) for t, title, ok, failed, ts in tracks])
+        await self._db.executemany("""
+            INSERT INTO genre_popularity (genre, plays, last_played, score) VALUES (?, ?, ?, ?)
+            ON CONFLICT(genre) DO UPDATE SET
+                plays = plays + excluded.plays, last_played = excluded.last_played, score = score + excluded.score
+        """, [(g, ok, ts, float(ok)) for g, ok, ts in genres])
+
+        await self._db.executemany("INSERT OR REPLACE INTO stats_meta (key, value) VALUES (?, ?)",
+                                   [("last_event_id", max_id), ("last_rollup_ts", now)])
+        await self._db.execute("DELETE FROM play_events WHERE ts < ? AND id <= ?", (now - EVENT_RETENTION, max_id))
+        await self._db.execute("DELETE FROM track_popularity WHERE score < 0.05")
+        await self._db.commit()
+        self._last_rollup = now
+        logger.debug(f"Stats rollup: {len(tracks)} tracks, {len(genres)} genres")
+
+    async def _load_hot(self):
+        cursor = await self._db.execute("SELECT track_id, score FROM track_popularity WHERE score >= ?", (self._admit_score,))
+        self._hot = dict(await cursor.fetchall())
+        cursor = await self._db.execute("SELECT genre, score FROM genre_popularity ORDER BY score DESC LIMIT 50")
+        self._genres = dict(await cursor.fetchall())
+
+    # --- Решения для кэшей ---
+    def should_admit(self, track_id: str) -> bool:
+        """Держать ли аудио трека на диске после отправки."""
+        return track_id in self._hot
+
+    def meta_ttl(self, track_id: str, default: int = 3600) -> int:
+        return 7 * 24 * 3600 if track_id in self._hot else default
+
+    def top_genres(self, limit: int) -> List[str]:
+        return sorted(self._genres, key=lambda g: -self._genres[g])[:limit]
+
+    # --- Отчеты ---
+    async def summary(self, limit: int = 10) -> dict:
+        await self.flush()
+        since = time.time() - 24 * 3600
+        cursor = await self._db.execute(
+            "SELECT COUNT(*), SUM(outcome = 'ok'), AVG(latency_ms) FROM play_events WHERE ts > ?", (since,)
+        )
+        total, ok, avg_latency = await cursor.fetchone()
+        cursor = await self._db.execute(
+            "SELECT track_id, title, plays, score FROM track_popularity ORDER BY score DESC LIMIT ?", (limit,)
+        )
+        top_tracks = await cursor.fetchall()
+        cursor = await self._db.execute(
+            "SELECT genre, plays, score FROM genre_popularity ORDER BY score DESC LIMIT ?", (limit,)
+        )
+        top_genres = await cursor.fetchall()
+        return {
+            "events_24h": total or 0, "ok_24h": ok or 0, "avg_latency_ms": round(avg_latency or 0, 1),
+            "hot_tracks": len(self._hot), "top_tracks": top_tracks, "top_genres": top_genres,
+        }
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def _rollup_loop(self):
+        while True:
+            await asyncio.sleep(self._rollup_interval)
+            try:
+                await self.rollup()
+            except Exception as e:
+                logger.error(f"Stats rollup failed: {e}")
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._rollup_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._db:
+            await self.flush()
+            await self._db.close()
+            self._db = None
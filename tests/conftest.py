@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# Модули бота лежат в корне репозитория; Settings без BOT_TOKEN не создается
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("BOT_TOKEN", "123456:test")
@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+from audio_processing import LoudnessNormalizer
+
+MEASURED = {"input_i": -20.5, "input_tp": -3.1, "input_lra": 6.0, "input_thresh": -31.0, "target_offset": 0.4}
+
+ANALYSIS_STDERR = """[Parsed_loudnorm_0 @ 0x1]
+{
+	"input_i" : "-20.50",
+	"input_tp" : "-3.10",
+	"input_lra" : "6.00",
+	"input_thresh" : "-31.00",
+	"output_i" : "-14.02",
+	"normalization_type" : "dynamic",
+	"target_offset" : "0.40"
+}
+"""
+
+class _Cache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+class _FakeFfmpeg:
+    """Вместо ffmpeg: первый проход печатает замер, второй пишет выходной файл."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, args):
+        self.calls.append(args)
+        if "null" in args:
+            return SimpleNamespace(returncode=0, stderr=ANALYSIS_STDERR)
+        with open(args[-1], "wb") as f:
+            f.write(b"mp3")
+        return SimpleNamespace(returncode=0, stderr="")
+
+    @property
+    def analyses(self):
+        return sum("null" in args for args in self.calls)
+
+def _normalizer(cache):
+    normalizer = LoudnessNormalizer(cache, target_i=-14.0)
+    normalizer._run = _FakeFfmpeg()
+    return normalizer
+
+def _process(normalizer, tmp_path, content: bytes):
+    source = tmp_path / "x_temp"
+    source.write_bytes(content)
+    target = tmp_path / "x.mp3"
+    assert asyncio.run(normalizer.process("x", source, target))
+    assert target.read_bytes() == b"mp3" and not source.exists()
+    return normalizer._run.calls[-1]
+
+def test_measurement_is_applied_as_linear_loudnorm(tmp_path):
+    normalizer = _normalizer(_Cache())
+    transcode = _process(normalizer, tmp_path, b"audio")
+    audio_filter = transcode[transcode.index("-af") + 1]
+    assert audio_filter.startswith("loudnorm=I=-14.0:TP=-1.5:LRA=11.0:")
+    assert "measured_I=-20.5" in audio_filter and "offset=0.4" in audio_filter and audio_filter.endswith("linear=true")
+    normalizer.close()
+
+def test_same_source_reuses_cached_measurement(tmp_path):
+    cache = _Cache()
+    normalizer = _normalizer(cache)
+    _process(normalizer, tmp_path, b"audio")
+    _process(normalizer, tmp_path, b"audio")
+    assert normalizer._run.analyses == 1
+    (key, value), = cache.data.items()
+    assert key.startswith("loudnorm:x:") and value == MEASURED
+    normalizer.close()
+
+def test_different_upload_for_same_track_is_measured_again(tmp_path):
+    normalizer = _normalizer(_Cache())
+    _process(normalizer, tmp_path, b"audio")
+    # После вытеснения поиск вернул другую загрузку того же трека
+    _process(normalizer, tmp_path, b"another upload")
+    assert normalizer._run.analyses == 2
+    normalizer.close()
+
+def test_failed_analysis_still_transcodes(tmp_path):
+    normalizer = _normalizer(None)
+    normalizer._run = lambda args: (SimpleNamespace(returncode=1, stderr="boom") if "null" in args
+                                    else _FakeFfmpeg()(args))
+    source, target = tmp_path / "y_temp", tmp_path / "y.mp3"
+    source.write_bytes(b"audio")
+    assert asyncio.run(normalizer.process("y", source, target))
+    assert target.exists()
+    normalizer.close()
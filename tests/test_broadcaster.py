@@ -0,0 +1,63 @@
+import asyncio
+
+from broadcaster import BroadcastHub, StationBroadcaster
+
+def test_slow_listener_drops_oldest_events():
+    async def scenario():
+        station = StationBroadcaster(1, queue_size=2)
+        events = station.subscribe(keepalive=1.0)
+        # Первый шаг генератора регистрирует очередь и ждет события
+        first = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        station.publish({"type": "track", "n": 0})
+        assert (await first)["n"] == 0
+        # Слушатель не читает, пока идут четыре события
+        for i in range(1, 5):
+            station.publish({"type": "track", "n": i})
+        received = [(await events.__anext__())["n"] for _ in range(2)]
+        # Из заполненной очереди ушли старые события, а не новые
+        assert received == [3, 4]
+        await events.aclose()
+        assert station.listeners == 0
+
+    asyncio.run(scenario())
+
+def test_new_listener_gets_last_event():
+    async def scenario():
+        station = StationBroadcaster(1)
+        station.publish({"type": "track", "n": 1})
+        events = station.subscribe(keepalive=1.0)
+        assert (await events.__anext__())["n"] == 1
+        await events.aclose()
+
+    asyncio.run(scenario())
+
+def test_stopped_station_without_listeners_is_removed():
+    hub = BroadcastHub("secret")
+    hub.publish(5, {"type": "track"})
+    assert 5 in hub._stations
+    hub.publish(5, {"type": "stopped"})
+    assert 5 not in hub._stations
+
+def test_stopped_station_removed_after_last_listener_leaves():
+    async def scenario():
+        hub = BroadcastHub("secret")
+        hub.publish(5, {"type": "track"})
+        stream = hub.sse(5)
+        assert (await stream.__anext__()).startswith("event: track")
+        hub.publish(5, {"type": "stopped"})
+        # Слушатель еще подключен — станция живет
+        assert 5 in hub._stations
+        assert (await stream.__anext__()).startswith("event: stopped")
+        await stream.aclose()
+        assert 5 not in hub._stations
+
+    asyncio.run(scenario())
+
+def test_station_key():
+    hub = BroadcastHub("secret")
+    key = hub.key(42)
+    assert hub.verify(42, key)
+    assert not hub.verify(43, key)
+    assert not hub.verify(42, "")
+    assert not BroadcastHub("other").verify(42, key)
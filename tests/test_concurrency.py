@@ -0,0 +1,102 @@
+import asyncio
+
+from concurrency import AdaptiveLimiter, FairQueue, Limiter, Priority, WorkScheduler
+
+def _futures(n):
+    loop = asyncio.new_event_loop()
+    return loop, [loop.create_future() for _ in range(n)]
+
+def test_fair_queue_orders_by_priority_then_round_robin():
+    loop, (a1, a2, a3, b1, urgent) = _futures(5)
+    queue = FairQueue()
+    queue.push(Priority.RADIO_PREFETCH, "a", a1)
+    queue.push(Priority.RADIO_PREFETCH, "a", a2)
+    queue.push(Priority.RADIO_PREFETCH, "a", a3)
+    queue.push(Priority.RADIO_PREFETCH, "b", b1)
+    queue.push(Priority.WEB_STREAM, "c", urgent)
+    assert [queue.pop() for _ in range(5)] == [urgent, a1, b1, a2, a3]
+    assert len(queue) == 0 and queue.pop() is None
+    loop.close()
+
+def test_fair_queue_skips_owners_over_share():
+    loop, (a1, b1) = _futures(2)
+    queue = FairQueue()
+    queue.push(Priority.TG_SEARCH, "a", a1)
+    queue.push(Priority.TG_SEARCH, "b", b1)
+    assert queue.pop(skip_owner=lambda owner: owner == "a") is b1
+    assert queue.remove(a1) == "a" and len(queue) == 0
+    loop.close()
+
+def test_limiter_grants_higher_priority_first():
+    async def scenario():
+        limiter = Limiter(1)
+        order = []
+        await limiter.acquire()
+
+        async def job(name, priority):
+            async with limiter.slot(priority, owner=name):
+                order.append(name)
+
+        tasks = [asyncio.create_task(job("prefetch", Priority.RADIO_PREFETCH)),
+                 asyncio.create_task(job("stream", Priority.WEB_STREAM))]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == ["stream", "prefetch"]
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        limiter = Limiter(1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        assert limiter.active == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+def test_escalated_waiter_overtakes_lower_classes():
+    async def scenario():
+        scheduler = WorkScheduler(search_limit=1, download_initial=1, download_max=1)
+        order = []
+        await scheduler.downloads.acquire()
+
+        async def job(name, priority, key=None):
+            async with scheduler.download_slot(priority, chat_id=name, key=key):
+                order.append(name)
+
+        tasks = [asyncio.create_task(job("radio", Priority.RADIO_NOW)),
+                 asyncio.create_task(job("shared", Priority.RADIO_PREFETCH, key="vid"))]
+        await asyncio.sleep(0)
+        assert scheduler.escalate_download("vid", Priority.WEB_STREAM)
+        # Ниже текущего класса не опускаем, неизвестный key — не ошибка
+        assert not scheduler.escalate_download("vid", Priority.RADIO_PREFETCH)
+        assert not scheduler.escalate_download("other", Priority.WEB_STREAM)
+        scheduler.downloads.release()
+        await asyncio.gather(*tasks)
+        assert order == ["shared", "radio"]
+        assert scheduler.downloads.active == 0
+
+    asyncio.run(scenario())
+
+def test_aimd_increases_on_healthy_latency_and_halves_on_overload():
+    limiter = AdaptiveLimiter(4, min_limit=1, max_limit=8, cooldown=60)
+    for _ in range(4):
+        limiter.record(1.0, ok=True)
+    assert limiter.limit == 5
+    limiter.record(1.0, ok=False, overloaded=True)
+    assert limiter.limit == 2
+    # Пачка ошибок в пределах cooldown — одно снижение
+    limiter.record(1.0, ok=False, overloaded=True)
+    assert limiter.limit == 2
+
+def test_aimd_ignores_slow_successes():
+    limiter = AdaptiveLimiter(2, max_limit=8)
+    limiter.record(1.0, ok=True)
+    for _ in range(10):
+        limiter.record(5.0, ok=True)
+    assert limiter.limit == 2
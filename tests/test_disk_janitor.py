@@ -0,0 +1,40 @@
+import asyncio
+import os
+import time
+
+from disk_janitor import DiskJanitor, evict_files
+
+def _touch(path, age):
+    path.write_bytes(b"x")
+    old = time.time() - age
+    os.utime(path, (old, old))
+
+def test_evicts_old_files_except_kept(tmp_path):
+    downloads = tmp_path / "downloads"
+    (downloads / "hls" / "cold").mkdir(parents=True)
+    (downloads / "hls" / ".cold-building").mkdir()
+    (downloads / "hls" / "hot").mkdir()
+    for name in ("hot.mp3", "cold.mp3", "cold.low.ogg", "cold_temp.mp3", "notes.txt"):
+        _touch(downloads / name, age=86400)
+    _touch(downloads / "fresh.mp3", age=0)
+    for d in ("cold", ".cold-building", "hot"):
+        os.utime(downloads / "hls" / d, (time.time() - 86400,) * 2)
+
+    assert evict_files(downloads, keep=lambda track_id: track_id == "hot", min_age=3600) == 3
+    assert sorted(os.listdir(downloads)) == ["cold_temp.mp3", "fresh.mp3", "hls", "hot.mp3", "notes.txt"]
+    assert sorted(os.listdir(downloads / "hls")) == [".cold-building", "hot"]
+
+def test_janitor_runs_without_stats(tmp_path):
+    # Файл, оставленный для слушателей веб-плеера при выключенной статистике
+    _touch(tmp_path / "kept.mp3", age=86400)
+
+    async def scenario():
+        janitor = DiskJanitor(tmp_path, interval=0.01, min_age=3600)
+        janitor.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            janitor.stop()
+
+    asyncio.run(scenario())
+    assert os.listdir(tmp_path) == []
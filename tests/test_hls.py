@@ -0,0 +1,73 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import hls
+from hls import HlsPackager
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:6.000000,
+seg_00000.m4s
+#EXTINF:2.500000,
+seg_00001.m4s
+#EXT-X-ENDLIST
+"""
+
+def _fake_ffmpeg(payload: bytes):
+    """Пишет то же, что ffmpeg -f hls: init.mp4, сегменты и плейлист рядом с ними."""
+    def run(args, **kwargs):
+        playlist = Path(args[-1])
+        (playlist.parent / "init.mp4").write_bytes(b"init")
+        (playlist.parent / "seg_00000.m4s").write_bytes(payload)
+        (playlist.parent / "seg_00001.m4s").write_bytes(payload[::-1])
+        playlist.write_text(PLAYLIST)
+        return SimpleNamespace(returncode=0, stderr="")
+    return run
+
+def _package(monkeypatch, root: Path, payload: bytes) -> str:
+    monkeypatch.setattr(hls.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(hls.subprocess, "run", _fake_ffmpeg(payload))
+    packager = HlsPackager(root)
+    assert packager._package(root / "src.mp3", "abc")
+    lines = (root / "abc" / "index.m3u8").read_text().splitlines()
+    version = lines[4].split('"')[1].split("/")[0]
+    assert lines[4] == f'#EXT-X-MAP:URI="{version}/init.mp4"'
+    assert lines[6] == f"{version}/seg_00000.m4s" and lines[8] == f"{version}/seg_00001.m4s"
+    return version
+
+def test_segments_are_published_under_content_version(tmp_path, monkeypatch):
+    version = _package(monkeypatch, tmp_path, b"audio-1")
+    packager = HlsPackager(tmp_path)
+    assert packager.file("abc", "seg_00001.m4s", version).read_bytes() == b"1-oidua"
+    assert packager.file("abc", "init.mp4", version).exists()
+    # Перенарезка с другим содержимым — другой URL сегментов, старая версия удалена
+    other = _package(monkeypatch, tmp_path, b"audio-2")
+    assert other != version
+    assert not (tmp_path / "abc" / version).exists()
+    # То же содержимое — та же версия
+    assert _package(monkeypatch, tmp_path, b"audio-2") == other
+
+def test_file_names_are_validated(tmp_path):
+    packager = HlsPackager(tmp_path)
+    assert packager.file("abc", "index.m3u8") == tmp_path / "abc" / "index.m3u8"
+    assert packager.file("abc", "seg_00000.m4s") is None
+    assert packager.file("abc", "index.m3u8", "0123456789ab") is None
+    assert packager.file("abc", "seg_00000.m4s", "0123456789ab") == tmp_path / "abc" / "0123456789ab" / "seg_00000.m4s"
+    assert packager.file("abc", "seg_00000.m4s", "..") is None
+    assert packager.file("abc", "seg_00000.m4s", "0123456789AB") is None
+    assert packager.file("../x", "index.m3u8") is None
+
+def test_unversioned_packages_are_dropped_on_start(tmp_path):
+    legacy = tmp_path / "old"
+    legacy.mkdir()
+    (legacy / "index.m3u8").write_text(PLAYLIST)
+    (legacy / "init.mp4").write_bytes(b"init")
+    current = tmp_path / "new" / "0123456789ab"
+    current.mkdir(parents=True)
+    (current / "init.mp4").write_bytes(b"init")
+    HlsPackager(tmp_path)
+    assert not legacy.exists()
+    assert current.exists()
@@ -0,0 +1,77 @@
+import asyncio
+
+from intent_batcher import IntentBatcher
+
+class _Manager:
+    def __init__(self, short: bool = False):
+        self.calls = []
+        self._short = short
+
+    async def analyze_message(self, text, mode):
+        self.calls.append(("one", mode, [text]))
+        return {"text": text}
+
+    async def analyze_batch(self, texts, mode):
+        self.calls.append(("batch", mode, list(texts)))
+        results = [{"text": t} for t in texts]
+        return results[:-1] if self._short else results
+
+def test_messages_in_window_share_one_request():
+    async def scenario():
+        manager = _Manager()
+        batcher = IntentBatcher(manager, window_ms=20)
+        results = await asyncio.gather(*(batcher.analyze(f"m{i}") for i in range(3)))
+        assert [r["text"] for r in results] == ["m0", "m1", "m2"]
+        assert manager.calls == [("batch", "default", ["m0", "m1", "m2"])]
+
+    asyncio.run(scenario())
+
+def test_full_batch_flushes_without_waiting_and_modes_are_separate():
+    async def scenario():
+        manager = _Manager()
+        batcher = IntentBatcher(manager, window_ms=10_000, max_size=2)
+        results = await asyncio.wait_for(asyncio.gather(
+            batcher.analyze("a", "dj"), batcher.analyze("b", "grumpy"), batcher.analyze("c", "dj"),
+            batcher.analyze("d", "grumpy"),
+        ), timeout=1)
+        assert [r["text"] for r in results] == ["a", "b", "c", "d"]
+        assert sorted(manager.calls) == [("batch", "dj", ["a", "c"]), ("batch", "grumpy", ["b", "d"])]
+
+    asyncio.run(scenario())
+
+def test_single_message_uses_plain_request():
+    async def scenario():
+        manager = _Manager()
+        assert await IntentBatcher(manager, window_ms=0).analyze("hi") == {"text": "hi"}
+        assert manager.calls == [("one", "default", ["hi"])]
+
+    asyncio.run(scenario())
+
+def test_short_batch_answer_fails_every_caller():
+    async def scenario():
+        batcher = IntentBatcher(_Manager(short=True), window_ms=10)
+        results = await asyncio.wait_for(asyncio.gather(
+            batcher.analyze("a"), batcher.analyze("b"), return_exceptions=True
+        ), timeout=1)
+        assert all(isinstance(r, ValueError) for r in results)
+
+    asyncio.run(scenario())
+
+def test_running_batch_is_referenced_until_done():
+    async def scenario():
+        release = asyncio.Event()
+
+        class _Slow(_Manager):
+            async def analyze_batch(self, texts, mode):
+                await release.wait()
+                return await super().analyze_batch(texts, mode)
+
+        batcher = IntentBatcher(_Slow(), window_ms=10_000, max_size=2)
+        pending = asyncio.gather(batcher.analyze("a"), batcher.analyze("b"))
+        await asyncio.sleep(0.01)
+        assert len(batcher._tasks) == 1
+        release.set()
+        await pending
+        assert not batcher._tasks
+
+    asyncio.run(scenario())
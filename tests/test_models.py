@@ -0,0 +1,52 @@
+import pickle
+import sys
+
+import models
+from models import TrackInfo, TrackRegistry
+
+class _LegacyTrackInfo:
+    """TrackInfo до перехода на slots: pickle сохранял __dict__."""
+    __module__ = "models"
+    __qualname__ = "TrackInfo"
+
+def _legacy_pickle(monkeypatch, **state) -> bytes:
+    # Дамп под именем models.TrackInfo — как записи, лежащие в кэше с прошлых версий
+    monkeypatch.setattr(models, "TrackInfo", _LegacyTrackInfo)
+    obj = _LegacyTrackInfo()
+    obj.__dict__.update(state)
+    data = pickle.dumps(obj)
+    monkeypatch.undo()
+    return data
+
+def test_pickle_roundtrip():
+    track = TrackInfo(identifier="abc", title="Song", duration=200, uploader="Artist", source="ytmusic")
+    restored = pickle.loads(pickle.dumps(track))
+    assert restored == track and not hasattr(restored, "__dict__")
+
+def test_loads_old_dict_state_with_defaults(monkeypatch):
+    data = _legacy_pickle(monkeypatch, identifier="abc", title="Song", duration=200, uploader="Artist",
+                          thumbnail_url=None, source="youtube")
+    restored = pickle.loads(data)
+    assert isinstance(restored, TrackInfo)
+    assert (restored.identifier, restored.title, restored.duration, restored.uploader) == ("abc", "Song", 200, "Artist")
+    # Полей album/url в старых записях не было — берутся значения по умолчанию
+    assert restored.album is None and restored.url is None
+
+def test_unpickled_strings_are_interned():
+    identifier = "".join(["id", "-", "42"])
+    restored = pickle.loads(pickle.dumps(TrackInfo(identifier=identifier, title="t", duration=1)))
+    assert restored.identifier is sys.intern("id-42")
+
+def test_registry_returns_canonical_track_while_alive():
+    registry = TrackRegistry()
+    first = registry.intern(TrackInfo(identifier="a", title="t", duration=1))
+    assert registry.intern(TrackInfo(identifier="a", title="other", duration=2)) is first
+    assert registry.get("a") is first and len(registry) == 1
+    del first
+    assert registry.get("a") is None and len(registry) == 0
+
+def test_registry_sweeps_dead_references():
+    registry = TrackRegistry()
+    for i in range(5000):
+        registry.add(TrackInfo(identifier=f"t{i}", title="t", duration=1))
+    assert len(registry._refs) < 5000
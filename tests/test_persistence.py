@@ -0,0 +1,101 @@
+import asyncio
+import pickle
+
+from persistence import CachePersistence
+
+async def _rows(persistence):
+    db = await persistence._connection()
+    cursor = await db.execute("SELECT chat_id, data FROM chat_data ORDER BY chat_id")
+    return {chat_id: pickle.loads(data) for chat_id, data in await cursor.fetchall()}
+
+def test_chat_data_loaded_lazily(tmp_path):
+    async def scenario():
+        first = CachePersistence(tmp_path / "cache.db", write_delay=0)
+        await first.update_chat_data(1, {"persona": "dj"})
+        await first.flush()
+
+        second = CachePersistence(tmp_path / "cache.db")
+        try:
+            assert await second.get_chat_data() == {}
+            chat_data = {}
+            await second.refresh_chat_data(1, chat_data)
+            assert chat_data == {"persona": "dj"}
+            # Повторный refresh в БД не ходит и локальные правки не трогает
+            chat_data["persona"] = "calm"
+            await second.refresh_chat_data(1, chat_data)
+            assert chat_data == {"persona": "calm"}
+        finally:
+            await second.flush()
+
+    asyncio.run(scenario())
+
+def test_unchanged_chat_data_is_not_written(tmp_path):
+    async def scenario():
+        persistence = CachePersistence(tmp_path / "cache.db", write_delay=0)
+        try:
+            await persistence.update_chat_data(1, {"persona": "dj"})
+            await persistence._write_dirty()
+            await persistence.update_chat_data(1, {"persona": "dj"})
+            assert persistence._dirty == {}
+            await persistence.update_chat_data(1, {"persona": "calm"})
+            assert 1 in persistence._dirty
+        finally:
+            await persistence.flush()
+
+    asyncio.run(scenario())
+
+def test_failed_write_is_retried_without_losing_newer_data(tmp_path):
+    async def scenario():
+        persistence = CachePersistence(tmp_path / "cache.db", write_delay=0)
+        connection = persistence._connection
+
+        async def broken():
+            raise OSError("disk I/O error")
+
+        try:
+            persistence._connection = broken
+            await persistence.update_chat_data(1, {"v": 1})
+            await persistence.update_chat_data(2, {"v": 1})
+            await persistence._write_dirty()
+            assert set(persistence._dirty) == {1, 2}
+            # Пока запись не прошла, чат 1 изменился — в БД должна попасть новая версия
+            await persistence.update_chat_data(1, {"v": 2})
+            persistence._connection = connection
+            await persistence._write_dirty()
+            assert await _rows(persistence) == {1: {"v": 2}, 2: {"v": 1}}
+        finally:
+            persistence._connection = connection
+            await persistence.flush()
+
+    asyncio.run(scenario())
+
+def test_chat_returning_from_another_worker_is_reloaded(tmp_path):
+    async def scenario():
+        here = CachePersistence(tmp_path / "cache.db", write_delay=0)
+        there = CachePersistence(tmp_path / "cache.db", write_delay=0)
+        try:
+            chat_data = {}
+            await here.refresh_chat_data(1, chat_data)
+            chat_data.update(persona="dj", stale_key=True)
+            await here.update_chat_data(1, chat_data)
+            await here._write_dirty()
+
+            # Чат переехал: другой воркер меняет данные
+            moved = {}
+            await there.refresh_chat_data(1, moved)
+            moved.pop("stale_key")
+            moved["persona"] = "calm"
+            await there.update_chat_data(1, moved)
+            await there._write_dirty()
+
+            # Вернулся: без invalidate старая копия перезаписала бы строку
+            here.invalidate(1)
+            await here.refresh_chat_data(1, chat_data)
+            assert chat_data == {"persona": "calm"}
+            await here.update_chat_data(1, chat_data)
+            assert here._dirty == {}
+        finally:
+            await here.flush()
+            await there.flush()
+
+    asyncio.run(scenario())
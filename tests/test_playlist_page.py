@@ -0,0 +1,63 @@
+import pytest
+
+import playlist_page
+from models import TrackInfo
+
+def _tracks(n: int):
+    return [TrackInfo(identifier=f"id{i}", title=f"Song {i}", duration=100 + i, uploader="Artist") for i in range(n)]
+
+def test_cursor_walks_the_whole_snapshot():
+    tracks = _tracks(7)
+    snapshot = playlist_page.snapshot_etag(tracks)
+    selected = playlist_page.select_fields(None)
+    seen, cursor = [], None
+    while True:
+        cursor_snapshot, offset = playlist_page.parse_cursor(cursor)
+        assert cursor_snapshot in (None, snapshot)
+        page = playlist_page.render_page(tracks, snapshot, offset, 3, selected)
+        seen += [t["identifier"] for t in page["playlist"]]
+        cursor = page["next_cursor"]
+        if cursor is None: break
+    assert seen == [t.identifier for t in tracks]
+
+def test_last_full_page_has_no_next_cursor():
+    page = playlist_page.render_page(_tracks(6), "s", 3, 3, playlist_page.PLAYLIST_FIELDS)
+    assert len(page["playlist"]) == 3 and page["next_cursor"] is None
+
+def test_cursor_carries_snapshot():
+    assert playlist_page.parse_cursor(None) == (None, 0)
+    assert playlist_page.parse_cursor(playlist_page.make_cursor("abc", 40)) == ("abc", 40)
+    assert playlist_page.parse_cursor("abc.-5") == ("abc", 0)
+
+@pytest.mark.parametrize("cursor", ["abc", "20", ".20", "abc.x"])
+def test_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        playlist_page.parse_cursor(cursor)
+
+def test_fields_keep_identifier_and_canonical_order():
+    selected = playlist_page.select_fields("duration, title,bogus")
+    assert selected == ["identifier", "title", "duration"]
+    page = playlist_page.render_page(_tracks(1), "s", 0, 1, selected)
+    assert page["playlist"] == [{"identifier": "id0", "title": "Song 0", "duration": 100}]
+
+def test_page_etag_depends_on_snapshot_and_page():
+    snapshot = playlist_page.snapshot_etag(_tracks(5))
+    assert snapshot == playlist_page.snapshot_etag(_tracks(5))
+    assert snapshot != playlist_page.snapshot_etag(_tracks(5)[::-1])
+    fields = playlist_page.select_fields(None)
+    etag = playlist_page.page_etag(snapshot, 0, 20, fields)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag != playlist_page.page_etag(snapshot, 20, 20, fields)
+    assert etag != playlist_page.page_etag(snapshot, 0, 20, ["identifier"])
+
+def test_if_none_match():
+    etag = playlist_page.page_etag("abc", 0, 20, ["identifier"])
+    assert playlist_page.etag_matches(etag, etag)
+    assert playlist_page.etag_matches(f'"other", W/{etag}', etag)
+    assert playlist_page.etag_matches("*", etag)
+    assert not playlist_page.etag_matches('"other"', etag)
+    assert not playlist_page.etag_matches(None, etag)
+
+def test_normalize_query():
+    assert playlist_page.normalize_query("  Daft   PUNK ") == "daft punk"
+    assert playlist_page.normalize_query("   ") == ""
@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import prewarm
+from models import DownloadResult, TrackInfo
+from prewarm import Prewarmer
+
+class _Downloader:
+    def __init__(self, results, fail=()):
+        self.results = results
+        self.fail = set(fail)
+        self.searches = []
+        self.downloads = []
+        self.scheduler = SimpleNamespace(downloads=SimpleNamespace(waiting=0, active=0, limit=4))
+
+    async def search(self, query, limit=10, **kwargs):
+        self.searches.append(query)
+        return list(self.results.get(query, []))
+
+    async def get_file_id(self, video_id):
+        return None
+
+    async def download(self, video_id, track_info=None, **kwargs):
+        self.downloads.append(video_id)
+        return DownloadResult(success=video_id not in self.fail)
+
+def _tracks(prefix, n):
+    return [TrackInfo(identifier=f"{prefix}{i}", title="t", duration=200, uploader="a") for i in range(n)]
+
+class _Stats:
+    def __init__(self, genres):
+        self.genres = genres
+
+    def top_genres(self, limit):
+        return self.genres[:limit]
+
+def test_popular_prefers_stats_then_recent_plays():
+    warmer = Prewarmer(_Downloader({}), ["rock", "jazz", "pop", "lofi"], genres=3, stats=_Stats(["pop", "unknown"]))
+    warmer.record_play("lofi")
+    assert warmer.popular() == ["pop", "lofi", "rock"]
+
+def test_tick_fills_pool_and_take_empties_it():
+    downloader = _Downloader({"rock": _tracks("r", 5)})
+    warmer = Prewarmer(downloader, ["rock"], genres=1, pool_size=2)
+    asyncio.run(warmer._tick())
+    pool = warmer.take("rock")
+    assert len(pool) == 2 and len(downloader.downloads) == 2
+    assert warmer.take("rock") == []
+
+def test_busy_scheduler_is_not_a_failure():
+    downloader = _Downloader({"rock": _tracks("r", 5)})
+    downloader.scheduler.downloads.waiting = 1
+    warmer = Prewarmer(downloader, ["rock"], genres=1)
+    asyncio.run(warmer._tick())
+    assert downloader.searches == [] and not warmer._failures
+
+def test_failing_wave_backs_off(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prewarm.time, "monotonic", lambda: now[0])
+    downloader = _Downloader({"rock": _tracks("r", 2)}, fail={"r0", "r1"})
+    warmer = Prewarmer(downloader, ["rock", "empty"], genres=2, interval=30)
+
+    async def ticks(n, step):
+        for _ in range(n):
+            await warmer._tick()
+            now[0] += step
+
+    asyncio.run(ticks(1, 30))
+    assert downloader.searches == ["rock", "empty"]
+    # Следующие циклы до истечения паузы (2 интервала) волны не трогают
+    asyncio.run(ticks(1, 30))
+    assert len(downloader.searches) == 2
+    asyncio.run(ticks(1, 0))
+    assert len(downloader.searches) == 4
+    assert warmer._failures["rock"] == 2
+    # Пауза растет, но не больше 2**MAX_BACKOFF_STEPS интервалов
+    for _ in range(10):
+        warmer._failures["rock"] += 1
+    downloader.fail.clear()
+    now[0] += 30 * 2 ** prewarm.MAX_BACKOFF_STEPS
+    asyncio.run(ticks(1, 0))
+    assert len(warmer.take("rock")) == 2
+    assert "rock" not in warmer._failures and "rock" not in warmer._retry_at
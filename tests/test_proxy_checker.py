@@ -0,0 +1,66 @@
+import asyncio
+
+from proxy_checker import ProxyCheckResult, ProxyChecker, load_failures, parse_endpoint, read_lines
+
+class _ScriptedChecker(ProxyChecker):
+    """Пробы без сети: ответ каждого прокси задан заранее."""
+
+    def __init__(self, alive, **kwargs):
+        super().__init__(**kwargs)
+        self.alive = alive
+
+    def probe_for(self, url):
+        async def _probe(u):
+            return ProxyCheckResult(u, u in self.alive, latency=0.1 if u in self.alive else 0.0)
+        return _probe
+
+def _run_in_place(checker, path):
+    # Как check_project_lists без proxies.txt: источник и target — один файл
+    return asyncio.run(checker.check_file(path, path))
+
+def test_failed_proxy_leaves_working_list_but_is_rechecked(tmp_path):
+    path = tmp_path / "working_proxies.txt"
+    path.write_text("http://a:1\nhttp://b:2\n")
+    checker = _ScriptedChecker({"http://a:1"}, max_failures=3)
+    _run_in_place(checker, path)
+    # ProxyManager читает только рабочие
+    assert read_lines(path) == ["http://a:1"]
+    assert load_failures(path) == {"http://b:2": 1}
+    checker.alive.add("http://b:2")
+    _run_in_place(checker, path)
+    assert sorted(read_lines(path)) == ["http://a:1", "http://b:2"]
+    assert load_failures(path) == {}
+
+def test_proxy_dropped_after_consecutive_failures(tmp_path):
+    path = tmp_path / "working_proxies.txt"
+    path.write_text("http://a:1\nhttp://b:2\n")
+    checker = _ScriptedChecker({"http://a:1"}, max_failures=3)
+    for expected in (1, 2, 3):
+        _run_in_place(checker, path)
+        assert load_failures(path) == {"http://b:2": expected}
+    # Выброшен: больше не перепроверяется, и даже ожив, в список не вернется сам
+    checker.alive.add("http://b:2")
+    _run_in_place(checker, path)
+    assert read_lines(path) == ["http://a:1"]
+    assert load_failures(path) == {}
+
+def test_dead_proxy_from_separate_source_keeps_counting(tmp_path):
+    source, target = tmp_path / "proxies.txt", tmp_path / "working_proxies.txt"
+    source.write_text("http://a:1\nhttp://b:2\n")
+    checker = _ScriptedChecker({"http://a:1"}, max_failures=2)
+    for _ in range(4):
+        asyncio.run(checker.check_file(source, target))
+        assert read_lines(target) == ["http://a:1"]
+    # Надгробие: счет не начинается заново с единицы
+    assert load_failures(target) == {"http://b:2": 4}
+
+def test_separate_source_is_never_rewritten(tmp_path):
+    source, target = tmp_path / "proxies.txt", tmp_path / "working_proxies.txt"
+    source.write_text("http://a:1\nhttp://b:2\n")
+    asyncio.run(_ScriptedChecker(set(), max_failures=1).check_file(source, target))
+    assert read_lines(source) == ["http://a:1", "http://b:2"]
+    assert read_lines(target) == []
+
+def test_parse_endpoint():
+    assert parse_endpoint("vless://uuid@example.com:443?security=tls#name") == ("example.com", 443)
+    assert parse_endpoint("not a proxy") is None
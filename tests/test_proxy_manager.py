@@ -0,0 +1,44 @@
+import time
+
+from proxy_manager import ProxyManager, ProxyStats
+
+def _manager(tmp_path, urls, cooldown=120):
+    (tmp_path / "working_proxies.txt").write_text("\n".join(urls) + "\n")
+    return ProxyManager(tmp_path, cooldown=cooldown)
+
+def test_score_prefers_reliable_fast_proxy():
+    assert ProxyStats("a", success_rate=1.0, latency=0.2).score > ProxyStats("b", success_rate=1.0, latency=2.0).score
+    assert ProxyStats("a", success_rate=0.9, latency=1.0).score > ProxyStats("b", success_rate=0.3, latency=1.0).score
+
+def test_failure_quarantines_with_growing_cooldown(tmp_path):
+    manager = _manager(tmp_path, ["http://a:1", "http://b:2"], cooldown=10)
+    manager.report_failure("http://a:1")
+    first = manager._stats["http://a:1"].quarantined_until - time.monotonic()
+    manager.report_failure("http://a:1")
+    second = manager._stats["http://a:1"].quarantined_until - time.monotonic()
+    assert 9 < first <= 10 and 19 < second <= 20
+    assert manager.available_count == 1
+    assert all(manager.get_proxy() == "http://b:2" for _ in range(20))
+
+def test_cooldown_is_capped(tmp_path):
+    manager = _manager(tmp_path, ["http://a:1"], cooldown=600)
+    for _ in range(10):
+        manager.report_failure("http://a:1")
+    assert manager._stats["http://a:1"].quarantined_until - time.monotonic() <= ProxyManager.MAX_COOLDOWN
+
+def test_success_readmits_and_resets(tmp_path):
+    manager = _manager(tmp_path, ["http://a:1"])
+    manager.report_failure("http://a:1")
+    assert manager.get_proxy() is None
+    manager.report_success("http://a:1", latency=0.5)
+    stats = manager._stats["http://a:1"]
+    assert stats.failures_in_row == 0 and stats.is_available(time.monotonic())
+    assert manager.get_proxy() == "http://a:1"
+
+def test_reload_keeps_known_stats(tmp_path):
+    manager = _manager(tmp_path, ["http://a:1"])
+    manager.report_failure("http://a:1")
+    (tmp_path / "working_proxies.txt").write_text("http://a:1\nhttp://c:3\n")
+    manager._load_proxies()
+    assert manager._stats["http://a:1"].failures_in_row == 1
+    assert manager._stats["http://c:3"].failures_in_row == 0
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+
+import radio
+from radio import RadioManager
+
+class _Hub:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, chat_id, event):
+        self.events.append(event["type"])
+
+def test_replacing_a_wave_does_not_announce_stop(monkeypatch):
+    async def idle_loop(self):
+        await asyncio.Event().wait()
+    monkeypatch.setattr(radio.RadioSession, "_radio_loop", idle_loop)
+
+    async def scenario():
+        hub = _Hub()
+        manager = RadioManager(bot=None, settings=SimpleNamespace(), downloader=None, broadcaster=hub)
+        await manager.start(1, "rock")
+        await manager.start(1, "jazz")
+        assert hub.events == [] and manager.is_active(1)
+        await manager.stop(1)
+        assert hub.events == ["stopped"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,24 @@
+from search_normalize import normalize_page, parse_duration
+
+def test_parse_duration_formats():
+    assert parse_duration("3:25") == 205
+    assert parse_duration("1:02:03") == 3723
+    assert parse_duration("45") == 45
+    assert parse_duration("x:y") == 0
+    assert parse_duration(None) == 0
+
+def test_normalize_page_filters_and_reuses_known_tracks():
+    items = [
+        {"videoId": "ok1", "title": "A", "artists": [{"name": "X"}, {"name": "Y"}], "duration": "3:30",
+         "thumbnails": [{"url": "small"}, {"url": "big"}]},
+        {"videoId": "short", "title": "B", "duration": "0:20"},
+        {"videoId": "long", "title": "C", "duration": "20:00"},
+        {"videoId": None, "title": "D", "duration": "3:00"},
+        {"videoId": "fallback", "title": "E", "duration": None, "length": "2:00"},
+    ]
+    page = normalize_page(items, duration_keys=("duration", "length"))
+    assert [t.identifier for t in page] == ["ok1", "fallback"]
+    first = page[0]
+    assert (first.uploader, first.duration, first.thumbnail_url, first.source) == ("X, Y", 210, "big", "ytmusic")
+    assert page[1].thumbnail_url is None and page[1].uploader == ""
+    assert normalize_page(items[:1])[0] is first
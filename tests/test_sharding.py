@@ -0,0 +1,124 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from sharding import HashRing, ShardCoordinator
+
+def _payload(update_id: int, chat_id: int = 42) -> str:
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi",
+    }})
+
+async def _coordinator(tmp_path, worker_id, submit, **kwargs):
+    coordinator = ShardCoordinator(tmp_path / "cluster.db", worker_id, **kwargs)
+    await coordinator.initialize()
+    coordinator._app = SimpleNamespace(bot=None)
+    coordinator._submit = submit
+    return coordinator
+
+async def _inbox(coordinator):
+    cursor = await coordinator._db.execute("SELECT id FROM update_inbox ORDER BY id")
+    return [row[0] for row in await cursor.fetchall()]
+
+def test_ring_is_stable_for_remaining_workers():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b"])
+    moved = [c for c in range(1000) if before.owner(c) != after.owner(c)]
+    assert moved and all(before.owner(c) == "c" for c in moved)
+
+def test_inbox_rows_kept_until_queue_accepts(tmp_path):
+    async def scenario():
+        accepted, capacity = [], [2]
+
+        def submit(update):
+            if not capacity[0]: return False
+            capacity[0] -= 1
+            accepted.append(update.update_id)
+            return True
+
+        coordinator = await _coordinator(tmp_path, "w1", submit, inbox_poll_interval=0.01)
+        for update_id in (1, 2, 3):
+            await coordinator._db.execute(
+                "INSERT INTO update_inbox (worker_id, payload, created) VALUES (?, ?, ?)", ("w1", _payload(update_id), 0)
+            )
+        await coordinator._db.commit()
+        consumer = asyncio.create_task(coordinator._consume_inbox())
+        try:
+            await asyncio.sleep(0.1)
+            assert accepted == [1, 2]
+            assert len(await _inbox(coordinator)) == 1
+
+            capacity[0] = 10
+            await asyncio.sleep(0.1)
+            assert accepted == [1, 2, 3]
+            assert await _inbox(coordinator) == []
+        finally:
+            consumer.cancel()
+            await coordinator.stop()
+
+    asyncio.run(scenario())
+
+def test_leases_move_to_new_worker_unless_pinned(tmp_path):
+    async def scenario():
+        old = await _coordinator(tmp_path, "old", None, lease_ttl=20.0)
+        new = None
+        try:
+            chats = list(range(200))
+            for chat_id in chats:
+                assert await old.owner_of(chat_id) == "old"
+            new = await _coordinator(tmp_path, "new", None, lease_ttl=20.0)
+            before = await _expires(old)
+            old._pinned = lambda chat_id: chat_id == 0
+            await asyncio.sleep(0.05)
+
+            await old._heartbeat()
+            after = await _expires(old)
+            moving = [c for c in chats if old._ring.owner(c) == "new" and c != 0]
+            assert moving
+            assert all(after[c] == before[c] for c in moving)
+            assert all(after[c] > before[c] for c in chats if c not in moving)
+
+            # Не продленная аренда истекает — чат забирает владелец по кольцу
+            await old._db.execute("UPDATE chat_leases SET expires = 0 WHERE chat_id = ?", (moving[0],))
+            await old._db.commit()
+            assert await new.owner_of(moving[0]) == "new"
+        finally:
+            if new: await new.stop()
+            await old.stop()
+
+    asyncio.run(scenario())
+
+async def _expires(coordinator):
+    cursor = await coordinator._db.execute("SELECT chat_id, expires FROM chat_leases WHERE worker_id = ?", (coordinator.worker_id,))
+    return dict(await cursor.fetchall())
+
+def test_taking_over_a_chat_notifies_on_acquire(tmp_path):
+    async def scenario():
+        old = await _coordinator(tmp_path, "old", None, lease_ttl=20.0)
+        new = await _coordinator(tmp_path, "new", None, lease_ttl=20.0)
+        acquired = {"old": [], "new": []}
+        old._on_acquire, new._on_acquire = acquired["old"].append, acquired["new"].append
+        try:
+            new._ring = old._ring = HashRing(["old"])
+            assert await old.owner_of(7) == "old"
+            # Своя просроченная аренда, которую никто не забрал, — не переезд
+            await old._db.execute("UPDATE chat_leases SET expires = 0 WHERE chat_id = 7")
+            await old._db.commit()
+            old._leases.clear()
+            assert await old.owner_of(7) == "old"
+            assert acquired == {"old": [7], "new": []}
+
+            await old._db.execute("UPDATE chat_leases SET expires = 0 WHERE chat_id = 7")
+            await old._db.commit()
+            new._ring = HashRing(["new"])
+            assert await new.owner_of(7) == "new"
+            await new._db.execute("UPDATE chat_leases SET expires = 0 WHERE chat_id = 7")
+            await new._db.commit()
+            old._leases.clear()
+            assert await old.owner_of(7) == "old"
+            assert acquired == {"old": [7, 7], "new": [7]}
+        finally:
+            await new.stop()
+            await old.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,146 @@
+import asyncio
+
+from config import Settings
+from models import DownloadResult, TrackInfo
+from spotify import SpotifyService
+
+class _Cache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+class _Downloader:
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    async def search(self, query, limit=10, **kwargs):
+        self.queries.append(query)
+        return self.results.get(query, [])
+
+def _service(downloader, cache=None):
+    return SpotifyService(Settings(BOT_TOKEN="123456:test"), downloader, cache)
+
+def _spotify_track(track_id="sp1", name="Numb", artist="Linkin Park", duration=187):
+    return {"id": track_id, "name": name, "artists": [{"name": artist}], "duration_ms": duration * 1000}
+
+def _yt(identifier, title, uploader, duration):
+    return TrackInfo(identifier=identifier, title=title, uploader=uploader, duration=duration)
+
+def test_confident_match_is_cached():
+    async def scenario():
+        cache = _Cache()
+        downloader = _Downloader({"Linkin Park - Numb": [_yt("cover", "Numb", "Choir", 240), _yt("orig", "Numb", "Linkin Park", 186)]})
+        service = _service(downloader, cache)
+        assert await service._match_video_id(_spotify_track()) == "orig"
+        assert cache.data["spotify:sp1"]["identifier"] == "orig"
+        # Повтор — из кэша, без поиска
+        assert await service._match_video_id(_spotify_track()) == "orig"
+        assert len(downloader.queries) == 1
+
+    asyncio.run(scenario())
+
+def test_no_confident_match_falls_back_to_first_result_uncached():
+    async def scenario():
+        cache = _Cache()
+        downloader = _Downloader({"Linkin Park - Numb": [_yt("first", "Something Else", "Someone", 500)]})
+        service = _service(downloader, cache)
+        assert await service._match_video_id(_spotify_track()) == "first"
+        assert "spotify:sp1" not in cache.data
+        assert await _service(_Downloader({}), cache)._match_video_id(_spotify_track()) is None
+
+    asyncio.run(scenario())
+
+def test_cached_miss_from_older_version_is_searched_again():
+    async def scenario():
+        cache = _Cache()
+        cache.data["spotify:sp1"] = {"identifier": None, "score": 0.0}
+        downloader = _Downloader({"Linkin Park - Numb": [_yt("orig", "Numb", "Linkin Park", 186)]})
+        assert await _service(downloader, cache)._match_video_id(_spotify_track()) == "orig"
+
+    asyncio.run(scenario())
+
+class _CollectionService(SpotifyService):
+    """Плейлист без Spotify API: треки заданы списком, загрузка — подставная."""
+
+    def __init__(self, tracks, download, concurrency=2, fail_after=None):
+        super().__init__(Settings(BOT_TOKEN="123456:test", SPOTIFY_MATCH_CONCURRENCY=concurrency), _Downloader({}))
+        self._sp_client = object()
+        self._tracks = tracks
+        self._fail_after = fail_after
+        self._download = download
+
+    async def _iter_collection(self, kind, collection_id):
+        for i, track in enumerate(self._tracks):
+            if self._fail_after is not None and i == self._fail_after:
+                raise RuntimeError("spotify down")
+            yield track, None
+
+    async def _download_spotify_track(self, spotify_track, album=None):
+        return await self._download(spotify_track)
+
+PLAYLIST_URL = "https://open.spotify.com/playlist/abc"
+
+def _collect(service, limit=None):
+    async def scenario():
+        out = []
+        async for result in service.stream_from_url(PLAYLIST_URL):
+            out.append(result)
+            if limit and len(out) >= limit: break
+        return out
+    return asyncio.run(scenario())
+
+def test_collection_results_arrive_as_ready_within_concurrency():
+    running, peak = 0, 0
+
+    async def download(track):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Первый трек самый медленный — его результат придет последним
+        await asyncio.sleep(0.05 if track["id"] == "t0" else 0.01)
+        running -= 1
+        return DownloadResult(success=True, track_info=_yt(track["id"], "t", "a", 1))
+
+    tracks = [_spotify_track(f"t{i}") for i in range(5)]
+    results = _collect(_CollectionService(tracks, download, concurrency=2))
+    assert all(r.success for r in results), [r.error_message for r in results]
+    ids = [r.track_info.identifier for r in results]
+    assert sorted(ids) == [f"t{i}" for i in range(5)]
+    assert ids[0] != "t0"
+    assert peak == 2
+
+def test_failed_track_and_unreadable_collection_become_failed_results():
+    async def download(track):
+        if track["id"] == "bad": raise ValueError("boom")
+        return DownloadResult(success=True)
+
+    tracks = [_spotify_track("ok"), _spotify_track("bad"), _spotify_track("later")]
+    results = _collect(_CollectionService(tracks, download, fail_after=2))
+    assert sorted(r.success for r in results) == [False, False, True]
+    assert any(r.error_message == "boom" for r in results)
+    assert any(r.error_message == "Could not read Spotify playlist." for r in results)
+
+def test_downloads_wait_for_slow_consumer():
+    started = []
+
+    async def download(track):
+        started.append(track["id"])
+        return DownloadResult(success=True)
+
+    async def scenario():
+        service = _CollectionService([_spotify_track(f"t{i}") for i in range(50)], download, concurrency=2)
+        stream = service.stream_from_url(PLAYLIST_URL)
+        await stream.__anext__()
+        # Потребитель «отправляет» первый трек: загрузки не должны уйти вперед на весь плейлист
+        await asyncio.sleep(0.05)
+        count = len(started)
+        await stream.aclose()
+        return count
+
+    assert asyncio.run(scenario()) <= 6
@@ -0,0 +1,61 @@
+import asyncio
+
+from stats_store import StatsStore
+
+def _store_with_plays(tmp_path, plays):
+    async def scenario():
+        store = StatsStore(tmp_path / "cache.db", admit_score=1.5)
+        await store.initialize()
+        for track_id, count in plays.items():
+            for _ in range(count):
+                store.record(track_id, "ok", latency=0.5, genre="rock")
+        store.record("broken", "failed")
+        await store.rollup()
+        await store.stop()
+        return store
+    return asyncio.run(scenario())
+
+def test_admits_only_tracks_played_enough(tmp_path):
+    store = _store_with_plays(tmp_path, {"hot": 3, "once": 1})
+    assert store.should_admit("hot")
+    assert not store.should_admit("once")
+    assert not store.should_admit("broken")
+    assert store.meta_ttl("hot") > store.meta_ttl("once", default=60) == 60
+    assert store.top_genres(5) == ["rock"]
+
+def test_hot_set_survives_restart(tmp_path):
+    _store_with_plays(tmp_path, {"hot": 3})
+
+    async def reopen():
+        store = StatsStore(tmp_path / "cache.db", admit_score=1.5)
+        await store.initialize()
+        await store.stop()
+        return store
+    assert asyncio.run(reopen()).should_admit("hot")
+
+def test_events_flushed_during_rollup_are_counted_once(tmp_path):
+    async def scenario():
+        store = StatsStore(tmp_path / "cache.db")
+        await store.initialize()
+        try:
+            for _ in range(3):
+                store.record("a", "ok", genre="rock")
+
+            async def late_plays():
+                for _ in range(5):
+                    await asyncio.sleep(0)
+                    store.record("a", "ok", genre="rock")
+                    await store.flush()
+
+            await asyncio.gather(store.rollup(), late_plays())
+            await store.rollup()
+            await store.rollup()
+            cursor = await store._db.execute("SELECT plays FROM track_popularity WHERE track_id = 'a'")
+            track_plays = (await cursor.fetchone())[0]
+            cursor = await store._db.execute("SELECT plays FROM genre_popularity WHERE genre = 'rock'")
+            genre_plays = (await cursor.fetchone())[0]
+            assert track_plays == genre_plays == 8
+        finally:
+            await store.stop()
+
+    asyncio.run(scenario())
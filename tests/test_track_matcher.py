@@ -0,0 +1,69 @@
+import pytest
+
+from models import TrackInfo
+from track_matcher import SpotifyTrackRef, best_match, duration_score, normalize
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Bohemian Rhapsody - Remastered 2011", "bohemian rhapsody"),
+    ("Bohemian Rhapsody - 2011 Remaster", "bohemian rhapsody"),
+    ("Hey Jude (Remastered 2015)", "hey jude"),
+    ("Song - Radio Edit", "song"),
+    ("Song - Extended Mix", "song"),
+    ("Numb [Official Video]", "numb"),
+    ("Stay (feat. Justin Bieber)", "stay"),
+    ("Stay feat. Justin Bieber", "stay"),
+    ("Кино", "kino"),
+    ("Хочу перемен!", "hochu peremen"),
+    ("  AC/DC  ", "ac dc"),
+    ("Mix Tape", "mix tape"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize(raw, expected):
+    assert normalize(raw) == expected
+
+@pytest.mark.parametrize("expected, actual, score", [
+    (200, 200, 1.0),
+    (200, 203, 1.0),
+    (200, 197, 1.0),
+    (200, 230, 0.0),
+    (200, 260, 0.0),
+    (0, 200, 0.5),
+    (200, 0, 0.5),
+])
+def test_duration_score(expected, actual, score):
+    assert duration_score(expected, actual) == pytest.approx(score)
+
+def test_duration_score_decreases_with_difference():
+    assert 1.0 > duration_score(200, 210) > duration_score(200, 220) > 0.0
+
+def _candidate(identifier, title, uploader, duration):
+    return TrackInfo(identifier=identifier, title=title, uploader=uploader, duration=duration)
+
+REF = SpotifyTrackRef(title="Bohemian Rhapsody - Remastered 2011", artists=["Queen"], duration=354)
+
+def test_best_match_prefers_matching_recording():
+    candidates = [
+        _candidate("live", "Bohemian Rhapsody (Live Aid)", "Queen", 420),
+        _candidate("cover", "Bohemian Rhapsody", "Pentatonix", 350),
+        _candidate("orig", "Bohemian Rhapsody", "Queen", 355),
+    ]
+    match = best_match(REF, candidates)
+    assert match and match[0].identifier == "orig"
+
+def test_best_match_isrc_hit_wins():
+    # Сборник с другим "исполнителем" без ISRC не прошел бы порог
+    candidates = [_candidate("a", "Bohemian Rhapsody", "Queen", 364),
+                  _candidate("b", "Bohemian Rhapsody (Remastered)", "Various Artists", 354)]
+    assert best_match(REF, candidates)[0].identifier == "a"
+    match = best_match(REF, candidates, {"b"})
+    assert match and match[0].identifier == "b"
+
+@pytest.mark.parametrize("candidates", [
+    [],
+    [_candidate("other", "Don't Stop Me Now", "Queen", 209)],
+    # Та же песня, но другая длительность — другая запись
+    [_candidate("long", "Bohemian Rhapsody", "Queen", 600)],
+])
+def test_best_match_miss(candidates):
+    assert best_match(REF, candidates) is None
@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+from update_queue import UpdateQueue
+
+class _App:
+    def __init__(self):
+        self.processed = []
+
+    async def process_update(self, update):
+        self.processed.append(update.update_id)
+
+def _update(update_id: int, chat_id: int = 1):
+    chat = SimpleNamespace(id=chat_id)
+    return SimpleNamespace(update_id=update_id, effective_chat=chat, effective_user=None)
+
+def test_duplicate_update_ids_are_dropped():
+    async def scenario():
+        app = _App()
+        queue = UpdateQueue(app, workers=2, maxsize=10)
+        assert queue.submit(_update(1)) and queue.submit(_update(1)) and queue.submit(_update(2))
+        queue.start()
+        await queue.stop()
+        assert app.processed == [1, 2]
+
+    asyncio.run(scenario())
+
+def test_full_queue_rejects_and_forgets_update_id():
+    async def scenario():
+        app = _App()
+        queue = UpdateQueue(app, workers=1, maxsize=2)
+        assert queue.submit(_update(1)) and queue.submit(_update(2, chat_id=2))
+        assert queue.submit(_update(3)) is False
+        # Повтор от Telegram после отказа — не дубль
+        queue.start()
+        await queue.stop()
+        assert queue.submit(_update(3)) is True
+        assert app.processed == [1, 2]
+
+    asyncio.run(scenario())
+
+def test_order_kept_within_chat():
+    async def scenario():
+        app = _App()
+        queue = UpdateQueue(app, workers=4, maxsize=100)
+        for update_id in range(20):
+            queue.submit(_update(update_id, chat_id=7))
+        queue.start()
+        await queue.stop()
+        assert app.processed == list(range(20))
+
+    asyncio.run(scenario())
+
+def test_dedup_window_is_bounded():
+    queue = UpdateQueue(_App(), workers=1, maxsize=100, dedup_size=3)
+    for update_id in range(5):
+        queue._is_duplicate(update_id)
+    assert list(queue._seen) == [2, 3, 4]
+    assert not queue._is_duplicate(0)
+
+def test_slow_chat_does_not_block_other_chats():
+    async def scenario():
+        release = asyncio.Event()
+        processed = []
+
+        class _SlowApp:
+            async def process_update(self, update):
+                if update.update_id == 1:
+                    await release.wait()
+                processed.append(update.update_id)
+
+        # Чаты 1 и 3 при двух воркерах попали бы в один шард
+        queue = UpdateQueue(_SlowApp(), workers=2, maxsize=100)
+        queue.submit(_update(1, chat_id=1))
+        queue.submit(_update(2, chat_id=1))
+        for update_id in (3, 4, 5):
+            queue.submit(_update(update_id, chat_id=3))
+        queue.start()
+        await asyncio.sleep(0.05)
+        # Второй апдейт медленного чата ждет первого, другой чат обработан целиком
+        assert processed == [3, 4, 5]
+        release.set()
+        await queue.stop()
+        assert processed == [3, 4, 5, 1, 2]
+        assert queue._pending == {} and queue._size == 0
+
+    asyncio.run(scenario())
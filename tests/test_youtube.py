@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import youtube
+from concurrency import Priority
+from config import Settings
+from models import DownloadResult, TrackInfo
+
+class _YTMusic:
+    def __init__(self, *args, **kwargs): pass
+
+def _downloader(tmp_path, monkeypatch):
+    monkeypatch.setattr(youtube, "YTMusic", _YTMusic)
+    settings = Settings(BOT_TOKEN="123456:test", DOWNLOADS_DIR=tmp_path, CACHE_DB_PATH=tmp_path / "cache.db",
+                        MAX_CONCURRENT_DOWNLOADS=1, MAX_CONCURRENT_DOWNLOADS_CEILING=1)
+    return youtube.YouTubeDownloader(settings, None)
+
+def _track(video_id):
+    return TrackInfo(identifier=video_id, title=video_id, duration=200, uploader="Artist")
+
+def test_stream_joining_prefetch_download_is_escalated(tmp_path, monkeypatch):
+    async def scenario():
+        downloader = _downloader(tmp_path, monkeypatch)
+        order = []
+
+        async def fake_download(query, target_path, track_info):
+            order.append(track_info.identifier)
+            await asyncio.sleep(0.01)
+            return DownloadResult(success=False, error_message="test")
+
+        downloader._download_sc_only = fake_download
+        # Слот занят; в очереди — радио «сейчас» и подкачка трека, который потом запросит плеер
+        await downloader.scheduler.downloads.acquire()
+        radio = asyncio.create_task(downloader.download("now", _track("now"), priority=Priority.RADIO_NOW, chat_id=1))
+        prefetch = asyncio.create_task(downloader.download("next", _track("next"), priority=Priority.RADIO_PREFETCH, chat_id=2))
+        await asyncio.sleep(0.01)
+        stream = asyncio.create_task(downloader.download("next", _track("next")))
+        await asyncio.sleep(0.01)
+        downloader.scheduler.downloads.release()
+        await asyncio.gather(radio, prefetch, stream)
+        assert order == ["next", "now"]
+
+    asyncio.run(scenario())
+
+def test_join_before_queueing_uses_highest_priority(tmp_path, monkeypatch):
+    async def scenario():
+        downloader = _downloader(tmp_path, monkeypatch)
+        seen = []
+        acquire = downloader.scheduler.downloads.acquire
+
+        async def recording_acquire(priority, owner=None, key=None):
+            seen.append(priority)
+            await acquire(priority, owner, key)
+
+        async def fake_download(query, target_path, track_info):
+            return DownloadResult(success=False, error_message="test")
+
+        downloader.scheduler.downloads.acquire = recording_acquire
+        downloader._download_sc_only = fake_download
+        # Оба запроса приходят до того, как задача загрузки встала в очередь
+        first = asyncio.create_task(downloader.download("x", _track("x"), priority=Priority.RADIO_PREFETCH))
+        second = asyncio.create_task(downloader.download("x", _track("x"), priority=Priority.WEB_STREAM))
+        await asyncio.gather(first, second)
+        assert seen == [Priority.WEB_STREAM]
+
+    asyncio.run(scenario())
+
+def _entry(url, title, uploader, duration):
+    return {"url": url, "title": title, "uploader": uploader, "duration": duration}
+
+def test_sc_entry_ranked_against_track_metadata():
+    track = TrackInfo(identifier="x", title="Numb", uploader="Linkin Park", duration=187)
+    entries = [
+        _entry("preview", "Numb", "Linkin Park", 30.0),
+        _entry("cover", "Numb (cover)", "Some Band", 190.0),
+        _entry("orig", "Numb", "Linkin Park", 186.9),
+    ]
+    assert youtube._choose_sc_entry(entries, track)["url"] == "orig"
+
+def test_sc_entry_falls_back_to_first_fitting_result():
+    track = TrackInfo(identifier="x", title="Numb", uploader="Linkin Park", duration=187)
+    entries = [_entry("mix", "Numb", "Linkin Park", 3600.0), _entry("reupload", "numb lp", "user123", 185.0)]
+    assert youtube._choose_sc_entry(entries, track)["url"] == "reupload"
+    # Ни одна длительность не подходит — лучше не скачать, чем скачать чужое
+    assert youtube._choose_sc_entry(entries[:1], track) is None
+    assert youtube._choose_sc_entry([], track) is None
+    assert youtube._choose_sc_entry(entries, None)["url"] == "mix"
+
+class _Proxies:
+    def __init__(self, pool):
+        self.pool = list(pool)
+        self.failed = []
+        self.ok = []
+
+    def get_proxy(self):
+        return self.pool.pop(0) if self.pool else None
+
+    def report_failure(self, proxy):
+        self.failed.append(proxy)
+
+    def report_success(self, proxy, latency):
+        self.ok.append(proxy)
+
+def _proxied_downloader(tmp_path, monkeypatch, pool, errors):
+    """errors: прокси (None — напрямую) -> исключение, которым ответит YTMusic через него."""
+    class _Client:
+        def __init__(self, proxies=None):
+            self.proxy = proxies["https"] if proxies else None
+
+        def search(self, *args, **kwargs):
+            if self.proxy in errors: raise errors[self.proxy]
+            return [self.proxy]
+
+    downloader = _downloader(tmp_path, monkeypatch)
+    monkeypatch.setattr(youtube, "YTMusic", _Client)
+    downloader.ytmusic = _Client()
+    downloader._proxies = _Proxies(pool)
+    return downloader
+
+def test_transport_error_quarantines_proxy_and_retries(tmp_path, monkeypatch):
+    errors = {"http://a:1": youtube.requests.exceptions.ProxyError("refused"),
+              "http://b:2": youtube.YTMusicServerError("Server returned HTTP 429: Too Many Requests.\n")}
+    downloader = _proxied_downloader(tmp_path, monkeypatch, ["http://a:1", "http://b:2"], errors)
+    assert asyncio.run(downloader._ytmusic_call("search", "q")) == [None]
+    assert downloader._proxies.failed == ["http://a:1", "http://b:2"]
+
+def test_non_transport_error_is_not_blamed_on_proxy(tmp_path, monkeypatch):
+    errors = {"http://a:1": KeyError("contents")}
+    downloader = _proxied_downloader(tmp_path, monkeypatch, ["http://a:1"], errors)
+    with pytest.raises(KeyError):
+        asyncio.run(downloader._ytmusic_call("search", "q"))
+    assert downloader._proxies.failed == []
+
+def test_proxied_clients_are_bounded(tmp_path, monkeypatch):
+    downloader = _proxied_downloader(tmp_path, monkeypatch, [], {})
+    monkeypatch.setattr(youtube, "YTMUSIC_CLIENTS_MAX", 2)
+    first = downloader._ytmusic_for("http://a:1")
+    downloader._ytmusic_for("http://b:2")
+    assert downloader._ytmusic_for("http://a:1") is first
+    downloader._ytmusic_for("http://c:3")
+    assert list(downloader._proxied_ytmusic) == ["http://a:1", "http://c:3"]
@@ -0,0 +1,119 @@
+import functools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+# Экспорт: каждая завершенная span — одна JSON-строка в логгер "trace" (файл настраивает logging_setup)
+exporter = logging.getLogger("trace")
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start: float                          # unix time
+    duration_ms: float = 0.0
+    status: str = "ok"
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class Trace:
+    trace_id: str
+    name: str
+    start: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "name": self.name, "start": self.start,
+            "duration_ms": self.duration_ms, "attrs": self.attrs,
+            "spans": [asdict(s) for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+class TraceStore:
+    """Кольцевой буфер последних трейсов для встроенного просмотрщика."""
+
+    def __init__(self, size: int = 500):
+        self._traces: Deque[Trace] = deque(maxlen=size)
+
+    def add(self, trace: Trace):
+        self._traces.append(trace)
+
+    def slowest(self, limit: int = 20, name: Optional[str] = None) -> List[Trace]:
+        traces = [t for t in self._traces if name is None or t.name == name]
+        return sorted(traces, key=lambda t: t.duration_ms, reverse=True)[:limit]
+
+store = TraceStore()
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+def _export(span: Span):
+    if exporter.handlers:
+        exporter.info(json.dumps(asdict(span), ensure_ascii=False, default=str))
+
+@contextmanager
+def start_trace(name: str, **attrs):
+    """Корневая span с новым correlation id; все вложенные span() попадают в этот трейс."""
+    trace = Trace(trace_id=uuid.uuid4().hex[:16], name=name, start=time.time(), attrs=attrs)
+    trace_token = _current_trace.set(trace)
+    try:
+        with span(name) as root:
+            # Атрибуты трейса (track_id и т.п. дописываются по ходу) уходят в экспорт корневой span
+            root.attrs = trace.attrs
+            yield trace
+    finally:
+        _current_trace.reset(trace_token)
+        trace.duration_ms = root.duration_ms
+        store.add(trace)
+
+@contextmanager
+def span(name: str, **attrs):
+    """Вложенная span; без активного трейса ничего не пишет."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield Span("", "", None, name, 0.0, attrs=attrs)
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        trace_id=trace.trace_id, span_id=uuid.uuid4().hex[:8],
+        parent_id=parent.span_id if parent else None,
+        name=name, start=time.time(), attrs=attrs,
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "cancelled" if e.__class__.__name__ == "CancelledError" else "error"
+        current.attrs.setdefault("error", repr(e)[:200])
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        _current_span.reset(token)
+        trace.spans.append(current)
+        _export(current)
+
+def traced(name: str):
+    """Декоратор: оборачивает корутину в span(name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,118 @@
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Iterable, List, Optional, Set, Tuple
+
+from models import TrackInfo
+
+# Транслитерация кириллицы: "Кино" и "Kino" должны считаться одним исполнителем
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'і': 'i', 'ї': 'yi', 'є': 'ye',
+}
+_TRANSLIT_TABLE = str.maketrans(CYRILLIC_TO_LATIN)
+
+# Мусор в названиях: (feat. X), [Official Video], - Remastered 2011 и т.п.
+_NOISE_RE = re.compile(
+    r"[\(\[][^\)\]]*(feat|ft\.|prod|official|video|audio|lyric|remaster|version|edit|mono|stereo)[^\)\]]*[\)\]]"
+    r"|\s-\s.*(remaster|version|edit|mix).*$"
+    r"|\b(feat|ft)\.?\s.*$"
+)
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+# Веса признаков и пороги
+TITLE_WEIGHT = 0.45
+ARTIST_WEIGHT = 0.35
+DURATION_WEIGHT = 0.20
+ISRC_BONUS = 0.3
+DURATION_TOLERANCE = 3      # сек, разница без штрафа
+DURATION_MAX_DIFF = 30      # сек, дальше — точно другая запись
+ARTIST_MIN_SIMILARITY = 0.5 # ниже — скорее всего кавер, score делится пополам
+MIN_SCORE = 0.55
+
+@dataclass
+class SpotifyTrackRef:
+    title: str
+    artists: List[str]
+    duration: int           # сек
+    isrc: Optional[str] = None
+
+    @classmethod
+    def from_spotify(cls, track: dict) -> "SpotifyTrackRef":
+        return cls(
+            title=track.get('name', ''),
+            artists=[a['name'] for a in track.get('artists', []) if a.get('name')],
+            duration=track.get('duration_ms', 0) // 1000,
+            isrc=(track.get('external_ids') or {}).get('isrc'),
+        )
+
+    @classmethod
+    def from_track(cls, track: TrackInfo) -> "SpotifyTrackRef":
+        """Эталон из уже выбранных метаданных (YTMusic или Spotify) — для выбора аудио на SoundCloud."""
+        return cls(title=track.title, artists=[track.uploader] if track.uploader else [], duration=track.duration)
+
+def normalize(text: str) -> str:
+    text = (text or "").lower()
+    text = _NOISE_RE.sub(" ", text)
+    text = text.translate(_TRANSLIT_TABLE).replace("kh", "h")
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+def similarity(a: str, b: str) -> float:
+    """Максимум из посимвольного сходства и пересечения слов (порядок слов не важен)."""
+    a, b = normalize(a), normalize(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    ratio = SequenceMatcher(None, a, b).ratio()
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    overlap = len(tokens_a & tokens_b) / max(len(tokens_a), len(tokens_b))
+    return max(ratio, overlap)
+
+def artist_similarity(artists: Iterable[str], candidate_artists: str) -> float:
+    names = [n for n in re.split(r",|&| x | и ", candidate_artists or "") if n.strip()]
+    return max((similarity(a, n) for a in artists for n in names), default=0.0)
+
+def duration_score(expected: int, actual: int) -> float:
+    if not expected or not actual:
+        return 0.5
+    diff = abs(expected - actual)
+    if diff <= DURATION_TOLERANCE:
+        return 1.0
+    return max(0.0, 1.0 - (diff - DURATION_TOLERANCE) / (DURATION_MAX_DIFF - DURATION_TOLERANCE))
+
+def duration_fits(ref: SpotifyTrackRef, candidate: TrackInfo) -> bool:
+    """Неизвестная длительность не исключает кандидата; расхождение больше DURATION_MAX_DIFF — исключает."""
+    return not ref.duration or not candidate.duration or abs(ref.duration - candidate.duration) <= DURATION_MAX_DIFF
+
+def score_candidate(ref: SpotifyTrackRef, candidate: TrackInfo, isrc_hit: bool = False) -> float:
+    if not duration_fits(ref, candidate):
+        return 0.0
+
+    artist_sim = artist_similarity(ref.artists, candidate.uploader)
+    score = (
+        TITLE_WEIGHT * similarity(ref.title, candidate.title)
+        + ARTIST_WEIGHT * artist_sim
+        + DURATION_WEIGHT * duration_score(ref.duration, candidate.duration)
+    )
+    if isrc_hit:
+        score += ISRC_BONUS
+    elif artist_sim < ARTIST_MIN_SIMILARITY:
+        score *= 0.5
+    return min(score, 1.0)
+
+def best_match(
+    ref: SpotifyTrackRef, candidates: List[TrackInfo], isrc_ids: Optional[Set[str]] = None
+) -> Optional[Tuple[TrackInfo, float]]:
+    """Лучший кандидат и его score, или None если никто не дотянул до MIN_SCORE."""
+    isrc_ids = isrc_ids or set()
+    scored = [(c, score_candidate(ref, c, c.identifier in isrc_ids)) for c in candidates]
+    if not scored:
+        return None
+    best = max(scored, key=lambda pair: pair[1])
+    return best if best[1] >= MIN_SCORE else None
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger("update_queue")
+
+class UpdateQueue:
+    """
+    Прием апдейтов вебхука: HTTP-ответ уходит сразу, обработка — в N воркерах.
+    У каждого чата своя очередь, а в общей очереди _ready — чаты, которые ждут воркера;
+    чат стоит там не больше одного раза и не пока его апдейт обрабатывается. Поэтому
+    внутри чата порядок сохраняется, а медленный хендлер держит только свой чат:
+    остальные берут свободные воркеры. Повторы Telegram (тот же update_id) отбрасываются.
+    """
+
+    def __init__(self, application: Application, workers: int = 8, maxsize: int = 2000, dedup_size: int = 10000):
+        self._app = application
+        self._workers = workers
+        self._maxsize = maxsize
+        self._pending: Dict[int, Deque[Update]] = {}  # chat -> еще не обработанные апдейты
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._dedup_size = dedup_size
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def _shard_key(update: Update) -> int:
+        if update.effective_chat: return update.effective_chat.id
+        if update.effective_user: return update.effective_user.id
+        return update.update_id
+
+    def _is_duplicate(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self._dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def submit(self, update: Update, dedup: bool = True) -> bool:
+        """False — очередь переполнена (Telegram повторит доставку позже)."""
+        if dedup and self._is_duplicate(update.update_id):
+            logger.debug(f"Duplicate update {update.update_id} dropped")
+            return True
+        if self._size >= self._maxsize:
+            # Забываем update_id, чтобы повтор от Telegram не отбросился как дубль
+            self._seen.pop(update.update_id, None)
+            logger.warning(f"Update queue full, rejecting update {update.update_id}")
+            return False
+        self._size += 1
+        key = self._shard_key(update)
+        backlog = self._pending.get(key)
+        if backlog is not None:
+            # Чат уже ждет воркера или обрабатывается — встанет в свою очередь
+            backlog.append(update)
+        else:
+            self._pending[key] = deque([update])
+            self._ready.put_nowait(key)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            backlog = self._pending[key]
+            update = backlog.popleft()
+            try:
+                await self._app.process_update(update)
+            except Exception as e:
+                logger.error(f"Update {update.update_id} failed: {e}", exc_info=True)
+            finally:
+                self._size -= 1
+                # По одному апдейту за раз: чат с длинной очередью не занимает воркер надолго
+                if backlog:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                self._ready.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+            logger.info(f"Update queue started with {len(self._tasks)} workers")
+
+    async def stop(self, timeout: Optional[float] = 10.0):
+        # Даем воркерам дообработать уже принятые апдейты
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Update queue not drained before shutdown")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -1,78 +1,174 @@
 import asyncio
 import logging
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+import requests
 import yt_dlp
 from ytmusicapi import YTMusic
+from ytmusicapi.exceptions import YTMusicServerError
 from config import Settings, get_settings
 from models import DownloadResult, TrackInfo
 from cache_service import CacheService
+from proxy_manager import ProxyManager
+from concurrency import Priority, WorkScheduler
+from search_normalize import normalize_page
+from track_matcher import SpotifyTrackRef, best_match, duration_fits
+from audio_processing import LoudnessNormalizer
+import metrics
+import tracing
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+FILE_ID_TTL = 30 * 24 * 3600
+SC_CANDIDATES = 5  # Сколько результатов SoundCloud сравнивать с метаданными трека
+YTMUSIC_CLIENTS_MAX = 32  # Клиентов YTMusic под прокси держим не больше (LRU)
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+def _choose_sc_entry(entries: List[dict], track_info: Optional[TrackInfo]) -> Optional[dict]:
+    """
+    Какой из результатов SoundCloud качать: лучший по score_candidate, если он уверенный;
+    иначе первый по выдаче, но не с чужой длительностью (превью 0:30, часовые миксы).
+    """
+    if not track_info: return entries[0] if entries else None
+    ref = SpotifyTrackRef.from_track(track_info)
+    candidates = [
+        TrackInfo(identifier=str(i), title=e.get('title') or "", uploader=e.get('uploader') or "",
+                  duration=int(e.get('duration') or 0))
+        for i, e in enumerate(entries)
+    ]
+    match = best_match(ref, candidates)
+    if match: return entries[int(match[0].identifier)]
+    return next((entries[int(c.identifier)] for c in candidates if duration_fits(ref, c)), None)
+
+def _is_proxy_error(e: Exception) -> bool:
+    """Виноват ли прокси: обрыв соединения, таймаут, 407 от прокси или 429 на его IP. Ошибки разбора и 4xx запроса — нет."""
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)): return True
+    return isinstance(e, YTMusicServerError) and ("HTTP 407" in str(e) or "HTTP 429" in str(e))
+
+def _is_overload(error: Optional[str]) -> bool:
+    """429 и таймауты — сигнал сбавить параллельность; "не найдено" — нет."""
+    if not error: return False
+    error = error.lower()
+    return "429" in error or "too many requests" in error or "timed out" in error or "timeout" in error
+
 class YouTubeDownloader:
     """
     ⚡ Metadata: YTMusic | Audio: SoundCloud ONLY.
     """
     
-    def __init__(self, settings: Settings, cache_service: CacheService):
+    def __init__(self, settings: Settings, cache_service: CacheService, proxy_manager: Optional[ProxyManager] = None,
+                 normalizer: Optional[LoudnessNormalizer] = None):
         self._settings = settings
         self._cache = cache_service
+        self._proxies = proxy_manager
+        # Выравнивание громкости: тогда в mp3 перекодирует он, а не yt-dlp
+        self._normalizer = normalizer if normalizer and normalizer.available else None
         self._settings.DOWNLOADS_DIR.mkdir(exist_ok=True)
-        # SoundCloud не банит, можно 3 потока
-        self.semaphore = asyncio.Semaphore(3)
+        # Поиск и загрузки идут через общий планировщик: приоритеты + доля на чат.
+        # Лимит загрузок растет, пока SoundCloud отвечает быстро, и падает на 429/таймаутах
+        self.scheduler = WorkScheduler(
+            search_limit=settings.MAX_CONCURRENT_SEARCHES,
+            download_initial=settings.MAX_CONCURRENT_DOWNLOADS,
+            download_max=settings.MAX_CONCURRENT_DOWNLOADS_CEILING,
+            per_chat=settings.SCHEDULER_PER_CHAT,
+        )
+        # video_id -> идущая загрузка: повторный запрос (например, подкачка радио) ждет ее же
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Самый важный класс среди тех, кто ждет загрузку трека
+        self._inflight_priority: Dict[str, Priority] = {}
         self.ytmusic = YTMusic() 
+        self._proxied_ytmusic: "OrderedDict[str, YTMusic]" = OrderedDict()
+
+    def _pick_proxies(self) -> List[Optional[str]]:
+        """Прокси для попыток по порядку; последняя попытка всегда напрямую."""
+        attempts: List[Optional[str]] = []
+        if self._proxies:
+            for _ in range(self._settings.PROXY_MAX_ATTEMPTS):
+                proxy = self._proxies.get_proxy()
+                if proxy and proxy not in attempts: attempts.append(proxy)
+        attempts.append(None)
+        return attempts
+
+    def _ytmusic_for(self, proxy: Optional[str]) -> YTMusic:
+        if not proxy: return self.ytmusic
+        client = self._proxied_ytmusic.get(proxy)
+        if client is None:
+            client = self._proxied_ytmusic[proxy] = YTMusic(proxies=ProxyManager.as_requests_proxies(proxy))
+            # Пул прокси меняется при перепроверках: клиенты ушедших вытесняются первыми
+            if len(self._proxied_ytmusic) > YTMUSIC_CLIENTS_MAX:
+                self._proxied_ytmusic.popitem(last=False)
+        else:
+            self._proxied_ytmusic.move_to_end(proxy)
+        return client
+
+    async def _ytmusic_call(self, method: str, *args, **kwargs):
+        """Вызов YTMusic через пул прокси: прокси с сетевой ошибкой уходит в карантин, запрос повторяется.
+        Остальные ошибки (разбор ответа, неверный запрос) прокси не касаются и пробрасываются сразу."""
+        loop = asyncio.get_running_loop()
+        attempts = self._pick_proxies()
+        for proxy in attempts:
+            client = self._ytmusic_for(proxy)
+            started = time.monotonic()
+            try:
+                result = await loop.run_in_executor(None, lambda: getattr(client, method)(*args, **kwargs))
+            except Exception as e:
+                if proxy is None or not _is_proxy_error(e): raise
+                self._proxies.report_failure(proxy)
+                continue
+            if proxy: self._proxies.report_success(proxy, time.monotonic() - started)
+            return result
 
     # 1. ИЩЕМ НА YOUTUBE (МЕТАДАННЫЕ)
-    async def search(self, query: str, limit: int = 10, **kwargs) -> List[TrackInfo]:
+    @tracing.traced("search")
+    async def search(self, query: str, limit: int = 10, priority: Priority = Priority.WEB_STREAM,
+                     chat_id: Optional[int] = None, **kwargs) -> List[TrackInfo]:
         if kwargs.get('decade'): query = f"{query} {kwargs['decade']}"
         if not query or not query.strip(): return []
 
         logger.info(f"🔎 YT Metadata Search: {query}")
-        loop = asyncio.get_running_loop()
-
         try:
             # Безопасный поиск через API (не банится)
-            search_results = await loop.run_in_executor(None, lambda: self.ytmusic.search(query, filter="songs", limit=limit))
+            async with self.scheduler.search_slot(priority, chat_id):
+                with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="search", stage="metadata"):
+                    search_results = await self._ytmusic_call("search", query, filter="songs", limit=limit)
             
-            results = []
-            for item in search_results:
-                video_id = item.get('videoId')
-                if not video_id: continue
-
-                artists = ", ".join([a['name'] for a in item.get('artists', [])])
-                
-                duration = 0
-                try:
-                    d_str = item.get('duration', '0:00')
-                    parts = d_str.split(':')
-                    if len(parts) == 3: duration = int(parts[0])*3600 + int(parts[1])*60 + int(parts[2])
-                    elif len(parts) == 2: duration = int(parts[0])*60 + int(parts[1])
-                    else: duration = int(parts[0])
-                except: pass
-                
-                if duration > 900 or duration < 40: continue
-
-                track = TrackInfo(
-                    identifier=video_id, 
-                    title=item.get('title'), 
-                    uploader=artists, 
-                    duration=duration, 
-                    thumbnail_url=item.get('thumbnails', [{}])[-1].get('url'), 
-                    source="ytmusic"
-                )
-                results.append(track)
-            return results
+            # Вся страница разбирается и фильтруется пачкой, TrackInfo — только для прошедших
+            return normalize_page(search_results)
         except Exception as e:
             logger.error(f"Search error: {e}")
             return []
 
+    @tracing.traced("related")
+    async def get_related(self, video_id: str, limit: int = 25, priority: Priority = Priority.RADIO_PREFETCH,
+                          chat_id: Optional[int] = None) -> List[TrackInfo]:
+        """Похожие треки: watch playlist (радио YTMusic от трека), при нехватке — related-секции."""
+        try:
+            async with self.scheduler.search_slot(priority, chat_id):
+                with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="related", stage="metadata"):
+                    watch = await self._ytmusic_call("get_watch_playlist", videoId=video_id, limit=limit, radio=True)
+                    items = list(watch.get('tracks', []))
+                    if len(items) < limit // 2 and watch.get('related'):
+                        for section in await self._ytmusic_call("get_song_related", watch['related']):
+                            items.extend(c for c in section.get('contents', []) if c.get('videoId'))
+        except Exception as e:
+            logger.error(f"Related error for {video_id}: {e}")
+            return []
+
+        return [t for t in normalize_page(items, duration_keys=('length', 'duration')) if t.identifier != video_id]
+
+    @tracing.traced("download.metadata")
     async def get_track_info(self, video_id: str) -> Optional[TrackInfo]:
         try:
-            loop = asyncio.get_running_loop()
-            info = await loop.run_in_executor(None, lambda: self.ytmusic.get_song(video_id))
+            info = await self._ytmusic_call("get_song", video_id)
             video_details = info.get('videoDetails', {})
             if not video_details: return None
             
@@ -89,25 +185,65 @@ class YouTubeDownloader:
             )
         except: return None
 
+    # Telegram file_id уже отправленного трека: повторная отправка без загрузки и аплоада
+    async def get_file_id(self, video_id: str) -> Optional[str]:
+        return await self._cache.get(f"file_id:{video_id}") if self._cache else None
+
+    async def remember_file_id(self, video_id: str, file_id: str):
+        if self._cache:
+            await self._cache.set(f"file_id:{video_id}", file_id, ttl=FILE_ID_TTL)
+
     # 2. КАЧАЕМ С SOUNDCLOUD (АУДИО)
-    async def download(self, video_id: str, track_info: Optional[TrackInfo] = None) -> DownloadResult:
+    @tracing.traced("download")
+    async def download(self, video_id: str, track_info: Optional[TrackInfo] = None,
+                       priority: Priority = Priority.WEB_STREAM, chat_id: Optional[int] = None) -> DownloadResult:
         final_path = self._settings.DOWNLOADS_DIR / f"{video_id}.mp3"
         
-        # Кэш
-        if final_path.exists() and final_path.stat().st_size > 50000:
+        # Кэш (stat в потоке: медленный диск не должен стопорить loop)
+        if await asyncio.to_thread(_file_size, final_path) > 50000:
+            metrics.DOWNLOADS_TOTAL.labels(result="cached").inc()
             return DownloadResult(success=True, file_path=final_path, track_info=track_info)
 
         if not track_info:
-            track_info = await self.get_track_info(video_id)
+            with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="download", stage="metadata"):
+                track_info = await self.get_track_info(video_id)
             
         if not track_info:
+            metrics.DOWNLOADS_TOTAL.labels(result="failed").inc()
             return DownloadResult(success=False, error_message="Metadata failed")
 
-        async with self.semaphore:
+        inflight = self._inflight.get(video_id)
+        if inflight is None:
+            self._inflight_priority[video_id] = priority
+            inflight = asyncio.create_task(self._download_scheduled(video_id, final_path, track_info, chat_id))
+            self._inflight[video_id] = inflight
+            inflight.add_done_callback(lambda _: self._forget_inflight(video_id))
+        elif priority < self._inflight_priority.get(video_id, priority):
+            # Трек уже ждет слот как подкачка, а теперь его ждет слушатель: загрузка не должна остаться в низком классе
+            self._inflight_priority[video_id] = priority
+            self.scheduler.escalate_download(video_id, priority)
+        # shield: отмена одного из ожидающих не должна обрывать загрузку для остальных
+        return await asyncio.shield(inflight)
+
+    def _forget_inflight(self, video_id: str):
+        self._inflight.pop(video_id, None)
+        self._inflight_priority.pop(video_id, None)
+
+    async def _download_scheduled(self, video_id: str, final_path: Path, track_info: TrackInfo,
+                                  chat_id: Optional[int]) -> DownloadResult:
+        # Приоритет читается при входе в очередь: присоединившийся до этого момента уже мог его поднять
+        priority = self._inflight_priority.get(video_id, Priority.WEB_STREAM)
+        async with self.scheduler.download_slot(priority, chat_id, key=video_id):
             query = f"{track_info.uploader} - {track_info.title}"
             logger.info(f"☁️ SC Attempt: {query}")
-            return await self._download_sc_only(query, final_path, track_info)
+            started = time.monotonic()
+            with metrics.timed(metrics.DOWNLOADER_STAGE_SECONDS, operation="download", stage="total"):
+                result = await self._download_sc_only(query, final_path, track_info)
+            self.scheduler.downloads.record(time.monotonic() - started, result.success, _is_overload(result.error_message))
+        metrics.DOWNLOADS_TOTAL.labels(result="success" if result.success else "failed").inc()
+        return result
 
+    @tracing.traced("download.soundcloud")
     async def _download_sc_only(self, query: str, target_path: Path, track_info: Optional[TrackInfo]) -> DownloadResult:
         temp_path = str(target_path).replace(".mp3", "_temp")
         
@@ -119,19 +255,37 @@ class YouTubeDownloader:
             'noplaylist': True,
             'postprocessors': [{'key': 'FFmpegExtractAudio','preferredcodec': 'mp3'}],
         }
+        if self._normalizer: opts.pop('postprocessors')
         
         try:
             loop = asyncio.get_running_loop()
-            # scsearch1 = найти первый результат
-            await loop.run_in_executor(None, lambda: self._run_yt_dlp(opts, f"scsearch1:{query}"))
+            for proxy in self._pick_proxies():
+                stages = metrics.YtDlpStageTimer()
+                attempt_opts = stages.install({**opts, 'proxy': proxy} if proxy else opts)
+                started = time.monotonic()
+                try:
+                    entries = await loop.run_in_executor(None, lambda: self._sc_candidates(attempt_opts, query))
+                    entry = _choose_sc_entry(entries, track_info)
+                    if entry:
+                        await loop.run_in_executor(None, lambda: self._run_yt_dlp(attempt_opts, entry['url']))
+                    elif entries:
+                        logger.info(f"SC: no result fits '{query}' ({len(entries)} candidates)")
+                except Exception:
+                    if proxy is None: raise
+                    # Плохой прокси не должен стоить слушателю трека — пробуем следующий
+                    self._proxies.report_failure(proxy)
+                    continue
+                finally:
+                    stages.observe()
+                if proxy: self._proxies.report_success(proxy, time.monotonic() - started)
+                break
             
-            paths = [Path(temp_path + ".mp3"), Path(temp_path)]
-            for p in paths:
-                if p.exists() and p.stat().st_size > 10000:
-                    if p != target_path:
-                        if target_path.exists(): target_path.unlink()
-                        p.rename(target_path)
+            if self._normalizer:
+                source = await asyncio.to_thread(self._find_download, temp_path)
+                if source and await self._normalizer.process(target_path.stem, source, target_path):
                     return DownloadResult(success=True, file_path=target_path, track_info=track_info)
+            elif await asyncio.to_thread(self._finalize_download, temp_path, target_path):
+                return DownloadResult(success=True, file_path=target_path, track_info=track_info)
             
             logger.warning(f"❌ SC Not Found: {query}")
             return DownloadResult(success=False, error_message="Audio not found on SoundCloud")
@@ -139,6 +293,27 @@ class YouTubeDownloader:
         except Exception as e:
             return DownloadResult(success=False, error_message=str(e))
 
+    @staticmethod
+    def _find_download(temp_path: str) -> Optional[Path]:
+        for p in (Path(temp_path + ".mp3"), Path(temp_path)):
+            if _file_size(p) > 10000: return p
+        return None
+
+    @staticmethod
+    def _finalize_download(temp_path: str, target_path: Path) -> bool:
+        p = YouTubeDownloader._find_download(temp_path)
+        if not p: return False
+        if p != target_path:
+            if target_path.exists(): target_path.unlink()
+            p.rename(target_path)
+        return True
+
+    def _sc_candidates(self, opts, query: str) -> List[dict]:
+        """Первые SC_CANDIDATES результатов поиска SoundCloud без загрузки: название, автор, длительность, url."""
+        with yt_dlp.YoutubeDL({**opts, 'extract_flat': 'in_playlist'}) as ydl:
+            info = ydl.extract_info(f"scsearch{SC_CANDIDATES}:{query}", download=False)
+        return [e for e in (info or {}).get('entries') or [] if e and e.get('url')]
+
     def _run_yt_dlp(self, opts, url):
         with yt_dlp.YoutubeDL(opts) as ydl:
             ydl.download([url])